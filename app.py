@@ -1,11 +1,35 @@
-import time, sqlite3, os, math, random, requests, hashlib, base64, socket, json, uuid
-from datetime import datetime, timedelta
-from flask import Flask, jsonify, render_template_string, request, session
+import time, asyncio, sqlite3, os, math, random, requests, hashlib, base64, socket, json, uuid, gzip, mimetypes, heapq, itertools, io, csv, struct, re, zlib, pickle
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from flask import Flask, Response, g, jsonify, request, session, send_from_directory, stream_with_context
+from flask.json.provider import DefaultJSONProvider
 from flask_cors import CORS
 from groq import Groq 
 from functools import wraps
 import psutil
 import threading
+import numpy as np
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = pq = None
 
 # --- STABILITY PATCH ---
 _old_getaddrinfo = socket.getaddrinfo
@@ -14,25 +38,209 @@ def new_getaddrinfo(*args, **kwargs):
     return [r for r in responses if r[0] == socket.AF_INET]
 socket.getaddrinfo = new_getaddrinfo
 
+def _json_default(o):
+    if isinstance(o, sqlite3.Row):
+        return dict(o)
+    if hasattr(o, 'tolist'):
+        return o.tolist()
+    return DefaultJSONProvider.default(o)
+
+class FastJSONProvider(DefaultJSONProvider):
+    """orjson-backed JSON provider; sqlite3.Row objects serialize without a dict() pass in the route"""
+    default = staticmethod(_json_default)
+
+    def dumps(self, obj, **kwargs):
+        if orjson is None:
+            return super().dumps(obj, **kwargs)
+        return orjson.dumps(obj, default=_json_default, option=orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY).decode()
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        start = time.perf_counter()
+        if orjson is not None:
+            body = orjson.dumps(obj, default=_json_default, option=orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY)
+        else:
+            body = json.dumps(obj, default=_json_default, separators=(',', ':')).encode('utf-8')
+        g.serialize_ms = (time.perf_counter() - start) * 1000
+        return self._app.response_class(body, mimetype=self.mimetype)
+
 app = Flask(__name__)
 app.secret_key = os.urandom(24)
-CORS(app)
+app.json = FastJSONProvider(app)
+CORS(app, expose_headers=['X-Next-Cursor', 'X-Total-Count'])
 
-AI_STORE = {"key": "", "model": "llama-3.3-70b-versatile", "client": None}
+# The key comes from the environment or POST /api/save; it is never written to disk
+AI_STORE = {"key": os.environ.get('GROQ_API_KEY', ''), "model": "llama-3.3-70b-versatile", "client": None}
 
 # Store historical telemetry data for each device
 TELEMETRY_HISTORY = {}
+# Recent points kept per device in TELEMETRY_HISTORY
+HISTORY_LIMIT = 1000
+
+# Per-device SeriesIndex for window statistics; retains far more samples
+# than TELEMETRY_HISTORY since it stores bare numeric columns
+TELEMETRY_INDEX = {}
+INDEX_MAX_POINTS = 14 * 86400
+CRITICAL_THD = 12
+# THD above which an anomaly is high severity
+HIGH_SEVERITY_THD = 15
+# Dashboard THD bands: amber above THD_WARNING, counted as critical above THD_ALARM
+THD_WARNING = 8
+THD_ALARM = 14
+# Device status from the health score
+HEALTH_CRITICAL = 50
+HEALTH_WARNING = 75
+# Health bands for the dashboard and exposure: at risk below HEALTH_AT_RISK,
+# healthy from HEALTH_GOOD
+HEALTH_AT_RISK = 60
+HEALTH_GOOD = 80
+# Shared with the dashboard script and GET /api/alert_rules
+THRESHOLDS = {
+    'critical_thd': CRITICAL_THD,
+    'high_severity_thd': HIGH_SEVERITY_THD,
+    'thd_warning': THD_WARNING,
+    'thd_alarm': THD_ALARM,
+    'health_critical': HEALTH_CRITICAL,
+    'health_warning': HEALTH_WARNING,
+    'health_at_risk': HEALTH_AT_RISK,
+    'health_good': HEALTH_GOOD
+}
+# One ANOMALY_LOG entry per episode above CRITICAL_THD (see AnomalyCoalescer):
+# THD must fall this far below the threshold to count as recovered, for
+# this many consecutive readings; an episode with no breach for
+# ANOMALY_STALE_AFTER seconds is closed regardless
+ANOMALY_HYSTERESIS = 1.5
+ANOMALY_CLEAR_SAMPLES = 3
+ANOMALY_STALE_AFTER = 1800
 ANOMALY_LOG = []
+# Bumped whenever a device's telemetry, anomalies or records change;
+# derived data such as prompt context is cached against it
+DEVICE_VERSIONS = {}
 MAINTENANCE_LOG = []
 CLAIMS_LOG = []
 
+# Anomaly ids must stay unique after acknowledged entries are removed,
+# since they are used as pagination keys
+ANOMALY_IDS = itertools.count(1)
+
+# Held while a telemetry batch is journaled and applied, so state copied
+# under it (snapshots) corresponds to an exact journal LSN
+STATE_LOCK = threading.Lock()
+
+# Keyset pagination limits
+PAGE_DEFAULT_LIMIT = 100
+PAGE_MAX_LIMIT = 1000
+
+# Secondary indexes; id is the rowid and is implicitly the last column of
+# every index, so (date) indexes already serve ORDER BY date, id keysets.
+INDEXES = [
+    'CREATE INDEX IF NOT EXISTS idx_maintenance_date ON maintenance(date)',
+    'CREATE INDEX IF NOT EXISTS idx_maintenance_motor_date ON maintenance(motor_id, date)',
+    'CREATE INDEX IF NOT EXISTS idx_maintenance_type_date ON maintenance(type, date)',
+    'CREATE INDEX IF NOT EXISTS idx_claims_date ON claims(date)',
+    'CREATE INDEX IF NOT EXISTS idx_claims_motor_date ON claims(motor_id, date)',
+    'CREATE INDEX IF NOT EXISTS idx_claims_status_date ON claims(status, date)',
+    'CREATE INDEX IF NOT EXISTS idx_anomalies_motor_timestamp ON anomalies(motor_id, timestamp)',
+    'CREATE INDEX IF NOT EXISTS idx_motors_policy_no ON motors(policy_no)',
+    'CREATE INDEX IF NOT EXISTS idx_motors_model_no ON motors(model_no)'
+]
+
+# Bumped whenever SCHEMA changes; stored in PRAGMA user_version
+SCHEMA_VERSION = 1
+
+# Money columns are REAL; dates are ISO-8601 'YYYY-MM-DD' text, which
+# sorts correctly and works with SQLite's date functions.
+SCHEMA = {
+    'motors': '''CREATE TABLE motors 
+        (id INTEGER PRIMARY KEY AUTOINCREMENT, 
+         name TEXT, 
+         health REAL, 
+         premium REAL, 
+         policy_no TEXT, 
+         coverage REAL, 
+         status TEXT, 
+         last_thd REAL, 
+         last_temp REAL,
+         vibration_baseline REAL, 
+         temp_baseline REAL, 
+         last_maintenance DATE CHECK (last_maintenance IS NULL OR date(last_maintenance) = last_maintenance), 
+         location TEXT,
+         installation_date DATE CHECK (installation_date IS NULL OR date(installation_date) = installation_date),
+         manufacturer TEXT,
+         model_no TEXT,
+         criticality TEXT,
+         purchase_date DATE CHECK (purchase_date IS NULL OR date(purchase_date) = purchase_date),
+         defect_date DATE CHECK (defect_date IS NULL OR date(defect_date) = defect_date),
+         buyer_name TEXT,
+         seller_name TEXT)''',
+    'maintenance': '''CREATE TABLE maintenance
+        (id INTEGER PRIMARY KEY AUTOINCREMENT,
+         motor_id INTEGER,
+         date DATE CHECK (date IS NULL OR date(date) = date),
+         type TEXT,
+         description TEXT,
+         cost REAL,
+         technician TEXT,
+         FOREIGN KEY(motor_id) REFERENCES motors(id))''',
+    'claims': '''CREATE TABLE claims
+        (id INTEGER PRIMARY KEY AUTOINCREMENT,
+         motor_id INTEGER,
+         date DATE CHECK (date IS NULL OR date(date) = date),
+         amount REAL,
+         status TEXT,
+         description TEXT,
+         resolution TEXT,
+         FOREIGN KEY(motor_id) REFERENCES motors(id))''',
+    'anomalies': '''CREATE TABLE anomalies
+        (id INTEGER PRIMARY KEY AUTOINCREMENT,
+         motor_id INTEGER,
+         timestamp TIMESTAMP,
+         thd_value REAL,
+         temp_value REAL,
+         severity TEXT,
+         analyzed BOOLEAN,
+         FOREIGN KEY(motor_id) REFERENCES motors(id))'''
+}
+
+# Columns converted by migrate_db when upgrading a pre-typed database
+MONEY_COLUMNS = {'motors': ('premium', 'coverage'), 'maintenance': ('cost',), 'claims': ('amount',)}
+DATE_COLUMNS = {
+    'motors': ('last_maintenance', 'installation_date', 'purchase_date', 'defect_date'),
+    'maintenance': ('date',),
+    'claims': ('date',)
+}
+DATE_FORMATS = ('%Y-%m-%d', '%d/%m/%Y', '%d-%m-%Y', '%Y/%m/%d', '%d.%m.%Y', '%d %b %Y', '%d %B %Y', '%b %d, %Y')
+
 # Metrics tracking
 METRICS = {
     "start_time": datetime.now(),
     "requests_count": 0,
     "api_calls": 0,
-    "errors_count": 0
+    "errors_count": 0,
+    "ai_fallbacks": 0
 }
+METRICS_LOCK = threading.Lock()
+
+# Per-endpoint serialization and payload size stats
+RESPONSE_METRICS = {}
+
+# Responses smaller than this are not worth compressing
+COMPRESS_MIN_BYTES = 1024
+RESPONSE_ENCODERS = {'gzip': lambda body: gzip.compress(body, compresslevel=6)}
+if brotli is not None:
+    RESPONSE_ENCODERS['br'] = lambda body: brotli.compress(body, quality=4)
+if zstandard is not None:
+    RESPONSE_ENCODERS['zstd'] = lambda body: zstandard.ZstdCompressor(level=3).compress(body)
+
+def record_response_metrics(endpoint, serialize_ms, raw_bytes, wire_bytes):
+    with METRICS_LOCK:
+        stats = RESPONSE_METRICS.setdefault(endpoint, {
+            'count': 0, 'serialize_ms': 0.0, 'raw_bytes': 0, 'wire_bytes': 0
+        })
+        stats['count'] += 1
+        stats['serialize_ms'] += serialize_ms
+        stats['raw_bytes'] += raw_bytes
+        stats['wire_bytes'] += wire_bytes
 
 def get_system_metrics():
     """Collect system-level metrics"""
@@ -74,6 +282,11 @@ def get_application_metrics():
             'requests': METRICS['requests_count'],
             'api_calls': METRICS['api_calls'],
             'errors': METRICS['errors_count'],
+            'serialize_ms': sum(r['serialize_ms'] for r in RESPONSE_METRICS.values()),
+            'bytes_raw': sum(r['raw_bytes'] for r in RESPONSE_METRICS.values()),
+            'bytes_sent': sum(r['wire_bytes'] for r in RESPONSE_METRICS.values()),
+            'ai_breaker': AI_BREAKER.status(),
+            'ai_fallbacks': METRICS['ai_fallbacks'],
             'uptime': uptime_str
         }
     except Exception as e:
@@ -104,7 +317,16 @@ def display_metrics():
         print(f"   Total Requests:    {app_metrics['requests']}")
         print(f"   API Calls:         {app_metrics['api_calls']}")
         print(f"   Errors:            {app_metrics['errors']}")
+        print(f"   AI Breaker:        {app_metrics['ai_breaker']['state']} ({app_metrics['ai_fallbacks']} fallbacks)")
         print(f"   Uptime:            {app_metrics['uptime']}")
+        
+        print(f"\n📦 RESPONSE PAYLOADS:")
+        print(f"   JSON Encode Time:  {app_metrics['serialize_ms']:.1f} ms")
+        print(f"   Bytes (raw/sent):  {app_metrics['bytes_raw'] / 1024:.1f} KB / {app_metrics['bytes_sent'] / 1024:.1f} KB")
+        heaviest = sorted(RESPONSE_METRICS.items(), key=lambda kv: kv[1]['raw_bytes'], reverse=True)[:5]
+        for endpoint, stats in heaviest:
+            print(f"   {endpoint:<20} {stats['count']:>6} req  {stats['serialize_ms'] / stats['count']:.2f} ms/req  "
+                  f"{stats['raw_bytes'] / stats['count'] / 1024:.1f} KB -> {stats['wire_bytes'] / stats['count'] / 1024:.1f} KB")
     
     print("\n" + "="*70 + "\n")
 
@@ -119,8 +341,10 @@ def periodic_metrics_display(interval=300):
     thread.start()
     return thread
 
+DB_PATH = 'pulseguard.db'
+
 def get_db():
-    conn = sqlite3.connect('pulseguard.db')
+    conn = sqlite3.connect(DB_PATH)
     conn.row_factory = sqlite3.Row
     return conn
 
@@ -128,74 +352,17 @@ def init_db():
     conn = get_db()
     cursor = conn.cursor()
     
-    # Motors table
-    cursor.execute("DROP TABLE IF EXISTS motors")
-    cursor.execute('''CREATE TABLE motors 
-        (id INTEGER PRIMARY KEY AUTOINCREMENT, 
-         name TEXT, 
-         health FLOAT, 
-         premium TEXT, 
-         policy_no TEXT, 
-         coverage TEXT, 
-         status TEXT, 
-         last_thd FLOAT, 
-         last_temp FLOAT,
-         vibration_baseline FLOAT, 
-         temp_baseline FLOAT, 
-         last_maintenance TEXT, 
-         location TEXT,
-         installation_date TEXT,
-         manufacturer TEXT,
-         model_no TEXT,
-         criticality TEXT,
-         purchase_date TEXT,
-         defect_date TEXT,
-         buyer_name TEXT,
-         seller_name TEXT)''')
-    
-    # Maintenance records
-    cursor.execute("DROP TABLE IF EXISTS maintenance")
-    cursor.execute('''CREATE TABLE maintenance
-        (id INTEGER PRIMARY KEY AUTOINCREMENT,
-         motor_id INTEGER,
-         date TEXT,
-         type TEXT,
-         description TEXT,
-         cost REAL,
-         technician TEXT,
-         FOREIGN KEY(motor_id) REFERENCES motors(id))''')
-    
-    # Claims records
-    cursor.execute("DROP TABLE IF EXISTS claims")
-    cursor.execute('''CREATE TABLE claims
-        (id INTEGER PRIMARY KEY AUTOINCREMENT,
-         motor_id INTEGER,
-         date TEXT,
-         amount REAL,
-         status TEXT,
-         description TEXT,
-         resolution TEXT,
-         FOREIGN KEY(motor_id) REFERENCES motors(id))''')
-    
-    # Anomaly records
-    cursor.execute("DROP TABLE IF EXISTS anomalies")
-    cursor.execute('''CREATE TABLE anomalies
-        (id INTEGER PRIMARY KEY AUTOINCREMENT,
-         motor_id INTEGER,
-         timestamp TEXT,
-         thd_value REAL,
-         temp_value REAL,
-         severity TEXT,
-         analyzed BOOLEAN,
-         FOREIGN KEY(motor_id) REFERENCES motors(id))''')
+    for table in SCHEMA:
+        cursor.execute(f"DROP TABLE IF EXISTS {table}")
+    create_schema(cursor)
     
     # Insert initial data with all 21 values
     machines = [
-        (1, 'Loom_Primary_A1', 92.4, '850', 'POL-9901', '5,00,000', 'Active', 5.2, 32.1, 4.5, 31.0, '2024-02-15', 'Production Floor A', '2023-01-15', 'Siemens', 'L-1000', 'High', '2023-01-15', '2024-08-10', 'John Anderson', 'Siemens Ltd.'),
-        (2, 'Cooling_Unit_X4', 45.1, '4,500', 'POL-4402', '12,00,000', 'Critical', 14.8, 55.4, 6.2, 35.0, '2024-01-10', 'HVAC Room B', '2022-06-20', 'Carrier', 'CU-500', 'Critical', '2022-06-20', '2024-09-03', 'Sarah Mitchell', 'Carrier Industries'),
-        (3, 'Exhaust_Fan_B2', 88.9, '550', 'POL-2105', '2,50,000', 'Warning', 6.1, 35.2, 5.0, 33.0, '2024-02-20', 'Ventilation Shaft', '2023-03-10', 'Greenheck', 'EF-200', 'Medium', '2023-03-10', '2024-11-05', 'Robert Williams', 'Greenheck Inc.'),
-        (4, 'Compressor_C7', 67.3, '2,800', 'POL-6712', '8,50,000', 'Warning', 9.4, 42.8, 7.2, 38.0, '2024-01-28', 'Basement Level 2', '2022-11-05', 'Atlas Copco', 'C7-300', 'High', '2022-11-05', '2024-10-12', 'Michael Davis', 'Atlas Copco Inc.'),
-        (5, 'Generator_G3', 98.2, '1,200', 'POL-3321', '10,00,000', 'Active', 3.8, 28.5, 3.5, 27.0, '2024-02-01', 'Power Station', '2023-09-12', 'Caterpillar', 'G3-800', 'Critical', '2023-09-12', None, 'Jennifer Brown', 'Caterpillar Power Solutions')
+        (1, 'Loom_Primary_A1', 92.4, 850.0, 'POL-9901', 500000.0, 'Active', 5.2, 32.1, 4.5, 31.0, '2024-02-15', 'Production Floor A', '2023-01-15', 'Siemens', 'L-1000', 'High', '2023-01-15', '2024-08-10', 'John Anderson', 'Siemens Ltd.'),
+        (2, 'Cooling_Unit_X4', 45.1, 4500.0, 'POL-4402', 1200000.0, 'Critical', 14.8, 55.4, 6.2, 35.0, '2024-01-10', 'HVAC Room B', '2022-06-20', 'Carrier', 'CU-500', 'Critical', '2022-06-20', '2024-09-03', 'Sarah Mitchell', 'Carrier Industries'),
+        (3, 'Exhaust_Fan_B2', 88.9, 550.0, 'POL-2105', 250000.0, 'Warning', 6.1, 35.2, 5.0, 33.0, '2024-02-20', 'Ventilation Shaft', '2023-03-10', 'Greenheck', 'EF-200', 'Medium', '2023-03-10', '2024-11-05', 'Robert Williams', 'Greenheck Inc.'),
+        (4, 'Compressor_C7', 67.3, 2800.0, 'POL-6712', 850000.0, 'Warning', 9.4, 42.8, 7.2, 38.0, '2024-01-28', 'Basement Level 2', '2022-11-05', 'Atlas Copco', 'C7-300', 'High', '2022-11-05', '2024-10-12', 'Michael Davis', 'Atlas Copco Inc.'),
+        (5, 'Generator_G3', 98.2, 1200.0, 'POL-3321', 1000000.0, 'Active', 3.8, 28.5, 3.5, 27.0, '2024-02-01', 'Power Station', '2023-09-12', 'Caterpillar', 'G3-800', 'Critical', '2023-09-12', None, 'Jennifer Brown', 'Caterpillar Power Solutions')
     ]
     cursor.executemany("INSERT INTO motors VALUES (?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?)", machines)
     
@@ -215,7 +382,7 @@ def init_db():
     # Initialize telemetry history
     base_thd_values = {1: 5.2, 2: 14.8, 3: 6.1, 4: 9.4, 5: 3.8}
     for device_id in [1, 2, 3, 4, 5]:
-        TELEMETRY_HISTORY[device_id] = []
+        points = []
         base_thd = base_thd_values.get(device_id, 5.0)
         for i in range(100):
             if random.random() < 0.05 and device_id == 2:
@@ -228,39 +395,623 @@ def init_db():
             thd_value = max(0, base_thd + variation)
             timestamp = (datetime.now() - timedelta(minutes=100-i)).isoformat()
             
-            TELEMETRY_HISTORY[device_id].append({
+            points.append({
                 'timestamp': timestamp,
                 'thd': thd_value,
                 'temp': 30 + thd_value * 1.4
             })
-            
-            if thd_value > 12:
-                ANOMALY_LOG.append({
-                    'id': len(ANOMALY_LOG) + 1,
-                    'motor_id': device_id,
-                    'timestamp': timestamp,
-                    'thd_value': thd_value,
-                    'temp_value': 30 + thd_value * 1.4,
-                    'severity': 'high',
-                    'analyzed': False
-                })
+            COALESCER.observe(device_id, timestamp, thd_value, 30 + thd_value * 1.4)
+        set_history(device_id, points)
+
+def ensure_indexes(cursor):
+    for statement in INDEXES:
+        cursor.execute(statement)
+
+def create_schema(cursor):
+    for statement in SCHEMA.values():
+        cursor.execute(statement)
+    ensure_indexes(cursor)
+    cursor.execute(f'PRAGMA user_version = {SCHEMA_VERSION}')
+
+def parse_amount(value):
+    """Parse money like '12,00,000', '₹4,500' or 850 into a float (None if blank)"""
+    if value is None or isinstance(value, (int, float)):
+        return value
+    cleaned = str(value).strip().lstrip('₹$').replace(',', '').replace(' ', '')
+    if not cleaned:
+        return None
+    return float(cleaned)
+
+def parse_date(value):
+    """Normalize a free-text date to ISO 'YYYY-MM-DD' (None if blank)"""
+    if value is None:
+        return None
+    value = str(value).strip()
+    if not value:
+        return None
+    try:
+        return datetime.fromisoformat(value).date().isoformat()
+    except ValueError:
+        pass
+    for fmt in DATE_FORMATS:
+        try:
+            return datetime.strptime(value, fmt).date().isoformat()
+        except ValueError:
+            continue
+    raise ValueError(f"Unrecognized date: {value}")
+
+def migrate_db():
+    """Upgrade an existing pulseguard.db in place to the typed schema"""
+    conn = get_db()
+    cursor = conn.cursor()
+    version = cursor.execute('PRAGMA user_version').fetchone()[0]
+    if version >= SCHEMA_VERSION:
+        conn.close()
+        return {'version': version, 'migrated': False}
+    
+    existing = {r['name'] for r in cursor.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+    unparsed = []
+    cursor.execute('BEGIN')
+    for table in SCHEMA:
+        if table in existing:
+            cursor.execute(f'ALTER TABLE {table} RENAME TO {table}_legacy')
+    create_schema(cursor)
+    
+    for table in SCHEMA:
+        if table not in existing:
+            continue
+        rows = cursor.execute(f'SELECT * FROM {table}_legacy').fetchall()
+        converted = []
+        for row in rows:
+            record = dict(row)
+            for column in MONEY_COLUMNS.get(table, ()):
+                try:
+                    record[column] = parse_amount(record[column])
+                except ValueError:
+                    unparsed.append((table, row['id'], column, record[column]))
+                    record[column] = None
+            for column in DATE_COLUMNS.get(table, ()):
+                try:
+                    record[column] = parse_date(record[column])
+                except ValueError:
+                    unparsed.append((table, row['id'], column, record[column]))
+                    record[column] = None
+            converted.append(record)
+        if converted:
+            columns = list(converted[0].keys())
+            cursor.executemany(
+                f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})",
+                [tuple(r[c] for c in columns) for r in converted])
+        cursor.execute(f'DROP TABLE {table}_legacy')
+    # Indexes that existed on the legacy tables shared these names and
+    # were dropped with them
+    ensure_indexes(cursor)
+    conn.commit()
+    conn.close()
+    return {'version': SCHEMA_VERSION, 'migrated': True, 'unparsed': unparsed}
+
+def encode_cursor(*key):
+    return base64.urlsafe_b64encode(json.dumps(key).encode()).decode().rstrip('=')
+
+def decode_cursor(token):
+    padded = token + '=' * (-len(token) % 4)
+    key = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    # Every paged listing keys on (ISO date/timestamp or NULL, integer id)
+    if (not isinstance(key, list) or len(key) != 2 or not (key[0] is None or isinstance(key[0], str))
+            or not isinstance(key[1], int) or isinstance(key[1], bool)):
+        raise ValueError('malformed cursor')
+    return key
+
+def parse_page_args(default_limit=PAGE_DEFAULT_LIMIT):
+    """Read limit/cursor query args; raises ValueError on bad input"""
+    limit = int(request.args.get('limit', default_limit))
+    limit = max(1, min(limit, PAGE_MAX_LIMIT))
+    cursor = request.args.get('cursor')
+    return limit, decode_cursor(cursor) if cursor else None
+
+def end_of_day(value):
+    """Make a date-only upper bound inclusive of timestamps on that day"""
+    return value + 'T23:59:59.999999' if value and len(value) == 10 else value
+
+def keyset_query(conn, table, date_column, filters, limit, after):
+    """Page through table ordered by (date_column, id) descending.
+
+    Rows with a NULL date sort last (SQLite orders NULL lowest), so a
+    cursor on a dated row also reaches them and a NULL cursor continues
+    among them by id. filters is a list of (sql_condition, value) pairs;
+    returns (rows, next_cursor, total) where total ignores the cursor.
+    """
+    where = [cond for cond, _ in filters]
+    params = [value for _, value in filters]
+    clause = ' WHERE ' + ' AND '.join(where) if where else ''
+    total = conn.execute(f'SELECT COUNT(*) FROM {table}{clause}', params).fetchone()[0]
+    
+    if after:
+        if after[0] is None:
+            where.append(f'{date_column} IS NULL AND id < ?')
+            params.append(after[1])
+        else:
+            where.append(f'(({date_column}, id) < (?, ?) OR {date_column} IS NULL)')
+            params.extend(after)
+        clause = ' WHERE ' + ' AND '.join(where)
+    rows = conn.execute(f'SELECT * FROM {table}{clause} ORDER BY {date_column} DESC, id DESC LIMIT ?',
+                        params + [limit + 1]).fetchall()
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1][date_column], rows[-1]['id'])
+    return rows, next_cursor, total
+
+def paged_response(items, next_cursor, total):
+    resp = jsonify(items)
+    resp.headers['X-Total-Count'] = str(total)
+    if next_cursor:
+        resp.headers['X-Next-Cursor'] = next_cursor
+    return resp
+
+def to_epoch(value):
+    """Accept epoch seconds or an ISO-8601 timestamp"""
+    if value is None or isinstance(value, (int, float)):
+        return value
+    try:
+        return float(value)
+    except ValueError:
+        return datetime.fromisoformat(value).timestamp()
 
-def calculate_health_score(device_id, thd, temp, baseline_thd, baseline_temp, history):
+class MinMaxTree:
+    """Growable segment tree of (min, max) pairs supporting append and range queries"""
+    
+    def __init__(self):
+        self.size = 1
+        self.n = 0
+        self.lo = [math.inf, math.inf]
+        self.hi = [-math.inf, -math.inf]
+    
+    def _build(self, los, his):
+        size = 1
+        while size < max(1, len(los)):
+            size *= 2
+        self.size = size
+        self.n = len(los)
+        self.lo = [math.inf] * (2 * size)
+        self.hi = [-math.inf] * (2 * size)
+        self.lo[size:size + len(los)] = los
+        self.hi[size:size + len(his)] = his
+        for i in range(size - 1, 0, -1):
+            self.lo[i] = min(self.lo[2 * i], self.lo[2 * i + 1])
+            self.hi[i] = max(self.hi[2 * i], self.hi[2 * i + 1])
+    
+    def append(self, lo, hi):
+        if self.n == self.size:
+            self._build(self.lo[self.size:self.size + self.n] + [lo],
+                        self.hi[self.size:self.size + self.n] + [hi])
+            return
+        i = self.size + self.n
+        self.lo[i] = lo
+        self.hi[i] = hi
+        self.n += 1
+        i //= 2
+        while i:
+            self.lo[i] = min(self.lo[2 * i], self.lo[2 * i + 1])
+            self.hi[i] = max(self.hi[2 * i], self.hi[2 * i + 1])
+            i //= 2
+    
+    def query(self, left, right):
+        """(min, max) over leaves [left, right)"""
+        lo, hi = math.inf, -math.inf
+        left += self.size
+        right += self.size
+        while left < right:
+            if left & 1:
+                lo = min(lo, self.lo[left])
+                hi = max(hi, self.hi[left])
+                left += 1
+            if right & 1:
+                right -= 1
+                lo = min(lo, self.lo[right])
+                hi = max(hi, self.hi[right])
+            left //= 2
+            right //= 2
+        return lo, hi
+
+class SeriesIndex:
+    """Append-only THD/temperature columns for one device with block summaries.
+
+    Every completed block of BLOCK samples contributes its min/max to a
+    segment tree and its sum/critical count to prefix sums, so a window
+    query costs O(log n) tree steps plus a NumPy scan of at most two
+    partial blocks.
+    """
+    BLOCK = 256
+    
+    def __init__(self, threshold=CRITICAL_THD, capacity=1024):
+        self.threshold = threshold
+        self.ts = np.empty(capacity)
+        self.thd = np.empty(capacity, dtype=np.float32)
+        self.temp = np.empty(capacity, dtype=np.float32)
+        self.n = 0
+        self.offset = 0
+        self._reset_blocks()
+    
+    def _reset_blocks(self):
+        self.thd_tree = MinMaxTree()
+        self.temp_tree = MinMaxTree()
+        self.thd_sum = [0.0]
+        self.temp_sum = [0.0]
+        self.critical = [0]
+        self.first_block = self.offset // self.BLOCK
+    
+    def _add_blocks(self, start, stop):
+        """Summarize whole blocks covering samples [start, stop)"""
+        if stop <= start:
+            return
+        B = self.BLOCK
+        thd = self.thd[start:stop].reshape(-1, B)
+        temp = self.temp[start:stop].reshape(-1, B)
+        for lo, hi in zip(thd.min(axis=1).tolist(), thd.max(axis=1).tolist()):
+            self.thd_tree.append(lo, hi)
+        for lo, hi in zip(temp.min(axis=1).tolist(), temp.max(axis=1).tolist()):
+            self.temp_tree.append(lo, hi)
+        for total in thd.sum(axis=1, dtype=np.float64).tolist():
+            self.thd_sum.append(self.thd_sum[-1] + total)
+        for total in temp.sum(axis=1, dtype=np.float64).tolist():
+            self.temp_sum.append(self.temp_sum[-1] + total)
+        for count in (thd > self.threshold).sum(axis=1).tolist():
+            self.critical.append(self.critical[-1] + count)
+    
+    def _reserve(self, extra):
+        needed = self.n + extra
+        if needed <= len(self.ts):
+            return
+        live = self.n - self.offset
+        capacity = max(1024, 2 * (live + extra))
+        for name in ('ts', 'thd', 'temp'):
+            old = getattr(self, name)
+            new = np.empty(capacity, dtype=old.dtype)
+            new[:live] = old[self.offset:self.n]
+            setattr(self, name, new)
+        self.n = live
+        self.offset = 0
+        self._reset_blocks()
+        self._add_blocks(0, (self.n // self.BLOCK) * self.BLOCK)
+    
+    def append(self, ts, thd, temp):
+        self._reserve(1)
+        # Keep timestamps sorted for searchsorted; late points are clamped
+        if self.n > self.offset and ts < self.ts[self.n - 1]:
+            ts = self.ts[self.n - 1]
+        self.ts[self.n] = ts
+        self.thd[self.n] = thd
+        self.temp[self.n] = temp
+        self.n += 1
+        if self.n % self.BLOCK == 0:
+            self._add_blocks(self.n - self.BLOCK, self.n)
+    
+    def extend(self, ts, thd, temp):
+        """Bulk append parallel sequences (timestamps must be sorted)"""
+        count = len(ts)
+        if not count:
+            return
+        self._reserve(count)
+        start = self.n
+        self.ts[start:start + count] = ts
+        self.thd[start:start + count] = thd
+        self.temp[start:start + count] = temp
+        self.n += count
+        B = self.BLOCK
+        self._add_blocks((start // B) * B, (self.n // B) * B)
+    
+    def trim(self, keep):
+        """Drop whole blocks from the front so roughly `keep` samples remain"""
+        new_offset = ((self.n - keep) // self.BLOCK) * self.BLOCK
+        if new_offset > self.offset:
+            self.offset = new_offset
+    
+    def __len__(self):
+        return self.n - self.offset
+    
+    def window(self, t_from=None, t_to=None):
+        live = self.ts[self.offset:self.n]
+        left = self.offset + (int(np.searchsorted(live, t_from, 'left')) if t_from is not None else 0)
+        right = self.offset + (int(np.searchsorted(live, t_to, 'right')) if t_to is not None else len(live))
+        if right <= left:
+            return {'count': 0}
+        
+        B = self.BLOCK
+        first_full = -(-left // B)
+        last_full = right // B
+        if first_full >= last_full:
+            scans = [(left, right)]
+        else:
+            scans = [(left, first_full * B), (last_full * B, right)]
+        
+        thd_min = temp_min = math.inf
+        thd_max = temp_max = -math.inf
+        thd_sum = temp_sum = 0.0
+        critical = 0
+        for a, b in scans:
+            if b <= a:
+                continue
+            thd = self.thd[a:b]
+            temp = self.temp[a:b]
+            thd_min = min(thd_min, float(thd.min()))
+            thd_max = max(thd_max, float(thd.max()))
+            temp_min = min(temp_min, float(temp.min()))
+            temp_max = max(temp_max, float(temp.max()))
+            thd_sum += float(thd.sum(dtype=np.float64))
+            temp_sum += float(temp.sum(dtype=np.float64))
+            critical += int((thd > self.threshold).sum())
+        
+        if first_full < last_full:
+            lb, rb = first_full - self.first_block, last_full - self.first_block
+            lo, hi = self.thd_tree.query(lb, rb)
+            thd_min, thd_max = min(thd_min, lo), max(thd_max, hi)
+            lo, hi = self.temp_tree.query(lb, rb)
+            temp_min, temp_max = min(temp_min, lo), max(temp_max, hi)
+            thd_sum += self.thd_sum[rb] - self.thd_sum[lb]
+            temp_sum += self.temp_sum[rb] - self.temp_sum[lb]
+            critical += self.critical[rb] - self.critical[lb]
+        
+        count = right - left
+        return {
+            'count': count,
+            'from': float(self.ts[left]),
+            'to': float(self.ts[right - 1]),
+            'thd': {'min': round(thd_min, 3), 'max': round(thd_max, 3),
+                    'mean': round(thd_sum / count, 3), 'count_above': critical},
+            'temp': {'min': round(temp_min, 2), 'max': round(temp_max, 2),
+                     'mean': round(temp_sum / count, 2)},
+            'threshold': self.threshold
+        }
+
+def bump_version(dev_id):
+    DEVICE_VERSIONS[dev_id] = DEVICE_VERSIONS.get(dev_id, 0) + 1
+
+def record_telemetry(dev_id, point):
+    """Append a sample to the device's history and window index"""
+    history = TELEMETRY_HISTORY.setdefault(dev_id, [])
+    history.append(point)
+    if len(history) > HISTORY_LIMIT:
+        TELEMETRY_HISTORY[dev_id] = history[-HISTORY_LIMIT:]
+    
+    index = TELEMETRY_INDEX.get(dev_id)
+    if index is None:
+        index = TELEMETRY_INDEX[dev_id] = SeriesIndex()
+    ts = to_epoch(point['timestamp'])
+    index.append(ts, point['thd'], point['temp'])
+    if len(index) > INDEX_MAX_POINTS + SeriesIndex.BLOCK:
+        index.trim(INDEX_MAX_POINTS)
+    FORECASTS.update(dev_id, ts, point['thd'], point['temp'])
+    bump_version(dev_id)
+
+def set_history(dev_id, points):
+    """Replace a device's history wholesale and rebuild its window index"""
+    TELEMETRY_HISTORY[dev_id] = points[-HISTORY_LIMIT:]
+    index = TELEMETRY_INDEX[dev_id] = SeriesIndex()
+    index.extend(np.maximum.accumulate(np.array([to_epoch(p['timestamp']) for p in points], dtype=np.float64)) if points else [],
+                 [p['thd'] for p in points], [p['temp'] for p in points])
+    FORECASTS.invalidate(dev_id)
+    bump_version(dev_id)
+
+def fit_holt_batch(Y, alphas, betas):
+    """Grid-search Holt (level + trend) smoothing for many series at once.
+
+    Y is (series, T) with each series right-aligned and NaN-padded on the
+    left. Every (alpha, beta) pair is run for every series in the same
+    vectorized pass and the pair with the lowest one-step SSE is kept.
+    """
+    grid_a, grid_b = np.meshgrid(alphas, betas, indexing='ij')
+    a = grid_a.ravel()[None, :]
+    b = grid_b.ravel()[None, :]
+    S, T = Y.shape
+    G = a.shape[1]
+    level = np.full((S, G), np.nan)
+    trend = np.zeros((S, G))
+    sse = np.zeros((S, G))
+    ape = np.zeros((S, G))
+    steps = np.zeros(S)
+    for t in range(T):
+        y = Y[:, t][:, None]
+        valid = ~np.isnan(y)
+        start = valid & np.isnan(level)
+        step = valid & ~np.isnan(level)
+        forecast = level + trend
+        err = np.where(step, y - forecast, 0.0)
+        level = np.where(start, y, np.where(step, forecast + a * err, level))
+        trend = np.where(step, trend + a * b * err, trend)
+        sse += err * err
+        ape += np.abs(err) / np.maximum(np.abs(np.nan_to_num(y)), 1.0)
+        steps += step[:, 0]
+    
+    best = np.argmin(sse, axis=1)
+    rows = np.arange(S)
+    count = np.maximum(steps, 1)
+    return {
+        'level': level[rows, best],
+        'trend': trend[rows, best],
+        'var': sse[rows, best] / count,
+        'ape': ape[rows, best] / count,
+        'alpha': a[0, best],
+        'beta': b[0, best]
+    }
+
+class ForecastEngine:
+    """Per-device Holt forecasts of THD and temperature.
+
+    Smoothing parameters are fitted for all pending devices in one
+    vectorized batch (fit_holt_batch); after that every new sample updates
+    the device's level/trend/error state in O(1). Forecasts are cached
+    per device until its state changes.
+    """
+    METRICS = ('thd', 'temp')
+    ALPHAS = (0.05, 0.1, 0.2, 0.3, 0.5)
+    BETAS = (0.01, 0.05, 0.1, 0.2)
+    FIT_WINDOW = 1000
+    DECAY = 0.05
+    
+    def __init__(self, threshold=CRITICAL_THD):
+        self.threshold = threshold
+        self.lock = threading.Lock()
+        self.state = {}
+        self.pending = set()
+        self.cache = {}
+    
+    def invalidate(self, dev_id):
+        with self.lock:
+            self.pending.add(dev_id)
+    
+    def fit(self, dev_ids=None):
+        """Batch-fit the given devices (default: all pending)"""
+        with self.lock:
+            if dev_ids is None:
+                dev_ids = list(self.pending)
+            dev_ids = [d for d in dev_ids if d in TELEMETRY_INDEX and len(TELEMETRY_INDEX[d]) >= 2]
+        if not dev_ids:
+            return 0
+        
+        windows = []
+        for dev_id in dev_ids:
+            index = TELEMETRY_INDEX[dev_id]
+            start = max(index.offset, index.n - self.FIT_WINDOW)
+            windows.append((index.ts[start:index.n].copy(),
+                            index.thd[start:index.n].astype(np.float64),
+                            index.temp[start:index.n].astype(np.float64)))
+        T = max(len(w[0]) for w in windows)
+        fitted = {}
+        for m, metric in enumerate(self.METRICS):
+            Y = np.full((len(windows), T), np.nan)
+            for i, w in enumerate(windows):
+                Y[i, T - len(w[0]):] = w[m + 1]
+            fitted[metric] = fit_holt_batch(Y, self.ALPHAS, self.BETAS)
+        
+        with self.lock:
+            for i, dev_id in enumerate(dev_ids):
+                ts = windows[i][0]
+                self.state[dev_id] = {
+                    metric: {key: float(values[i]) for key, values in fitted[metric].items()}
+                    for metric in self.METRICS
+                }
+                self.state[dev_id]['interval'] = float(np.median(np.diff(ts))) if len(ts) > 1 else 60.0
+                self.state[dev_id]['last_ts'] = float(ts[-1])
+                self.state[dev_id]['version'] = self.state[dev_id].get('version', 0) + 1
+                self.pending.discard(dev_id)
+                self.cache.pop(dev_id, None)
+        return len(dev_ids)
+    
+    def update(self, dev_id, ts, thd, temp):
+        with self.lock:
+            st = self.state.get(dev_id)
+            if st is None:
+                self.pending.add(dev_id)
+                return
+            for metric, y in (('thd', thd), ('temp', temp)):
+                m = st[metric]
+                forecast = m['level'] + m['trend']
+                err = y - forecast
+                m['level'] = forecast + m['alpha'] * err
+                m['trend'] += m['alpha'] * m['beta'] * err
+                m['var'] += self.DECAY * (err * err - m['var'])
+                m['ape'] += self.DECAY * (abs(err) / max(abs(y), 1.0) - m['ape'])
+            dt = ts - st['last_ts']
+            if dt > 0:
+                st['interval'] += 0.1 * (dt - st['interval'])
+                st['last_ts'] = ts
+            st['version'] += 1
+    
+    def forecast(self, dev_id, horizon=60):
+        if dev_id not in self.state or dev_id in self.pending:
+            self.fit([dev_id])
+        with self.lock:
+            st = self.state.get(dev_id)
+            if st is None:
+                return None
+            cached = self.cache.get(dev_id)
+            if cached and cached[0] == st['version'] and cached[1] == horizon:
+                return cached[2]
+            st = {k: dict(v) if isinstance(v, dict) else v for k, v in st.items()}
+        
+        h = np.arange(1, horizon + 1)
+        interval = max(st['interval'], 1e-3)
+        result = {
+            'interval_seconds': round(interval, 3),
+            'timestamps': [datetime.fromtimestamp(st['last_ts'] + k * interval).isoformat() for k in h.tolist()]
+        }
+        for metric in self.METRICS:
+            m = st[metric]
+            mean = m['level'] + h * m['trend']
+            # Holt h-step variance: sigma^2 * (1 + sum_{j<h} alpha^2 (1 + j beta)^2)
+            growth = m['alpha'] ** 2 * (1 + np.arange(1, horizon) * m['beta']) ** 2
+            sd = np.sqrt(m['var'] * (1 + np.concatenate(([0.0], np.cumsum(growth)))))
+            result[metric] = {
+                'mean': np.round(mean, 3).tolist(),
+                'lower80': np.round(mean - 1.2816 * sd, 3).tolist(),
+                'upper80': np.round(mean + 1.2816 * sd, 3).tolist(),
+                'lower95': np.round(mean - 1.96 * sd, 3).tolist(),
+                'upper95': np.round(mean + 1.96 * sd, 3).tolist(),
+                'level': round(m['level'], 3),
+                'trend_per_sample': round(m['trend'], 4)
+            }
+        
+        thd = st['thd']
+        if thd['level'] > self.threshold:
+            eta = 0.0
+        elif thd['trend'] > 0:
+            eta = (self.threshold - thd['level']) / thd['trend'] * interval
+        else:
+            eta = None
+        upper = np.array(result['thd']['upper95'])
+        crossing = np.flatnonzero(upper > self.threshold)
+        result['time_to_threshold'] = {
+            'threshold': self.threshold,
+            'seconds': round(eta, 1) if eta is not None else None,
+            'earliest_seconds': round(float((crossing[0] + 1) * interval), 1) if len(crossing) else None
+        }
+        
+        with self.lock:
+            self.cache[dev_id] = (st['version'], horizon, result)
+        return result
+    
+    def accuracy(self):
+        """100 - mean one-step THD percentage error across fitted devices"""
+        with self.lock:
+            errors = [st['thd']['ape'] for st in self.state.values()]
+        if not errors:
+            return None
+        return round(max(0.0, 100 * (1 - sum(errors) / len(errors))), 1)
+
+FORECASTS = ForecastEngine()
+
+def periodic_forecast_refit(interval=600):
+    """Refit smoothing parameters for the whole fleet in the background"""
+    def _refit_loop():
+        while True:
+            time.sleep(interval)
+            FORECASTS.fit(list(TELEMETRY_INDEX))
+    
+    thread = threading.Thread(target=_refit_loop, daemon=True)
+    thread.start()
+    return thread
+
+def calculate_health_score(device_id, thd, temp, baseline_thd, baseline_temp, history, conn=None):
     """AI-powered health score calculation"""
     
-    thd_factor = max(0, 100 - (thd / baseline_thd * 30))
-    temp_factor = max(0, 100 - (temp / baseline_temp * 20))
+    # Motors imported without readings have no baseline yet: score them against the reading itself
+    thd_factor = max(0, 100 - ((thd / baseline_thd if baseline_thd else 1.0) * 30))
+    temp_factor = max(0, 100 - ((temp / baseline_temp if baseline_temp else 1.0) * 20))
     
     if len(history) > 10:
-        recent_thds = [h['thd'] for h in history[-10:]]
-        trend = sum(recent_thds[i] - recent_thds[i-1] for i in range(1, len(recent_thds))) / len(recent_thds)
+        # The sum of consecutive differences telescopes to last - first
+        trend = (history[-1]['thd'] - history[-10]['thd']) / 10
         trend_penalty = max(0, trend * 5)
     else:
         trend_penalty = 0
     
-    conn = get_db()
-    last_maint = conn.execute('SELECT date FROM maintenance WHERE motor_id = ? ORDER BY date DESC LIMIT 1', (device_id,)).fetchone()
-    conn.close()
+    db = conn or get_db()
+    # Rows migrated from unparseable dates hold NULL; they say nothing about recency
+    last_maint = db.execute('''SELECT date FROM maintenance WHERE motor_id = ? AND date IS NOT NULL
+        ORDER BY date DESC LIMIT 1''', (device_id,)).fetchone()
+    if conn is None:
+        db.close()
     
     if last_maint:
         days_since_maint = (datetime.now() - datetime.strptime(last_maint['date'], '%Y-%m-%d')).days
@@ -270,44 +1021,2012 @@ def calculate_health_score(device_id, thd, temp, baseline_thd, baseline_temp, hi
     
     recent_anomalies = [a for a in ANOMALY_LOG if a['motor_id'] == device_id and 
                        datetime.fromisoformat(a['timestamp']) > datetime.now() - timedelta(days=7)]
-    anomaly_penalty = len(recent_anomalies) * 3
+    # Entries are episodes; the penalty stays per breaching reading
+    anomaly_penalty = sum(a.get('count', 1) for a in recent_anomalies) * 3
     
     health = thd_factor + temp_factor - trend_penalty - maint_factor - anomaly_penalty
     health = max(0, min(100, health))
     
     return round(health, 1)
 
-def ask_ai(prompt):
+def to_iso(value):
+    if value is None:
+        return datetime.now().isoformat()
+    if isinstance(value, (int, float)):
+        return datetime.fromtimestamp(value).isoformat()
+    return value
+
+class AnomalyCoalescer:
+    """Per-motor anomaly state machine: one ANOMALY_LOG entry per episode.
+
+    The first reading above CRITICAL_THD opens an entry. Readings that stay
+    above CRITICAL_THD - ANOMALY_HYSTERESIS extend it (count, end, peak
+    values, escalated severity); ANOMALY_CLEAR_SAMPLES consecutive readings
+    below that band, or ANOMALY_STALE_AFTER seconds without a breach, close
+    it. The next breach after that opens a new entry. Motors that go silent
+    are closed by sweep(), on the wall-clock time since their last breach
+    arrived. An escalation to a higher severity releases the entry from its
+    analysis so the next incident job looks at it again.
+    """
+    
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.open = {}
+    
+    def observe(self, dev_id, timestamp, thd, temp, severity=None):
+        """Feed one reading; returns the anomaly it opened or extended, if any"""
+        epoch = to_epoch(timestamp)
+        with self.lock:
+            state = self.open.get(dev_id)
+            if state is not None and epoch - state['last'] > ANOMALY_STALE_AFTER:
+                self._close(dev_id, state['anomaly']['end'])
+                state = None
+            
+            if thd > CRITICAL_THD:
+                severity = severity or ('high' if thd > HIGH_SEVERITY_THD else 'medium')
+                if state is None:
+                    anomaly = {
+                        'id': next(ANOMALY_IDS),
+                        'motor_id': dev_id,
+                        'timestamp': timestamp,
+                        'end': timestamp,
+                        'thd_value': thd,
+                        'temp_value': temp,
+                        'peak_at': timestamp,
+                        'count': 1,
+                        'severity': severity,
+                        'status': 'open',
+                        'analyzed': False,
+                        'detected_at': time.time()
+                    }
+                    ANOMALY_LOG.append(anomaly)
+                    self.open[dev_id] = {'anomaly': anomaly, 'last': epoch, 'clear': 0, 'seen': time.monotonic()}
+                    return anomaly
+                anomaly = state['anomaly']
+                anomaly['count'] += 1
+                anomaly['end'] = max(anomaly['end'], timestamp)
+                if thd > anomaly['thd_value']:
+                    anomaly['thd_value'] = thd
+                    anomaly['peak_at'] = timestamp
+                anomaly['temp_value'] = max(anomaly['temp_value'], temp)
+                if SEVERITY_RANK.get(severity, 0) > SEVERITY_RANK.get(anomaly['severity'], 0):
+                    anomaly['severity'] = severity
+                    # No INCIDENT_LOCK here (lock order); run_incident_job only marks
+                    # entries still attached to its incident
+                    anomaly['analyzed'] = False
+                    anomaly['incident_id'] = None
+                state['last'] = max(state['last'], epoch)
+                state['clear'] = 0
+                state['seen'] = time.monotonic()
+                return anomaly
+            
+            if state is not None:
+                if thd < CRITICAL_THD - ANOMALY_HYSTERESIS:
+                    state['clear'] += 1
+                    if state['clear'] >= ANOMALY_CLEAR_SAMPLES:
+                        self._close(dev_id, timestamp)
+                else:
+                    # Inside the hysteresis band: still the same episode
+                    state['clear'] = 0
+                    state['last'] = max(state['last'], epoch)
+                    state['seen'] = time.monotonic()
+            return None
+    
+    def sweep(self):
+        """Close episodes of motors that have sent nothing in band for ANOMALY_STALE_AFTER seconds"""
+        cutoff = time.monotonic() - ANOMALY_STALE_AFTER
+        with self.lock:
+            for dev_id, state in list(self.open.items()):
+                if state['seen'] < cutoff:
+                    self._close(dev_id, state['anomaly']['end'])
+    
+    def _close(self, dev_id, timestamp):
+        state = self.open.pop(dev_id)
+        state['anomaly']['status'] = 'closed'
+        state['anomaly']['closed_at'] = timestamp
+    
+    def forget(self, anomaly_id):
+        """Stop tracking an anomaly removed from the log (acknowledged)"""
+        with self.lock:
+            for dev_id, state in list(self.open.items()):
+                if state['anomaly']['id'] == anomaly_id:
+                    del self.open[dev_id]
+    
+    def export(self):
+        with self.lock:
+            return {dev_id: {'id': state['anomaly']['id'], 'last': state['last'], 'clear': state['clear']}
+                    for dev_id, state in self.open.items()}
+    
+    def restore(self, open_states, anomalies):
+        by_id = {a['id']: a for a in anomalies}
+        with self.lock:
+            # Silence before the restart is unknown: the stale clock starts over
+            self.open = {dev_id: {'anomaly': by_id[state['id']], 'last': state['last'], 'clear': state['clear'],
+                                  'seen': time.monotonic()}
+                         for dev_id, state in open_states.items() if state['id'] in by_id}
+
+COALESCER = AnomalyCoalescer()
+
+# Alert rules: a JSON list in ALERT_RULES_PATH, compiled into vectorized
+# predicates that run over each ingested batch. The file is re-read when its
+# mtime changes, checked at most every ALERT_RELOAD_CHECK seconds.
+ALERT_RULES_PATH = 'alert_rules.json'
+ALERT_RELOAD_CHECK = 1.0
+ALERT_LOG_MAX = 10000
+# thd/temp compare readings; *_rate compare the change per minute since the device's previous reading
+ALERT_METRICS = ('thd', 'temp', 'thd_rate', 'temp_rate')
+ALERT_BASELINES = {'thd': 'vibration_baseline', 'temp': 'temp_baseline'}
+ALERT_OPS = {'>': np.greater, '>=': np.greater_equal, '<': np.less, '<=': np.less_equal}
+ALERT_LOG = []
+ALERT_IDS = itertools.count(1)
+
+def compile_alert_rule(spec):
+    """Validate one rule and compile it; raises ValueError.
+
+    {"id": "thd-1.8x", "metric": "thd", "op": ">", "baseline_factor": 1.8,
+     "for": 300, "scope": {"criticality": ["High"]}, "severity": "high"}
+    takes either "value" (absolute) or "baseline_factor" (times the
+    device's baseline), and an optional "scope" of criticality levels
+    and/or "motor_ids".
+    """
+    if not isinstance(spec, dict) or not isinstance(spec.get('id'), str) or not spec['id']:
+        raise ValueError("Every rule needs a string id")
+    rule_id = spec['id']
+    metric = spec.get('metric')
+    if metric not in ALERT_METRICS:
+        raise ValueError(f"{rule_id}: metric must be one of {list(ALERT_METRICS)}")
+    op = spec.get('op', '>')
+    if op not in ALERT_OPS:
+        raise ValueError(f"{rule_id}: op must be one of {list(ALERT_OPS)}")
+    if ('value' in spec) == ('baseline_factor' in spec):
+        raise ValueError(f"{rule_id}: give exactly one of value or baseline_factor")
+    if 'baseline_factor' in spec and metric not in ALERT_BASELINES:
+        raise ValueError(f"{rule_id}: baseline_factor applies to thd or temp only")
+    severity = spec.get('severity', 'medium')
+    if severity not in SEVERITY_RANK:
+        raise ValueError(f"{rule_id}: severity must be one of {list(SEVERITY_RANK)}")
+    scope = spec.get('scope') or {}
+    try:
+        value = float(spec['value']) if 'value' in spec else None
+        factor = float(spec['baseline_factor']) if 'baseline_factor' in spec else None
+        hold = float(spec.get('for', 0))
+        motor_ids = np.array(sorted({int(m) for m in scope['motor_ids']}), dtype=np.int64) if scope.get('motor_ids') else None
+    except (TypeError, ValueError):
+        raise ValueError(f"{rule_id}: value, baseline_factor, for and motor_ids must be numeric")
+    if hold < 0:
+        raise ValueError(f"{rule_id}: for must be >= 0 seconds")
+    return {
+        'id': rule_id,
+        'name': spec.get('name') or rule_id,
+        'spec': spec,
+        'enabled': bool(spec.get('enabled', True)),
+        'metric': metric,
+        'op': ALERT_OPS[op],
+        'value': value,
+        'factor': factor,
+        'baseline': ALERT_BASELINES.get(metric),
+        'hold': hold,
+        'criticality': frozenset(scope['criticality']) if scope.get('criticality') else None,
+        'motor_ids': motor_ids,
+        'severity': severity
+    }
+
+def compile_alert_rules(specs):
+    if isinstance(specs, dict):
+        specs = specs.get('rules')
+    if not isinstance(specs, list):
+        raise ValueError("Alert rules must be a JSON list (or {\"rules\": [...]})")
+    rules = [compile_alert_rule(spec) for spec in specs]
+    ids = [r['id'] for r in rules]
+    if len(set(ids)) != len(ids):
+        raise ValueError("Rule ids must be unique")
+    return rules
+
+class AlertEngine:
+    """Evaluates compiled alert rules over ingested batches.
+
+    A batch is sorted by device once; every rule is then a handful of NumPy
+    operations over the whole batch (comparison, scope mask, run detection
+    for "for" holds), with Python only touching the few samples where an
+    alert opens or clears. An alert opens when its condition has held for
+    the rule's "for" seconds and stays open until the condition clears, so
+    a sustained breach raises one alert. Run starts and the previous reading
+    per device carry across batches.
+    """
+    
+    def __init__(self, path=ALERT_RULES_PATH):
+        self.path = path
+        self.lock = threading.Lock()
+        self.rules = []
+        self.mtime = None
+        self.checked = 0.0
+        self.error = None
+        self.last = {}
+        self.since = {}
+        self.active = {}
+        self.stats = {'batches': 0, 'samples': 0, 'eval_ms': 0.0, 'fired': 0, 'reloads': 0}
+    
+    def reload(self, force=False):
+        """Recompile the rules if the file changed since the last check"""
+        now = time.monotonic()
+        if not force and now - self.checked < ALERT_RELOAD_CHECK:
+            return
+        self.checked = now
+        try:
+            mtime = os.stat(self.path).st_mtime_ns
+        except FileNotFoundError:
+            mtime = None
+        if mtime == self.mtime and not force:
+            return
+        try:
+            rules = []
+            if mtime is not None:
+                with open(self.path) as f:
+                    rules = compile_alert_rules(json.load(f))
+        except (OSError, ValueError) as e:
+            self.mtime = mtime
+            self.error = str(e)
+            print(f"Alert rules in {self.path} not loaded, keeping the previous set: {e}")
+            return
+        self.mtime = mtime
+        self.error = None
+        self.set_rules(rules)
+    
+    def set_rules(self, rules):
+        """Swap in compiled rules; unchanged rules keep their run state and open alerts"""
+        with self.lock:
+            kept = {r['id'] for r in rules if any(old['id'] == r['id'] and old['spec'] == r['spec'] for old in self.rules)}
+            now = datetime.now().isoformat()
+            for key, alert in list(self.active.items()):
+                if key[0] not in kept:
+                    alert['status'] = 'closed'
+                    alert['closed_at'] = now
+                    del self.active[key]
+            self.since = {key: t for key, t in self.since.items() if key[0] in kept}
+            self.rules = rules
+            self.stats['reloads'] += 1
+    
+    def evaluate(self, ids, ts, thd, temp, devices):
+        """ids/ts/thd/temp: parallel arrays of known-device samples; devices: id -> motors row"""
+        self.reload()
+        if not len(ids):
+            return []
+        started = time.perf_counter()
+        with self.lock:
+            order = np.argsort(ids, kind='stable')
+            ids, ts, thd, temp = ids[order], ts[order], thd[order], temp[order]
+            n = len(ids)
+            new_dev = np.ones(n, dtype=bool)
+            new_dev[1:] = ids[1:] != ids[:-1]
+            firsts = np.flatnonzero(new_dev)
+            lasts = np.append(firsts[1:] - 1, n - 1)
+            uniq, inverse = np.unique(ids, return_inverse=True)
+            rows = [devices[dev_id] for dev_id in uniq.tolist()]
+            
+            # Per-minute rates against the previous reading, carried across batches
+            prev = np.array([self.last.get(dev_id, (np.nan, np.nan, np.nan)) for dev_id in ids[firsts].tolist()]).reshape(-1, 3)
+            prev_ts, prev_thd, prev_temp = np.roll(ts, 1), np.roll(thd, 1), np.roll(temp, 1)
+            prev_ts[firsts], prev_thd[firsts], prev_temp[firsts] = prev[:, 0], prev[:, 1], prev[:, 2]
+            minutes = (ts - prev_ts) / 60
+            minutes[~(minutes > 0)] = np.nan
+            columns = {'thd': thd, 'temp': temp, 'thd_rate': (thd - prev_thd) / minutes, 'temp_rate': (temp - prev_temp) / minutes}
+            baselines = {name: np.array([np.nan if r[name] is None else r[name] for r in rows], dtype=np.float64)[inverse]
+                         for name in ALERT_BASELINES.values()}
+            
+            fired = []
+            for rule in self.rules:
+                if not rule['enabled']:
+                    continue
+                threshold = rule['value'] if rule['factor'] is None else rule['factor'] * baselines[rule['baseline']]
+                with np.errstate(invalid='ignore'):
+                    mask = rule['op'](columns[rule['metric']], threshold)
+                if rule['criticality'] is not None:
+                    mask &= np.array([r['criticality'] in rule['criticality'] for r in rows])[inverse]
+                if rule['motor_ids'] is not None:
+                    mask &= np.isin(ids, rule['motor_ids'])
+                fired.extend(self._advance(rule, mask, threshold, columns[rule['metric']], ids, ts, firsts, lasts, new_dev))
+            
+            for i in lasts.tolist():
+                self.last[int(ids[i])] = (float(ts[i]), float(thd[i]), float(temp[i]))
+            if len(ALERT_LOG) > ALERT_LOG_MAX:
+                del ALERT_LOG[:len(ALERT_LOG) - ALERT_LOG_MAX]
+            self.stats['batches'] += 1
+            self.stats['samples'] += n
+            self.stats['fired'] += len(fired)
+            self.stats['eval_ms'] += (time.perf_counter() - started) * 1000
+        return fired
+    
+    def _advance(self, rule, mask, threshold, values, ids, ts, firsts, lasts, new_dev):
+        """Track condition runs for one rule; open/close alerts at run boundaries"""
+        rule_id, n = rule['id'], len(mask)
+        carried = np.array([(rule_id, dev_id) in self.since for dev_id in ids[firsts].tolist()], dtype=bool)
+        prev_mask = np.roll(mask, 1)
+        prev_mask[firsts] = carried
+        starts = mask & ~prev_mask
+        # Index of the sample where each sample's current run started (batch-local)
+        run_idx = np.maximum.accumulate(np.where(mask & (~prev_mask | new_dev), np.arange(n), 0))
+        origin = ts.copy()
+        for i, dev_id in zip(firsts[carried].tolist(), ids[firsts[carried]].tolist()):
+            origin[i] = self.since[(rule_id, dev_id)]
+        run_start = origin[run_idx]
+        held = mask & (ts - run_start >= rule['hold'])
+        prev_held = np.roll(held, 1)
+        prev_held[starts | new_dev] = False
+        opens = held & ~prev_held
+        ends = ~mask & prev_mask
+        
+        fired = []
+        for i in np.flatnonzero(opens | ends).tolist():
+            key = (rule_id, int(ids[i]))
+            if ends[i]:
+                alert = self.active.pop(key, None)
+                if alert is not None:
+                    alert['status'] = 'closed'
+                    alert['closed_at'] = to_iso(float(ts[i]))
+                continue
+            if key in self.active:
+                continue
+            limit = threshold if np.ndim(threshold) == 0 else threshold[i]
+            alert = {
+                'id': next(ALERT_IDS),
+                'rule_id': rule_id,
+                'rule': rule['name'],
+                'motor_id': key[1],
+                'timestamp': to_iso(float(ts[i])),
+                'since': to_iso(float(run_start[i])),
+                'metric': rule['metric'],
+                'value': round(float(values[i]), 3),
+                'threshold': round(float(limit), 3),
+                'severity': rule['severity'],
+                'status': 'open'
+            }
+            self.active[key] = alert
+            ALERT_LOG.append(alert)
+            fired.append(alert)
+        
+        for i in lasts.tolist():
+            key = (rule_id, int(ids[i]))
+            if mask[i]:
+                self.since[key] = float(run_start[i])
+            else:
+                self.since.pop(key, None)
+        return fired
+    
+    def export(self):
+        with self.lock:
+            return {'last': dict(self.last), 'since': dict(self.since),
+                    'active': {key: alert['id'] for key, alert in self.active.items()}}
+    
+    def restore(self, state, alerts):
+        by_id = {a['id']: a for a in alerts}
+        with self.lock:
+            self.last = dict(state.get('last', {}))
+            self.since = dict(state.get('since', {}))
+            self.active = {key: by_id[alert_id] for key, alert_id in state.get('active', {}).items() if alert_id in by_id}
+    
+    def status(self):
+        return {
+            'path': self.path,
+            'rules': [r['spec'] for r in self.rules],
+            'error': self.error,
+            'open_alerts': len(self.active),
+            'thresholds': THRESHOLDS,
+            **self.stats
+        }
+
+ALERTS = AlertEngine()
+
+def ingest_samples(samples, recovered=False):
+    """Score and store a batch of {id, thd, temp[, timestamp]} samples.
+
+    This is the single telemetry pipeline: health score, device status,
+    anomaly detection and history/index updates. The batch shares one DB
+    connection and transaction; results come back in input order. The
+    batch is journaled and synced before anything is applied, so a failed
+    fsync leaves no trace in memory or the database and a client retry
+    cannot double-apply it. Batches are applied in LSN order; recovered
+    batches (journal replay) are neither journaled nor recorded.
+    """
+    now = time.time()
+    rows = [(int(x['id']), to_epoch(x.get('timestamp')) or now, float(x['thd']), float(x['temp'])) for x in samples]
+    if not recovered and RECORDER.file:
+        RECORDER.record(rows, now)
+    
+    lsn = None if recovered else JOURNAL.append(rows)
+    # Raises before any state changes if the batch could not be made durable
+    JOURNAL.wait(lsn)
+    with STATE_LOCK:
+        try:
+            return apply_samples(samples, rows)
+        finally:
+            JOURNAL.applied(lsn)
+
+def apply_samples(samples, rows):
+    """Apply a journaled batch to state, DB and alerts (caller holds STATE_LOCK)"""
+    conn = get_db()
+    devices = {}
+    results = []
+    for sample, (dev_id, epoch, thd, temp) in zip(samples, rows):
+        timestamp = to_iso(sample.get('timestamp') or epoch)
+        
+        if dev_id not in devices:
+            devices[dev_id] = conn.execute('SELECT * FROM motors WHERE id = ?', (dev_id,)).fetchone()
+        device = devices[dev_id]
+        if not device:
+            results.append({'id': dev_id, 'status': 'unknown_device'})
+            continue
+        if device['vibration_baseline'] is None or device['temp_baseline'] is None:
+            # Motors onboarded without readings take their first sample as the baseline
+            conn.execute('''UPDATE motors SET vibration_baseline = COALESCE(vibration_baseline, ?),
+                temp_baseline = COALESCE(temp_baseline, ?) WHERE id = ?''', (thd, temp, dev_id))
+            device = devices[dev_id] = conn.execute('SELECT * FROM motors WHERE id = ?', (dev_id,)).fetchone()
+        
+        history = TELEMETRY_HISTORY.get(dev_id, [])
+        new_health = calculate_health_score(dev_id, thd, temp,
+                                           device['vibration_baseline'],
+                                           device['temp_baseline'],
+                                           history, conn)
+        
+        if new_health < HEALTH_CRITICAL:
+            status = 'Critical'
+        elif new_health < HEALTH_WARNING:
+            status = 'Warning'
+        else:
+            status = 'Active'
+        
+        conn.execute('UPDATE motors SET last_thd = ?, last_temp = ?, health = ?, status = ? WHERE id = ?',
+                    (thd, temp, new_health, status, dev_id))
+        
+        COALESCER.observe(dev_id, timestamp, thd, temp)
+        
+        record_telemetry(dev_id, {
+            'timestamp': timestamp,
+            'thd': thd,
+            'temp': temp
+        })
+        results.append({'id': dev_id, 'thd': thd, 'temp': temp, 'health': new_health, 'status': status})
+    
+    known = [row for row in rows if devices.get(row[0])]
+    if known:
+        batch = np.array(known, dtype=np.float64)
+        ALERTS.evaluate(batch[:, 0].astype(np.int64), batch[:, 1], batch[:, 2], batch[:, 3], devices)
+    conn.commit()
+    conn.close()
+    return results
+
+# Ingest recording: one fixed-size little-endian record per sample
+# (arrival epoch, sample epoch, motor id, thd, temp) after a magic header
+RECORDINGS_DIR = 'recordings'
+RECORD_MAGIC = b'ZTR1'
+RECORD_FORMAT = struct.Struct('<ddIff')
+
+class TelemetryRecorder:
+    """Append every ingested sample to a compact binary file for replay.py"""
+    
+    def __init__(self, directory=RECORDINGS_DIR):
+        self.directory = directory
+        self.lock = threading.Lock()
+        self.file = None
+        self.name = None
+        self.count = 0
+        self.started = None
+    
+    def start(self, name=None):
+        name = os.path.basename(name or f"ingest-{datetime.now():%Y%m%d-%H%M%S}.ztr")
+        with self.lock:
+            if self.file:
+                raise RuntimeError(f"Already recording to {self.name}")
+            os.makedirs(self.directory, exist_ok=True)
+            path = os.path.join(self.directory, name)
+            self.file = open(path, 'ab', buffering=1024 * 1024)
+            if self.file.tell() == 0:
+                self.file.write(RECORD_MAGIC)
+            self.name, self.count, self.started = name, 0, time.time()
+        return self.status()
+    
+    def stop(self):
+        with self.lock:
+            if self.file:
+                self.file.close()
+            self.file = None
+        return self.status()
+    
+    def record(self, samples, arrival):
+        """samples: iterable of (motor_id, epoch, thd, temp)"""
+        payload = b''.join(RECORD_FORMAT.pack(arrival, ts, dev_id, thd, temp) for dev_id, ts, thd, temp in samples)
+        with self.lock:
+            if self.file:
+                self.file.write(payload)
+                self.count += len(payload) // RECORD_FORMAT.size
+    
+    def status(self):
+        return {'recording': self.file is not None, 'file': self.name, 'samples': self.count, 'started': self.started}
+
+RECORDER = TelemetryRecorder()
+
+# Gateway listener: fixed 24-byte little-endian records, back to back in a
+# UDP datagram or a TCP stream (motor id u32, sample epoch f64 or 0 for
+# arrival time, thd f32, temp f32, per-device sequence number u32)
+GATEWAY_HOST = '0.0.0.0'
+GATEWAY_UDP_PORT = 9750
+GATEWAY_TCP_PORT = 9751
+GATEWAY_RECORD = np.dtype([('id', '<u4'), ('ts', '<f8'), ('thd', '<f4'), ('temp', '<f4'), ('seq', '<u4')])
+GATEWAY_BATCH_SIZE = 500
+GATEWAY_FLUSH_INTERVAL = 0.05
+# Samples waiting for ingest before new UDP batches are dropped
+GATEWAY_MAX_BACKLOG = 50000
+# A sequence at or below this that jumps backwards is a device restart
+GATEWAY_SEQ_RESTART = 16
+
+class GatewayDatagramProtocol(asyncio.DatagramProtocol):
+    def __init__(self, listener):
+        self.listener = listener
+    
+    def datagram_received(self, data, addr):
+        self.listener.stats['udp_datagrams'] += 1
+        self.listener.receive(data)
+
+class GatewayListener:
+    """asyncio UDP/TCP receiver feeding binary gateway records into ingest_samples.
+
+    Records are decoded on the event loop and batched; each batch is scored
+    on a single ingest thread so samples keep their arrival order. TCP
+    connections submit their own batches and wait for room in the backlog
+    (backpressure); buffered UDP batches are dropped once
+    GATEWAY_MAX_BACKLOG samples are pending.
+    """
+    
+    def __init__(self, host=GATEWAY_HOST, udp_port=GATEWAY_UDP_PORT, tcp_port=GATEWAY_TCP_PORT):
+        self.host, self.udp_port, self.tcp_port = host, udp_port, tcp_port
+        self.loop = None
+        self.thread = None
+        self.buffer = []
+        self.backlog = 0
+        # Set whenever an ingest batch completes so blocked TCP readers recheck the backlog
+        self.drained = asyncio.Event()
+        self.pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix='gateway-ingest')
+        self.sequences = {}
+        self.stats = {'udp_datagrams': 0, 'tcp_connections': 0, 'bytes': 0, 'records': 0,
+                      'malformed_bytes': 0, 'dropped': 0, 'batches': 0, 'unknown_devices': 0}
+        self.error = None
+    
+    def decode(self, data):
+        """Decode whole records from data into ingest samples"""
+        usable = len(data) - len(data) % GATEWAY_RECORD.itemsize
+        self.stats['bytes'] += len(data)
+        self.stats['malformed_bytes'] += len(data) - usable
+        records = np.frombuffer(data, GATEWAY_RECORD, count=usable // GATEWAY_RECORD.itemsize)
+        now = time.time()
+        samples = []
+        for dev_id, ts, thd, temp, seq in records.tolist():
+            self.track(dev_id, seq)
+            samples.append({'id': dev_id, 'thd': round(thd, 3), 'temp': round(temp, 3), 'timestamp': ts or now})
+        self.stats['records'] += len(records)
+        return samples
+    
+    def receive(self, data):
+        """Buffer a UDP datagram; returns the ingest future if a batch was flushed"""
+        self.buffer.extend(self.decode(data))
+        if len(self.buffer) >= GATEWAY_BATCH_SIZE:
+            return self.flush()
+        return None
+    
+    def track(self, dev_id, seq):
+        """Per-device sequence accounting: lost (gaps), out of order/duplicate, restarts"""
+        state = self.sequences.get(dev_id)
+        if state is None:
+            self.sequences[dev_id] = {'last_seq': seq, 'received': 1, 'lost': 0, 'out_of_order': 0, 'restarts': 0}
+            return
+        state['received'] += 1
+        delta = (seq - state['last_seq']) & 0xFFFFFFFF
+        if 0 < delta < 0x80000000:
+            state['lost'] += delta - 1
+            state['last_seq'] = seq
+        elif seq <= GATEWAY_SEQ_RESTART < state['last_seq']:
+            state['restarts'] += 1
+            state['last_seq'] = seq
+        else:
+            # Late arrival fills a gap counted earlier; a repeat of the last seq is a duplicate
+            state['out_of_order'] += 1
+            if delta and state['lost']:
+                state['lost'] -= 1
+    
+    def flush(self):
+        """Submit buffered UDP samples, dropping them if the backlog is full"""
+        if not self.buffer:
+            return None
+        batch, self.buffer = self.buffer, []
+        if self.backlog + len(batch) > GATEWAY_MAX_BACKLOG:
+            self.stats['dropped'] += len(batch)
+            return None
+        return self.submit(batch)
+    
+    def submit(self, batch):
+        self.backlog += len(batch)
+        future = self.loop.run_in_executor(self.pool, ingest_samples, batch)
+        future.add_done_callback(lambda f, n=len(batch): self._ingested(f, n))
+        return future
+    
+    def _ingested(self, future, count):
+        self.backlog -= count
+        self.stats['batches'] += 1
+        self.drained.set()
+        if future.exception():
+            print(f"Gateway ingest failed: {future.exception()}")
+            return
+        self.stats['unknown_devices'] += sum(1 for r in future.result() if r.get('status') == 'unknown_device')
+    
+    async def _flush_loop(self):
+        while True:
+            await asyncio.sleep(GATEWAY_FLUSH_INTERVAL)
+            self.flush()
+    
+    async def _handle_tcp(self, reader, writer):
+        self.stats['tcp_connections'] += 1
+        pending = b''
+        try:
+            while True:
+                data = await reader.read(64 * 1024)
+                if not data:
+                    break
+                data = pending + data
+                usable = len(data) - len(data) % GATEWAY_RECORD.itemsize
+                pending = data[usable:]
+                samples = self.decode(data[:usable])
+                if not samples:
+                    continue
+                # TCP never drops: wait for room in the backlog (an oversized
+                # chunk goes through once the backlog is empty)
+                while self.backlog and self.backlog + len(samples) > GATEWAY_MAX_BACKLOG:
+                    self.drained.clear()
+                    await self.drained.wait()
+                await self.submit(samples)
+        except ConnectionError:
+            pass
+        finally:
+            self.stats['malformed_bytes'] += len(pending)
+            writer.close()
+    
+    async def serve(self):
+        """Run on the current event loop until cancelled"""
+        loop = asyncio.get_running_loop()
+        # Datagrams and connections can arrive as soon as the endpoints exist
+        self.loop = loop
+        try:
+            transport, _ = await loop.create_datagram_endpoint(
+                lambda: GatewayDatagramProtocol(self), local_addr=(self.host, self.udp_port))
+            server = await asyncio.start_server(self._handle_tcp, self.host, self.tcp_port)
+        except OSError as e:
+            self.error = str(e)
+            print(f"Gateway listener not started: {e}")
+            return
+        flusher = asyncio.ensure_future(self._flush_loop())
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            flusher.cancel()
+            transport.close()
+            self.flush()
+    
+    def start(self):
+        """Serve from a daemon thread with its own event loop"""
+        self.thread = threading.Thread(target=asyncio.run, args=(self.serve(),), name='gateway-listener', daemon=True)
+        self.thread.start()
+        return self.thread
+    
+    def status(self, dev_id=None):
+        if dev_id is not None:
+            return self.sequences.get(dev_id)
+        devices = list(self.sequences.values())
+        received = sum(d['received'] for d in devices)
+        lost = sum(d['lost'] for d in devices)
+        return {
+            'listening': self.loop is not None and self.error is None,
+            'udp_port': self.udp_port,
+            'tcp_port': self.tcp_port,
+            'error': self.error,
+            **self.stats,
+            'backlog': self.backlog,
+            'devices': len(devices),
+            'lost': lost,
+            'out_of_order': sum(d['out_of_order'] for d in devices),
+            'restarts': sum(d['restarts'] for d in devices),
+            'loss_rate': round(lost / (received + lost), 6) if received + lost else 0.0
+        }
+
+GATEWAY = GatewayListener()
+
+# Write-ahead ingest journal: append-only segments named by their first
+# LSN, each a magic header then records of (lsn u64, samples u32, crc32 u32)
+# followed by the samples (motor id u32, epoch f64, thd f64, temp f64)
+JOURNAL_DIR = 'journal'
+JOURNAL_MAGIC = b'ZWL1'
+JOURNAL_HEADER = struct.Struct('<QII')
+JOURNAL_SAMPLE = np.dtype([('id', '<u4'), ('ts', '<f8'), ('thd', '<f8'), ('temp', '<f8')])
+JOURNAL_SEGMENT_BYTES = 64 * 1024 * 1024
+# Group commit: one fsync covers every record appended in this window
+JOURNAL_SYNC_INTERVAL = 0.01
+# Closed segments older than the in-memory window are no longer needed to rebuild it
+JOURNAL_RETENTION = INDEX_MAX_POINTS
+
+class IngestJournal:
+    """Crash-safe journal of ingested samples with group-commit fsync.
+
+    ingest_samples appends each batch and waits for it to be synced before
+    applying it, so an acknowledged sample survives a crash and a batch
+    whose fsync failed was never applied. wait() also holds a batch until
+    every earlier LSN has been applied, so live state is built in the same
+    order replay uses. A background thread fsyncs every JOURNAL_SYNC_INTERVAL; callers
+    arriving within the same interval share one fsync. On startup open()
+    replays records after the checkpoint LSN through ingest_samples.
+    """
+    
+    def __init__(self, directory=JOURNAL_DIR):
+        self.directory = directory
+        self.lock = threading.Lock()
+        self.synced = threading.Condition(threading.Lock())
+        self.file = None
+        self.segment_lsn = None
+        self.next_lsn = 1
+        self.written_lsn = 0
+        self.synced_lsn = 0
+        self.applied_lsn = 0
+        self.checkpoint_lsn = 0
+        self.error = None
+        self.stats = {'records': 0, 'samples': 0, 'bytes': 0, 'syncs': 0, 'last_sync_ms': None, 'sync_errors': 0,
+                      'replayed_records': 0, 'replayed_samples': 0, 'corrupt_bytes': 0}
+    
+    def _path(self, lsn):
+        return os.path.join(self.directory, f"{lsn:020d}.wal")
+    
+    def segments(self):
+        """(first lsn, path) of every segment, oldest first"""
+        if not os.path.isdir(self.directory):
+            return []
+        return sorted((int(name[:-4]), os.path.join(self.directory, name))
+                      for name in os.listdir(self.directory) if name.endswith('.wal') and name[:-4].isdigit())
+    
+    def _read_checkpoint(self):
+        try:
+            with open(os.path.join(self.directory, 'checkpoint')) as f:
+                return int(f.read().strip() or 0)
+        except FileNotFoundError:
+            return 0
+    
+    def _sync_directory(self):
+        fd = os.open(self.directory, os.O_RDONLY)
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+    
+    def read_segment(self, path):
+        """Yield (lsn, samples array) for each intact record; a torn tail is truncated"""
+        with open(path, 'rb') as f:
+            data = f.read()
+        if data[:len(JOURNAL_MAGIC)] != JOURNAL_MAGIC:
+            print(f"Journal: skipping {path}, bad header")
+            self.stats['corrupt_bytes'] += len(data)
+            return
+        offset = len(JOURNAL_MAGIC)
+        while offset + JOURNAL_HEADER.size <= len(data):
+            lsn, count, crc = JOURNAL_HEADER.unpack_from(data, offset)
+            end = offset + JOURNAL_HEADER.size + count * JOURNAL_SAMPLE.itemsize
+            payload = data[offset + JOURNAL_HEADER.size:end]
+            if end > len(data) or zlib.crc32(payload, zlib.crc32(data[offset:offset + 12])) != crc:
+                break
+            yield lsn, np.frombuffer(payload, JOURNAL_SAMPLE)
+            offset = end
+        if offset < len(data):
+            # A crash mid-append leaves a partial record; drop it so the segment stays parseable
+            print(f"Journal: truncating {len(data) - offset} bytes of torn or corrupt data in {path}")
+            self.stats['corrupt_bytes'] += len(data) - offset
+            with open(path, 'r+b') as f:
+                f.truncate(offset)
+                os.fsync(f.fileno())
+    
+    def open(self, replay=True, after_lsn=0):
+        """Replay records after the checkpoint (or after_lsn, if later), then
+        start a fresh segment and the sync thread"""
+        os.makedirs(self.directory, exist_ok=True)
+        self.checkpoint_lsn = self._read_checkpoint()
+        replay_from = max(self.checkpoint_lsn, after_lsn)
+        last_lsn = replay_from
+        batch = []
+        for _, path in self.segments():
+            for lsn, samples in self.read_segment(path):
+                last_lsn = max(last_lsn, lsn)
+                if not replay or lsn <= replay_from:
+                    continue
+                batch.extend({'id': int(dev_id), 'timestamp': ts, 'thd': thd, 'temp': temp}
+                             for dev_id, ts, thd, temp in samples.tolist())
+                self.stats['replayed_records'] += 1
+                self.stats['replayed_samples'] += len(samples)
+                if len(batch) >= TELEMETRY_BATCH_MAX:
+                    ingest_samples(batch, recovered=True)
+                    batch = []
+        if batch:
+            ingest_samples(batch, recovered=True)
+        if self.stats['replayed_records']:
+            print(f"Journal: replayed {self.stats['replayed_samples']} samples from "
+                  f"{self.stats['replayed_records']} records after LSN {replay_from}")
+        
+        with self.lock:
+            self.written_lsn = self.synced_lsn = self.applied_lsn = last_lsn
+            self.next_lsn = last_lsn + 1
+            self._rotate()
+        threading.Thread(target=self._sync_loop, name='journal-sync', daemon=True).start()
+        return self.status()
+    
+    def _rotate(self):
+        """Seal the current segment and start a new one at next_lsn (caller holds the lock)"""
+        if self.file:
+            self.file.flush()
+            os.fsync(self.file.fileno())
+            self.file.close()
+        self.segment_lsn = self.next_lsn
+        self.file = open(self._path(self.segment_lsn), 'ab', buffering=1024 * 1024)
+        if self.file.tell() == 0:
+            self.file.write(JOURNAL_MAGIC)
+            self.file.flush()
+        self._sync_directory()
+    
+    def append(self, rows):
+        """rows: list of (motor id, epoch, thd, temp); returns the record's LSN"""
+        if self.file is None or not rows:
+            return None
+        payload = np.array(rows, dtype=JOURNAL_SAMPLE).tobytes()
+        with self.lock:
+            lsn = self.next_lsn
+            prefix = struct.pack('<QI', lsn, len(rows))
+            self.file.write(JOURNAL_HEADER.pack(lsn, len(rows), zlib.crc32(payload, zlib.crc32(prefix))))
+            self.file.write(payload)
+            self.next_lsn += 1
+            self.written_lsn = lsn
+            self.stats['records'] += 1
+            self.stats['samples'] += len(rows)
+            self.stats['bytes'] += JOURNAL_HEADER.size + len(payload)
+            if self.file.tell() >= JOURNAL_SEGMENT_BYTES:
+                self._rotate()
+                rotated = True
+            else:
+                rotated = False
+        if rotated:
+            self._mark_synced(lsn)
+            self._expire()
+        return lsn
+    
+    def wait(self, lsn):
+        """Block until the record at lsn is on disk and its turn to be applied
+        has come; raises OSError if syncing has failed"""
+        if lsn is None:
+            return
+        with self.synced:
+            while self.synced_lsn < lsn or self.applied_lsn < lsn - 1:
+                if self.error and self.synced_lsn < lsn:
+                    raise OSError(f"Journal sync failed, batch not durable: {self.error}")
+                self.synced.wait()
+    
+    def applied(self, lsn):
+        """The batch at lsn is in memory and the database (or failed applying); let the next one go"""
+        if lsn is None:
+            return
+        with self.synced:
+            self.applied_lsn = max(self.applied_lsn, lsn)
+            self.synced.notify_all()
+    
+    def _mark_synced(self, lsn):
+        with self.synced:
+            if lsn > self.synced_lsn:
+                self.synced_lsn = lsn
+                self.synced.notify_all()
+    
+    def _sync_loop(self):
+        while True:
+            time.sleep(JOURNAL_SYNC_INTERVAL)
+            with self.lock:
+                target = self.written_lsn
+                if target <= self.synced_lsn:
+                    continue
+                self.file.flush()
+                fd = self.file.fileno()
+                segment = self.segment_lsn
+            started = time.perf_counter()
+            try:
+                os.fsync(fd)
+            except OSError as e:
+                with self.lock:
+                    rotated = self.segment_lsn != segment
+                if not rotated:
+                    # A failed fsync may have dropped the dirty pages, so a later
+                    # success proves nothing: stop acknowledging for good
+                    with self.synced:
+                        self.stats['sync_errors'] += 1
+                        self.error = str(e)
+                        self.synced.notify_all()
+                    print(f"Journal: fsync failed, no further batches will be acknowledged: {e}")
+                    return
+                # The segment was sealed (and synced) by a rotation in the meantime
+            self.stats['syncs'] += 1
+            self.stats['last_sync_ms'] = round((time.perf_counter() - started) * 1000, 3)
+            self._mark_synced(target)
+    
+    def checkpoint(self, lsn):
+        """Everything up to lsn is persisted elsewhere: record it and delete segments wholly before it"""
+        lsn = min(lsn, self.written_lsn)
+        if lsn <= self.checkpoint_lsn:
+            return self.checkpoint_lsn
+        path = os.path.join(self.directory, 'checkpoint')
+        with open(path + '.tmp', 'w') as f:
+            f.write(str(lsn))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(path + '.tmp', path)
+        self._sync_directory()
+        self.checkpoint_lsn = lsn
+        
+        segments = self.segments()
+        for (first, path), (following, _) in zip(segments, segments[1:]):
+            if following - 1 <= lsn and first != self.segment_lsn:
+                os.remove(path)
+        return lsn
+    
+    def _expire(self):
+        """Checkpoint past sealed segments that fall outside JOURNAL_RETENTION"""
+        segments = self.segments()
+        cutoff = time.time() - JOURNAL_RETENTION
+        expired = [following - 1 for (first, path), (following, _) in zip(segments, segments[1:])
+                   if os.path.getmtime(path) < cutoff]
+        if expired:
+            self.checkpoint(max(expired))
+    
+    def status(self):
+        segments = self.segments()
+        return {
+            'enabled': self.file is not None,
+            'directory': self.directory,
+            'segments': len(segments),
+            'disk_bytes': sum(os.path.getsize(path) for _, path in segments),
+            'next_lsn': self.next_lsn,
+            'synced_lsn': self.synced_lsn,
+            'applied_lsn': self.applied_lsn,
+            'checkpoint_lsn': self.checkpoint_lsn,
+            'error': self.error,
+            **self.stats
+        }
+
+JOURNAL = IngestJournal()
+
+# Raw waveform analysis
+WAVEFORM_HARMONICS = 25
+WAVEFORM_MAX_BYTES = 64 * 1024 * 1024
+# Batches with fewer frames than this are cheaper to transform in-process
+WAVEFORM_POOL_MIN_FRAMES = 64
+WAVEFORM_POOL = None
+LATEST_WAVEFORM_FEATURES = {}
+
+def waveform_features(frames, sample_rate, fundamental):
+    """THD (%), RMS, crest factor and kurtosis for a (frames, N) float array"""
+    frames = np.asarray(frames, dtype=np.float64)
+    n = frames.shape[1]
+    spectrum = np.abs(np.fft.rfft(frames * np.hanning(n), axis=1))
+    
+    # Harmonic bins, taking the peak of each bin's neighbours to absorb leakage
+    orders = np.arange(1, WAVEFORM_HARMONICS + 1)
+    bins = np.rint(orders * fundamental * n / sample_rate).astype(int)
+    bins = bins[(bins >= 1) & (bins < spectrum.shape[1] - 1)]
+    peaks = np.maximum(np.maximum(spectrum[:, bins - 1], spectrum[:, bins]), spectrum[:, bins + 1])
+    fund = peaks[:, 0]
+    harmonics = np.sqrt((peaks[:, 1:] ** 2).sum(axis=1))
+    thd = np.where(fund > 0, 100 * harmonics / np.maximum(fund, 1e-12), 0.0)
+    
+    mean = frames.mean(axis=1, keepdims=True)
+    centered = frames - mean
+    var = (centered ** 2).mean(axis=1)
+    rms = np.sqrt((frames ** 2).mean(axis=1))
+    peak = np.abs(frames).max(axis=1)
+    return {
+        'thd': thd,
+        'rms': rms,
+        'crest_factor': np.where(rms > 0, peak / np.maximum(rms, 1e-12), 0.0),
+        'kurtosis': np.where(var > 0, (centered ** 4).mean(axis=1) / np.maximum(var, 1e-24) ** 2, 0.0)
+    }
+
+def get_waveform_pool():
+    global WAVEFORM_POOL
+    if WAVEFORM_POOL is None:
+        WAVEFORM_POOL = ProcessPoolExecutor(max_workers=os.cpu_count() or 2)
+    return WAVEFORM_POOL
+
+def compute_waveform_features(frames, sample_rate, fundamental):
+    """Batched FFT features; large batches are split across the process pool"""
+    if len(frames) < WAVEFORM_POOL_MIN_FRAMES:
+        return waveform_features(frames, sample_rate, fundamental)
+    pool = get_waveform_pool()
+    chunks = np.array_split(frames, min(len(frames) // (WAVEFORM_POOL_MIN_FRAMES // 2), os.cpu_count() or 2))
+    parts = list(pool.map(waveform_features, chunks, itertools.repeat(sample_rate), itertools.repeat(fundamental)))
+    return {key: np.concatenate([p[key] for p in parts]) for key in parts[0]}
+
+# Raw waveform archive: per-motor append-only segments of fixed-size
+# float32 frames (.f32) with a float64 timestamp per frame (.idx)
+WAVEFORM_ARCHIVE_DIR = 'waveform_archive'
+WAVEFORM_SEGMENT_BYTES = 64 * 1024 * 1024
+WAVEFORM_RETENTION_DAYS = 90
+WAVEFORM_ARCHIVE_MAX_BYTES = 2 * 1024 * 1024 * 1024
+# Frames summarized for an AI report; longer windows are strided
+REPORT_MAX_FRAMES = 2048
+
+class WaveformArchive:
+    """Append-only, memory-mapped raw waveform store, one directory per motor.
+
+    Each segment is a .f32 file of frame_size float32 samples per frame, a
+    .idx file with one float64 epoch timestamp per frame and a .json
+    sidecar with frame_size/sample_rate. The index is written after the
+    frames, so a torn write leaves at most unindexed trailing frames.
+    Reads return numpy.memmap views; retention drops whole segments.
+    """
+    
+    def __init__(self, root=WAVEFORM_ARCHIVE_DIR, segment_bytes=WAVEFORM_SEGMENT_BYTES,
+                 retention_days=WAVEFORM_RETENTION_DAYS, max_bytes=WAVEFORM_ARCHIVE_MAX_BYTES):
+        self.root = root
+        self.segment_bytes = segment_bytes
+        self.retention_seconds = retention_days * 86400
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+    
+    def _motor_dir(self, motor_id):
+        return os.path.join(self.root, str(int(motor_id)))
+    
+    def segments(self, motor_id):
+        """Segment metadata for a motor, oldest first"""
+        directory = self._motor_dir(motor_id)
+        if not os.path.isdir(directory):
+            return []
+        found = []
+        for name in sorted(os.listdir(directory)):
+            if not name.endswith('.json'):
+                continue
+            base = os.path.join(directory, name[:-5])
+            with open(base + '.json') as f:
+                meta = json.load(f)
+            frame_bytes = meta['frame_size'] * 4
+            frames = min(os.path.getsize(base + '.f32') // frame_bytes, os.path.getsize(base + '.idx') // 8)
+            meta.update(base=base, frames=frames, bytes=os.path.getsize(base + '.f32') + os.path.getsize(base + '.idx'))
+            found.append(meta)
+        return found
+    
+    def append(self, motor_id, timestamps, frames, sample_rate):
+        frames = np.ascontiguousarray(frames, dtype='<f4')
+        timestamps = np.ascontiguousarray(timestamps, dtype='<f8')
+        frame_size = frames.shape[1]
+        with self.lock:
+            segments = self.segments(motor_id)
+            current = segments[-1] if segments else None
+            if (current is None or current['frame_size'] != frame_size or current['sample_rate'] != sample_rate
+                    or current['bytes'] >= self.segment_bytes):
+                os.makedirs(self._motor_dir(motor_id), exist_ok=True)
+                base = os.path.join(self._motor_dir(motor_id), f"seg-{int(timestamps[0] * 1000):015d}")
+                with open(base + '.json', 'w') as f:
+                    json.dump({'frame_size': frame_size, 'sample_rate': sample_rate, 'first_ts': float(timestamps[0])}, f)
+                open(base + '.f32', 'ab').close()
+                open(base + '.idx', 'ab').close()
+                self._enforce_retention(motor_id, segments)
+            else:
+                base = current['base']
+                # Drop any unindexed tail left by an interrupted append
+                with open(base + '.f32', 'r+b') as f:
+                    f.truncate(current['frames'] * frame_size * 4)
+            with open(base + '.f32', 'ab') as f:
+                f.write(frames.tobytes())
+            with open(base + '.idx', 'ab') as f:
+                f.write(timestamps.tobytes())
+    
+    def _enforce_retention(self, motor_id, segments):
+        """Drop segments past the age limit, then oldest-first over the size limit"""
+        cutoff = time.time() - self.retention_seconds
+        total = sum(seg['bytes'] for seg in segments)
+        for seg in segments:
+            last_ts = seg['first_ts']
+            if seg['frames']:
+                last_ts = float(np.memmap(seg['base'] + '.idx', dtype='<f8', mode='r', shape=(seg['frames'],))[-1])
+            if last_ts >= cutoff and total <= self.max_bytes:
+                break
+            for ext in ('.json', '.f32', '.idx'):
+                os.remove(seg['base'] + ext)
+            total -= seg['bytes']
+    
+    def read(self, motor_id, t_from=None, t_to=None):
+        """Zero-copy memmap views of frames in [t_from, t_to], one entry per segment"""
+        views = []
+        for seg in self.segments(motor_id):
+            if not seg['frames']:
+                continue
+            index = np.memmap(seg['base'] + '.idx', dtype='<f8', mode='r', shape=(seg['frames'],))
+            frames = np.memmap(seg['base'] + '.f32', dtype='<f4', mode='r', shape=(seg['frames'], seg['frame_size']))
+            if len(index) < 2 or bool((index[1:] >= index[:-1]).all()):
+                if (t_to is not None and index[0] > t_to) or (t_from is not None and index[-1] < t_from):
+                    continue
+                lo = int(np.searchsorted(index, t_from, 'left')) if t_from is not None else 0
+                hi = int(np.searchsorted(index, t_to, 'right')) if t_to is not None else len(index)
+                if hi <= lo:
+                    continue
+                timestamps, selected = index[lo:hi], frames[lo:hi]
+            else:
+                # Back-dated appends (an earlier ts= than the segment's tail) break
+                # the ordering searchsorted needs: select by mask, in time order (copies)
+                keep = np.ones(len(index), dtype=bool)
+                if t_from is not None:
+                    keep &= index >= t_from
+                if t_to is not None:
+                    keep &= index <= t_to
+                rows = np.flatnonzero(keep)
+                if not len(rows):
+                    continue
+                rows = rows[np.argsort(index[rows], kind='stable')]
+                timestamps, selected = np.asarray(index[rows]), frames[rows]
+            views.append({
+                'timestamps': timestamps,
+                'frames': selected,
+                'frame_size': seg['frame_size'],
+                'sample_rate': seg['sample_rate']
+            })
+        return views
+    
+    def summary(self, motor_id, t_from=None, t_to=None, fundamental=50.0, max_frames=REPORT_MAX_FRAMES):
+        """Feature summary of archived frames in a window, striding long windows"""
+        views = self.read(motor_id, t_from, t_to)
+        total = sum(len(v['timestamps']) for v in views)
+        if not total:
+            return None
+        stride = max(1, -(-total // max_frames))
+        parts = [waveform_features(v['frames'][::stride], v['sample_rate'], fundamental) for v in views]
+        features = {key: np.concatenate([p[key] for p in parts]) for key in parts[0]}
+        return {
+            'frames': total,
+            'analyzed_frames': len(features['thd']),
+            'from': to_iso(min(float(v['timestamps'][0]) for v in views)),
+            'to': to_iso(max(float(v['timestamps'][-1]) for v in views)),
+            'thd_p50': round(float(np.percentile(features['thd'], 50)), 2),
+            'thd_max': round(float(features['thd'].max()), 2),
+            'rms_p50': round(float(np.percentile(features['rms'], 50)), 4),
+            'rms_max': round(float(features['rms'].max()), 4),
+            'crest_factor_max': round(float(features['crest_factor'].max()), 2),
+            'kurtosis_max': round(float(features['kurtosis'].max()), 2)
+        }
+
+WAVEFORM_ARCHIVE = WaveformArchive()
+
+# Groq call protection. Limits match the free tier of our Groq account;
+# raise them together with the tier.
+AI_TIMEOUT = 15
+AI_MAX_RETRIES = 1
+AI_REQUESTS_PER_MINUTE = 30
+AI_TOKENS_PER_MINUTE = 6000
+# How long a caller may wait for rate-limit capacity before falling back
+AI_RATE_WAIT = 2.0
+
+class TokenBucket:
+    """Thread-safe token bucket refilling at `rate` tokens/s up to `capacity`"""
+    
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+    
+    def acquire(self, n=1, timeout=0.0):
+        n = min(n, self.capacity)
+        deadline = time.monotonic() + timeout
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= n:
+                    self.tokens -= n
+                    return True
+                wait = (n - self.tokens) / self.rate
+            if now + wait > deadline:
+                return False
+            time.sleep(wait)
+
+class CircuitBreaker:
+    """Opens after consecutive failures or slow calls; one trial call after reset_timeout"""
+    
+    def __init__(self, failure_threshold=3, latency_threshold=10.0, reset_timeout=30.0):
+        self.failure_threshold = failure_threshold
+        self.latency_threshold = latency_threshold
+        self.reset_timeout = reset_timeout
+        self.state = 'closed'
+        self.failures = 0
+        self.opened_at = None
+        self.trial_running = False
+        self.opened_count = 0
+        self.lock = threading.Lock()
+    
+    def allow(self):
+        with self.lock:
+            if self.state == 'open':
+                if time.monotonic() - self.opened_at < self.reset_timeout:
+                    return False
+                self.state = 'half_open'
+                self.trial_running = False
+            if self.state == 'half_open':
+                if self.trial_running:
+                    return False
+                self.trial_running = True
+            return True
+    
+    def release(self):
+        """Give back an allowed call that was never made"""
+        with self.lock:
+            self.trial_running = False
+    
+    def record(self, ok, latency):
+        with self.lock:
+            self.trial_running = False
+            if ok and latency <= self.latency_threshold:
+                self.failures = 0
+                self.state = 'closed'
+                return
+            self.failures += 1
+            if self.state == 'half_open' or self.failures >= self.failure_threshold:
+                if self.state != 'open':
+                    self.opened_count += 1
+                self.state = 'open'
+                self.opened_at = time.monotonic()
+    
+    def status(self):
+        return {'state': self.state, 'consecutive_failures': self.failures, 'times_opened': self.opened_count}
+
+AI_REQUEST_BUCKET = TokenBucket(AI_REQUESTS_PER_MINUTE / 60, AI_REQUESTS_PER_MINUTE)
+AI_TOKEN_BUCKET = TokenBucket(AI_TOKENS_PER_MINUTE / 60, AI_TOKENS_PER_MINUTE)
+AI_BREAKER = CircuitBreaker()
+
+def make_ai_client(key):
+    return Groq(api_key=key, timeout=AI_TIMEOUT, max_retries=AI_MAX_RETRIES)
+
+def rule_based_analysis(dev_id, reason=None, conn=None):
+    """Deterministic assessment from health, baseline deltas, anomalies and maintenance age"""
+    db = conn or get_db()
+    d = db.execute('SELECT * FROM motors WHERE id = ?', (dev_id,)).fetchone()
+    last_maint = db.execute('SELECT MAX(date) FROM maintenance WHERE motor_id = ?', (dev_id,)).fetchone()[0]
+    if conn is None:
+        db.close()
+    if not d:
+        return "Device not found"
+    
+    health = d['health'] if d['health'] is not None else 100
+    thd, temp = d['last_thd'], d['last_temp']
+    thd_delta = (thd - d['vibration_baseline']) / d['vibration_baseline'] * 100 if thd is not None and d['vibration_baseline'] else 0
+    temp_delta = temp - d['temp_baseline'] if temp is not None and d['temp_baseline'] is not None else 0
+    last_maint = last_maint or d['last_maintenance']
+    days = (datetime.now() - datetime.fromisoformat(last_maint)).days if last_maint else None
+    week_ago = (datetime.now() - timedelta(days=7)).isoformat()
+    anomalies = sum(a.get('count', 1) for a in ANOMALY_LOG if a['motor_id'] == dev_id and a['timestamp'] >= week_ago)
+    
+    if health < HEALTH_CRITICAL or (thd or 0) > HIGH_SEVERITY_THD or temp_delta > 20:
+        risk, probability = 'CRITICAL', 70
+    elif health < HEALTH_WARNING or thd_delta > 50 or anomalies >= 5:
+        risk, probability = 'HIGH', 35
+    elif thd_delta > 20 or anomalies or days is None or days > 180:
+        risk, probability = 'MODERATE', 15
+    else:
+        risk, probability = 'LOW', 5
+    
+    actions = []
+    if risk == 'CRITICAL':
+        actions.append("Reduce load or take the asset offline for inspection within 24 hours")
+    if thd_delta > 20:
+        actions.append(f"Inspect drive/VFD, supply power quality and bearings (THD {thd_delta:+.0f}% vs baseline)")
+    if temp_delta > 10:
+        actions.append(f"Check cooling, ventilation and winding insulation (temperature {temp_delta:+.1f}°C vs baseline)")
+    if anomalies:
+        actions.append(f"Review the {anomalies} anomalous readings logged in the last 7 days")
+    if days is None or days > 180:
+        actions.append("Schedule preventive maintenance (" + (f"{days} days since last service" if days is not None else "no service on record") + ")")
+    if not actions:
+        actions.append("Continue routine monitoring")
+    
+    header = f"Rule-based assessment (AI unavailable: {reason})" if reason else "Rule-based assessment"
+    return f"""{header}
+
+1. Risk assessment: {risk}. Health {health}%, THD {thd}% ({thd_delta:+.0f}% vs baseline), temperature {temp}°C ({temp_delta:+.1f}°C vs baseline), {anomalies} anomalous readings in 7 days.
+2. Recommended actions:
+""" + '\n'.join(f"- {a}" for a in actions) + f"""
+3. Failure probability (30 days): ~{probability}% (heuristic from risk level)"""
+
+AI_SYSTEM_PROMPT = "You are a Senior Industrial Forensic Engineer. Provide detailed technical analysis with specific numbers and actionable recommendations."
+
+def analysis_prompt(device, context):
+    return f"""Analyze industrial asset {device['name']}:
+
+{context}
+
+Provide a brief technical analysis with:
+1. Risk assessment
+2. Recommended actions
+3. Failure probability"""
+
+def report_prompt(device, context, report_type):
+    return f"""Generate a {report_type} report for {device['name']}:
+
+{context}
+
+Provide a detailed forensic analysis with specific recommendations."""
+
+def ask_ai(prompt, max_tokens=500, fallback=None):
+    """Returns (text, tokens). When the AI is unconfigured, rate limited, failing
+    or behind an open breaker, returns fallback(reason) (or an error string)
+    immediately with tokens "0" instead of waiting on Groq."""
+    def unavailable(reason):
+        with METRICS_LOCK:
+            METRICS['ai_fallbacks'] += 1
+        if fallback:
+            return fallback(reason), "0"
+        return f"AI analysis temporarily unavailable: {reason}", "0"
+    
     if not AI_STORE["key"]:
+        if fallback:
+            return unavailable("engine not configured")
         return "AI engine not configured. Please add your Groq API key in settings.", "0"
+    if not AI_BREAKER.allow():
+        return unavailable("circuit open after repeated failures")
+    if not (AI_REQUEST_BUCKET.acquire(1, AI_RATE_WAIT)
+            and AI_TOKEN_BUCKET.acquire(estimate_tokens(prompt) + max_tokens, AI_RATE_WAIT)):
+        AI_BREAKER.release()
+        return unavailable("rate limit reached")
     if AI_STORE["client"] is None:
-        AI_STORE["client"] = Groq(api_key=AI_STORE["key"])
+        AI_STORE["client"] = make_ai_client(AI_STORE["key"])
+    
+    started = time.monotonic()
     try:
         completion = AI_STORE["client"].chat.completions.create(
             model=AI_STORE["model"],
             messages=[
-                {"role": "system", "content": "You are a Senior Industrial Forensic Engineer. Provide detailed technical analysis with specific numbers and actionable recommendations."},
+                {"role": "system", "content": AI_SYSTEM_PROMPT},
                 {"role": "user", "content": prompt}
             ],
             temperature=0.3,
-            max_tokens=500
+            max_tokens=max_tokens
         )
-        return completion.choices[0].message.content, completion.usage.total_tokens
     except Exception as e:
-        return f"AI analysis temporarily unavailable: {str(e)}", "0"
-
-def get_maintenance_history(motor_id):
+        AI_BREAKER.record(False, time.monotonic() - started)
+        return unavailable(str(e))
+    AI_BREAKER.record(True, time.monotonic() - started)
+    return completion.choices[0].message.content, completion.usage.total_tokens
+
+# Fleet triage: rank every motor locally, spend AI tokens only on the riskiest
+TRIAGE_TOP_K = 10
+TRIAGE_TOKEN_BUDGET = 4000
+TRIAGE_MAX_TOKENS = 200
+TRIAGE_CONTEXT_TOKENS = 300
+TRIAGE_AI_WORKERS = 4
+TRIAGE_CACHE_TTL = 300
+TRIAGE_WEIGHTS = {'health': 0.4, 'thd_deviation': 0.25, 'anomaly_rate': 0.2, 'maintenance_age': 0.15}
+CRITICALITY_WEIGHT = {'High': 1.2, 'Medium': 1.0, 'Low': 0.8}
+TRIAGE_CACHE = {}
+TRIAGE_LOCK = threading.Lock()
+
+def score_fleet(conn):
+    """Risk score (0-100+) for every motor in one vectorized pass"""
+    rows = conn.execute('''SELECT m.id, m.name, m.location, m.criticality, m.status, m.health, m.last_thd,
+            m.vibration_baseline, m.last_temp,
+            julianday('now') - julianday(COALESCE(MAX(mt.date), m.last_maintenance)) AS days_since_maintenance
+        FROM motors m LEFT JOIN maintenance mt ON mt.motor_id = m.id
+        GROUP BY m.id ORDER BY m.id''').fetchall()
+    if not rows:
+        return [], np.zeros(0), {}
+    
+    def column(name):
+        return np.array([r[name] for r in rows], dtype=np.float64)
+    
+    ids = column('id').astype(np.int64)
+    week_ago = (datetime.now() - timedelta(days=7)).isoformat()
+    position = {motor_id: i for i, motor_id in enumerate(ids.tolist())}
+    recent = [(position[a['motor_id']], a.get('count', 1)) for a in ANOMALY_LOG
+              if a['timestamp'] >= week_ago and a['motor_id'] in position]
+    hits = np.array(recent, dtype=np.int64).reshape(-1, 2)
+    anomalies = np.bincount(hits[:, 0], weights=hits[:, 1], minlength=len(rows)).astype(np.int64)
+    
+    baseline = column('vibration_baseline')
+    days = column('days_since_maintenance')
+    components = {
+        'health': np.clip((100 - np.nan_to_num(column('health'), nan=100)) / 100, 0, 1),
+        'thd_deviation': np.clip(np.nan_to_num((column('last_thd') - baseline) / baseline), 0, 3) / 3,
+        # Saturates smoothly: ~0.4 at one anomaly a day, ~0.9 at five
+        'anomaly_rate': 1 - np.exp(-anomalies / 7 / 2),
+        'maintenance_age': np.clip(np.nan_to_num(days, nan=365) / 365, 0, 1)
+    }
+    weights = np.array([CRITICALITY_WEIGHT.get(r['criticality'], 1.0) for r in rows])
+    risk = 100 * weights * sum(TRIAGE_WEIGHTS[k] * v for k, v in components.items()) / sum(TRIAGE_WEIGHTS.values())
+    components['anomalies_7d'] = anomalies
+    components['days_since_maintenance'] = days
+    return rows, risk, components
+
+def triage_prompt(entry):
+    context = device_context(entry['id'], budget=TRIAGE_CONTEXT_TOKENS)
+    return f"""Triage: fleet rank {entry['rank']}, risk score {entry['risk']}, component scores (0-1) {entry['components']}.
+
+{context}
+
+In under 80 words: most likely fault, urgency (hours/days/weeks) and the first action."""
+
+def build_triage(top_k, token_budget, use_ai, limit):
     conn = get_db()
-    records = conn.execute('SELECT * FROM maintenance WHERE motor_id = ? ORDER BY date DESC', (motor_id,)).fetchall()
+    rows, risk, components = score_fleet(conn)
     conn.close()
+    
+    order = np.argsort(-risk, kind='stable')[:limit]
+    ranking = []
+    for rank, i in enumerate(order.tolist(), start=1):
+        r = rows[i]
+        days = components['days_since_maintenance'][i]
+        ranking.append({
+            'rank': rank,
+            'id': r['id'], 'name': r['name'], 'location': r['location'], 'criticality': r['criticality'],
+            'status': r['status'], 'health': r['health'], 'last_thd': r['last_thd'],
+            'vibration_baseline': r['vibration_baseline'], 'last_temp': r['last_temp'],
+            'risk': round(float(risk[i]), 1),
+            'anomalies_7d': int(components['anomalies_7d'][i]),
+            'days_since_maintenance': None if np.isnan(days) else int(days),
+            'components': {k: round(float(components[k][i]), 3) for k in TRIAGE_WEIGHTS},
+            'ai': None
+        })
+    
+    # Admit assets in rank order while the estimated spend (prompt plus
+    # completion cap) fits the budget
+    selected, estimated = [], 0
+    for entry in ranking[:top_k] if use_ai else []:
+        prompt = triage_prompt(entry)
+        cost = estimate_tokens(prompt) + TRIAGE_MAX_TOKENS
+        if estimated + cost > token_budget:
+            entry['ai'] = {'status': 'skipped_budget'}
+            continue
+        estimated += cost
+        selected.append((entry, prompt))
+    
+    tokens_used = 0
+    if selected:
+        with ThreadPoolExecutor(max_workers=TRIAGE_AI_WORKERS) as pool:
+            answers = pool.map(lambda item: ask_ai(item[1], max_tokens=TRIAGE_MAX_TOKENS,
+                                                   fallback=lambda reason: rule_based_analysis(item[0]['id'], reason)),
+                               selected)
+            for (entry, _), (analysis, tokens) in zip(selected, answers):
+                tokens = int(tokens or 0)
+                tokens_used += tokens
+                entry['ai'] = {'status': 'ok' if tokens else 'fallback', 'analysis': analysis, 'tokens': tokens}
+    
+    return {
+        'generated_at': datetime.now().isoformat(),
+        'fleet_size': len(rows),
+        'top_k': top_k,
+        'token_budget': token_budget,
+        'tokens_estimated': estimated,
+        'tokens_used': tokens_used,
+        'weights': TRIAGE_WEIGHTS,
+        'ranking': ranking
+    }
+
+def get_maintenance_history(motor_id, limit=-1, conn=None):
+    db = conn or get_db()
+    records = db.execute('SELECT * FROM maintenance WHERE motor_id = ? ORDER BY date DESC, id DESC LIMIT ?', (motor_id, limit)).fetchall()
+    if conn is None:
+        db.close()
     return [dict(r) for r in records]
 
-def get_claim_history(motor_id):
-    conn = get_db()
-    records = conn.execute('SELECT * FROM claims WHERE motor_id = ? ORDER BY date DESC', (motor_id,)).fetchall()
-    conn.close()
+def get_claim_history(motor_id, limit=-1, conn=None):
+    db = conn or get_db()
+    records = db.execute('SELECT * FROM claims WHERE motor_id = ? ORDER BY date DESC, id DESC LIMIT ?', (motor_id, limit)).fetchall()
+    if conn is None:
+        db.close()
     return [dict(r) for r in records]
 
+# Prompt context: compact per-device feature summaries under a token budget
+CONTEXT_WINDOW = 86400
+ANOMALY_CLUSTER_GAP = 1800
+MODEL_CONTEXT_TOKENS = {
+    'llama-3.3-70b-versatile': 1200,
+    'llama-3.1-8b-instant': 500,
+    'gemma2-9b-it': 500,
+    'mixtral-8x7b-32768': 1000
+}
+DEFAULT_CONTEXT_TOKENS = 800
+SEVERITY_RANK = {'medium': 1, 'high': 2, 'critical': 3}
+CONTEXT_CACHE = {}
+CONTEXT_LOCK = threading.Lock()
+
+def estimate_tokens(text):
+    """Rough token count for English/numeric prompts (~4 characters per token)"""
+    return len(text) // 4 + 1
+
+def context_budget(model=None):
+    return MODEL_CONTEXT_TOKENS.get(model or AI_STORE['model'], DEFAULT_CONTEXT_TOKENS)
+
+def split_bursts(anomalies, gap=ANOMALY_CLUSTER_GAP):
+    """Split anomalies into time-ordered bursts separated by more than `gap` seconds"""
+    bursts = []
+    last = None
+    for a in sorted(anomalies, key=lambda a: a['timestamp']):
+        t = to_epoch(a['timestamp'])
+        if bursts and t - last <= gap:
+            bursts[-1].append(a)
+        else:
+            bursts.append([a])
+        last = max(last or t, to_epoch(a.get('end') or a['timestamp']))
+    return bursts
+
+def summarize_burst(members):
+    return {
+        'start': to_epoch(members[0]['timestamp']),
+        'end': max(to_epoch(a.get('end') or a['timestamp']) for a in members),
+        'count': sum(a.get('count', 1) for a in members),
+        'peak_thd': max(a['thd_value'] for a in members),
+        'peak_temp': max(a['temp_value'] for a in members),
+        'severity': max((a['severity'] for a in members), key=lambda s: SEVERITY_RANK.get(s, 0))
+    }
+
+def anomaly_clusters(anomalies, gap=ANOMALY_CLUSTER_GAP):
+    return [summarize_burst(burst) for burst in split_bursts(anomalies, gap)]
+
+def context_features(dev_id, conn):
+    """Percentiles, slopes, anomaly bursts and maintenance gaps for one device"""
+    device = conn.execute('SELECT * FROM motors WHERE id = ?', (dev_id,)).fetchone()
+    if not device:
+        return None
+    features = {'device': dict(device)}
+    
+    index = TELEMETRY_INDEX.get(dev_id)
+    if index is not None and len(index):
+        end = index.ts[index.n - 1]
+        start = index.offset + int(np.searchsorted(index.ts[index.offset:index.n], end - CONTEXT_WINDOW, 'left'))
+        ts, thd, temp = index.ts[start:index.n], index.thd[start:index.n], index.temp[start:index.n]
+        hours = (ts - ts[0]) / 3600
+        slopes = np.polyfit(hours, np.vstack([thd, temp]).T, 1)[0] if len(ts) >= 3 and hours[-1] > 0 else (0.0, 0.0)
+        thd_p = np.percentile(thd, [50, 90, 99])
+        temp_p = np.percentile(temp, [50, 90])
+        features['telemetry'] = {
+            'hours': round(float(hours[-1]), 1),
+            'count': len(ts),
+            'thd': [round(float(v), 2) for v in (*thd_p, thd.max())],
+            'temp': [round(float(v), 1) for v in (*temp_p, temp.max())],
+            'thd_slope': round(float(slopes[0]), 3),
+            'temp_slope': round(float(slopes[1]), 3),
+            'above_critical': int((thd > CRITICAL_THD).sum())
+        }
+    
+    anomalies = [a for a in ANOMALY_LOG if a['motor_id'] == dev_id]
+    week_ago = (datetime.now() - timedelta(days=7)).isoformat()
+    features['anomalies'] = {
+        'total': sum(a.get('count', 1) for a in anomalies),
+        'last_7d': sum(a.get('count', 1) for a in anomalies if a['timestamp'] >= week_ago),
+        'clusters': anomaly_clusters(anomalies)[-3:]
+    }
+    
+    maintenance = get_maintenance_history(dev_id, conn=conn)
+    dates = sorted(datetime.fromisoformat(m['date']) for m in maintenance if m['date'])
+    gaps = [(b - a).days for a, b in zip(dates, dates[1:])]
+    features['maintenance'] = {
+        'records': len(maintenance),
+        'last': maintenance[0] if maintenance else None,
+        'days_since': (datetime.now() - dates[-1]).days if dates else None,
+        'mean_gap': round(sum(gaps) / len(gaps)) if gaps else None,
+        'max_gap': max(gaps) if gaps else None,
+        'recent': [(m['date'], m['type']) for m in maintenance[:3]]
+    }
+    claims = conn.execute('SELECT COUNT(*) AS n, SUM(amount) AS total, MAX(date) AS last FROM claims WHERE motor_id = ?',
+                          (dev_id,)).fetchone()
+    features['claims'] = dict(claims)
+    features['waveform'] = WAVEFORM_ARCHIVE.summary(dev_id, time.time() - CONTEXT_WINDOW)
+    return features
+
+def render_context(features, budget):
+    """Render sections in priority order, trimming or dropping them to fit the token budget"""
+    d = features['device']
+    t = features.get('telemetry')
+    a = features['anomalies']
+    m = features['maintenance']
+    c = features['claims']
+    w = features['waveform']
+    
+    sections = [
+        ('ASSET', [f"{d['name']} | {d['manufacturer']} {d['model_no']} | {d['location']}",
+                   f"Criticality {d['criticality']}, installed {d['installation_date']}"]),
+        ('CURRENT', [f"Health {d['health']}%, status {d['status']}",
+                     f"THD {d['last_thd']}% (baseline {d['vibration_baseline']}%), temp {d['last_temp']}°C (baseline {d['temp_baseline']}°C)"]),
+        (f"TELEMETRY last {t['hours']}h, {t['count']} samples" if t else 'TELEMETRY', [
+            f"THD p50/p90/p99/max {'/'.join(map(str, t['thd']))}%, slope {t['thd_slope']:+}%/h, {t['above_critical']} above {CRITICAL_THD}%",
+            f"Temp p50/p90/max {'/'.join(map(str, t['temp']))}°C, slope {t['temp_slope']:+}°C/h"
+        ] if t else ['No telemetry recorded']),
+        (f"ANOMALIES {a['total']} readings, {a['last_7d']} in 7d", [
+            f"{to_iso(cl['start'])[:16]} to {to_iso(cl['end'])[11:16]}: {cl['count']}x, peak THD {cl['peak_thd']:.1f}%, {cl['severity']}"
+            for cl in reversed(a['clusters'])
+        ]),
+        ('MAINTENANCE', ([f"{m['records']} records, last {m['last']['date']} ({m['last']['type']}), {m['days_since']} days ago"]
+                         + ([f"Interval mean {m['mean_gap']} days, longest {m['max_gap']} days"] if m['mean_gap'] is not None else [])
+                         + [f"{date}: {kind}" for date, kind in m['recent'][1:]])
+                        if m['last'] else ['No maintenance on record']),
+        ('RAW WAVEFORM last 24h', [
+            f"{w['frames']} frames: THD p50 {w['thd_p50']}% / max {w['thd_max']}%, RMS p50 {w['rms_p50']} / max {w['rms_max']}",
+            f"Crest factor max {w['crest_factor_max']}, kurtosis max {w['kurtosis_max']}"
+        ] if w else []),
+        ('CLAIMS', [f"{c['n']} claims totalling {c['total'] or 0:,.0f}, last {c['last']}"] if c['n'] else [])
+    ]
+    
+    blocks, used = [], 0
+    for title, lines in sections:
+        while lines:
+            block = title + ':\n' + '\n'.join('- ' + line for line in lines)
+            cost = estimate_tokens(block)
+            if used + cost <= budget:
+                blocks.append(block)
+                used += cost
+                break
+            lines = lines[:-1]
+    return '\n\n'.join(blocks)
+
+def device_context(dev_id, budget=None, conn=None):
+    """Prompt context for a device, cached until its state version changes"""
+    budget = budget or context_budget()
+    version = (DEVICE_VERSIONS.get(dev_id, 0), datetime.now().date())
+    with CONTEXT_LOCK:
+        cached = CONTEXT_CACHE.get((dev_id, budget))
+    if cached and cached[0] == version:
+        return cached[1]
+    
+    db = conn or get_db()
+    features = context_features(dev_id, db)
+    if conn is None:
+        db.close()
+    text = render_context(features, budget) if features else None
+    with CONTEXT_LOCK:
+        CONTEXT_CACHE[(dev_id, budget)] = (version, text)
+    return text
+
+# Incidents: bursts of unanalyzed anomalies per motor, analyzed as one unit
+# by background jobs; results are written back to every member anomaly
+INCIDENT_BATCH_SIZE = 5
+INCIDENT_TOKENS_EACH = 150
+JOBS_MAX = 200
+INCIDENTS = {}
+INCIDENT_IDS = itertools.count(1)
+INCIDENT_LOCK = threading.Lock()
+JOBS = {}
+JOB_POOL = ThreadPoolExecutor(max_workers=2, thread_name_prefix='jobs')
+
+def public_incident(incident):
+    return dict(incident, start=to_iso(incident['start']), end=to_iso(incident['end']))
+
+def start_incident_job(motor_id=None):
+    """Group unclaimed, unanalyzed anomalies into incidents and queue their analysis"""
+    COALESCER.sweep()
+    with INCIDENT_LOCK:
+        pending = [a for a in ANOMALY_LOG
+                   if not a['analyzed'] and a.get('incident_id') is None
+                   and (motor_id is None or a['motor_id'] == motor_id)]
+        by_motor = {}
+        for a in pending:
+            by_motor.setdefault(a['motor_id'], []).append(a)
+        
+        job = {'id': uuid.uuid4().hex, 'status': 'queued', 'created': datetime.now().isoformat(),
+               'finished': None, 'incidents': [], 'done': 0, 'tokens': 0, 'error': None}
+        for dev_id, anomalies in by_motor.items():
+            for members in split_bursts(anomalies):
+                incident = dict(summarize_burst(members), id=next(INCIDENT_IDS), motor_id=dev_id,
+                                anomaly_ids=[a['id'] for a in members], status='queued',
+                                analysis=None, tokens=0, job_id=job['id'])
+                INCIDENTS[incident['id']] = incident
+                for a in members:
+                    a['incident_id'] = incident['id']
+                job['incidents'].append(incident['id'])
+        job['total'] = len(job['incidents'])
+        
+        if not job['incidents']:
+            job['status'] = 'done'
+            job['finished'] = job['created']
+        JOBS[job['id']] = job
+        finished = [j for j in JOBS.values() if j['finished']]
+        for old in finished[:max(0, len(JOBS) - JOBS_MAX)]:
+            del JOBS[old['id']]
+    
+    if job['incidents']:
+        JOB_POOL.submit(run_incident_job, job)
+    return job
+
+def incident_prompt(dev_id, incidents):
+    lines = [f"INCIDENT {i['id']}: {to_iso(i['start'])[:19]} to {to_iso(i['end'])[11:19]}, "
+             f"{i['count']} readings above {CRITICAL_THD}% THD, peak THD {i['peak_thd']:.1f}%, "
+             f"peak temperature {i['peak_temp']:.1f}°C, severity {i['severity']}" for i in incidents]
+    return f"""Root-cause analysis of anomaly incidents on one asset.
+
+{device_context(dev_id)}
+
+INCIDENTS:
+""" + '\n'.join(lines) + """
+
+For each incident write a block starting with "INCIDENT <id>:" giving the probable root cause, the evidence from the numbers and the corrective action, in at most 60 words."""
+
+def split_incident_answers(text, incidents):
+    """Map incident ids to their block of a batched answer; unparsed ones get the whole text"""
+    parts = re.split(r'(?im)^[\s*#-]*INCIDENT\s+(\d+)\s*[:*\-.]*', text)
+    answers = {int(parts[i]): parts[i + 1].strip(' *\n') for i in range(1, len(parts) - 1, 2)}
+    return {i['id']: answers.get(i['id']) or text for i in incidents}
+
+def run_incident_job(job):
+    job['status'] = 'running'
+    try:
+        by_motor = {}
+        for incident_id in job['incidents']:
+            incident = INCIDENTS[incident_id]
+            by_motor.setdefault(incident['motor_id'], []).append(incident)
+        
+        for dev_id, incidents in by_motor.items():
+            for start in range(0, len(incidents), INCIDENT_BATCH_SIZE):
+                batch = incidents[start:start + INCIDENT_BATCH_SIZE]
+                for incident in batch:
+                    incident['status'] = 'running'
+                text, tokens = ask_ai(incident_prompt(dev_id, batch),
+                                      max_tokens=INCIDENT_TOKENS_EACH * len(batch) + 100,
+                                      fallback=lambda reason: rule_based_analysis(dev_id, reason))
+                tokens = int(tokens or 0)
+                answers = split_incident_answers(text, batch)
+                
+                with INCIDENT_LOCK:
+                    for incident in batch:
+                        incident['analysis'] = answers[incident['id']]
+                        incident['tokens'] = tokens // len(batch)
+                        incident['status'] = 'analyzed' if tokens else 'fallback'
+                        members = set(incident['anomaly_ids'])
+                        for a in ANOMALY_LOG:
+                            # Entries released by an escalation meanwhile stay unanalyzed
+                            if a['id'] in members and a.get('incident_id') == incident['id']:
+                                a['analyzed'] = True
+                                a['analysis'] = incident['analysis']
+                    job['done'] += len(batch)
+                    job['tokens'] += tokens
+                bump_version(dev_id)
+        job['status'] = 'done'
+    except Exception as e:
+        # Release unfinished incidents so a later job can pick their anomalies up
+        with INCIDENT_LOCK:
+            for incident_id in job['incidents']:
+                incident = INCIDENTS[incident_id]
+                if incident['status'] in ('queued', 'running'):
+                    incident['status'] = 'failed'
+                    for a in ANOMALY_LOG:
+                        if a.get('incident_id') == incident_id:
+                            a['incident_id'] = None
+        job['status'] = 'failed'
+        job['error'] = str(e)
+    job['finished'] = datetime.now().isoformat()
+
+# Warm restart: periodic snapshots of in-memory state. The capture takes
+# shallow copies and array views under STATE_LOCK; pickling (which copies
+# the viewed slices), compression and the atomic write happen afterwards on
+# a background thread.
+SNAPSHOT_PATH = 'pulseguard.snapshot'
+SNAPSHOT_MAGIC = b'ZSN1'
+SNAPSHOT_INTERVAL = 300
+# Fast zlib level; telemetry dicts still compress several-fold
+SNAPSHOT_LEVEL = 1
+
+class StateSnapshots:
+    """Snapshot/restore of telemetry, anomalies, incidents, detector and AI state.
+
+    Each snapshot records the journal LSN it includes; once it is on disk
+    the journal is checkpointed there, and a restart restores the snapshot
+    and replays only the journal records after it.
+    """
+    
+    def __init__(self, path=SNAPSHOT_PATH):
+        self.path = path
+        self.lock = threading.Lock()
+        self.last = None
+    
+    def capture(self):
+        with STATE_LOCK, INCIDENT_LOCK:
+            state = {
+                'lsn': JOURNAL.applied_lsn,
+                'taken': time.time(),
+                'history': {dev_id: list(points) for dev_id, points in TELEMETRY_HISTORY.items()},
+                # Views, not copies: SeriesIndex never rewrites [offset:n] (appends go past
+                # n and growth allocates new arrays), so they stay valid after the lock
+                'index': {dev_id: (index.ts[index.offset:index.n], index.thd[index.offset:index.n],
+                                   index.temp[index.offset:index.n])
+                          for dev_id, index in TELEMETRY_INDEX.items()},
+                'anomalies': [dict(a) for a in list(ANOMALY_LOG)],
+                'open_anomalies': COALESCER.export(),
+                # Drawing the next id skips it, which is harmless for unique ids
+                'anomaly_next_id': next(ANOMALY_IDS),
+                'incidents': {incident_id: dict(incident, anomaly_ids=list(incident['anomaly_ids']))
+                              for incident_id, incident in INCIDENTS.items()},
+                'incident_next_id': next(INCIDENT_IDS),
+                'alerts': [dict(a) for a in ALERT_LOG],
+                'alert_next_id': next(ALERT_IDS),
+                'alert_state': ALERTS.export()
+            }
+            with FORECASTS.lock:
+                state['forecasts'] = {dev_id: {k: dict(v) if isinstance(v, dict) else v for k, v in st.items()}
+                                      for dev_id, st in FORECASTS.state.items()}
+        state['ai'] = {'model': AI_STORE['model']}
+        state['waveform_features'] = dict(LATEST_WAVEFORM_FEATURES)
+        state['gateway_sequences'] = {dev_id: dict(st) for dev_id, st in list(GATEWAY.sequences.items())}
+        return state
+    
+    def save(self):
+        with self.lock:
+            started = time.perf_counter()
+            state = self.capture()
+            captured = time.perf_counter()
+            payload = SNAPSHOT_MAGIC + zlib.compress(pickle.dumps(state, protocol=pickle.HIGHEST_PROTOCOL), SNAPSHOT_LEVEL)
+            # 0600: the snapshot holds the plant's telemetry and analyses
+            tmp = self.path + '.tmp'
+            with os.fdopen(os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600), 'wb') as f:
+                f.write(payload)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp, self.path)
+            directory = os.open(os.path.dirname(os.path.abspath(self.path)), os.O_RDONLY)
+            try:
+                os.fsync(directory)
+            finally:
+                os.close(directory)
+            if JOURNAL.file is not None:
+                JOURNAL.checkpoint(state['lsn'])
+            self.last = {
+                'action': 'saved',
+                'taken': datetime.fromtimestamp(state['taken']).isoformat(),
+                'lsn': state['lsn'],
+                'devices': len(state['history']),
+                'anomalies': len(state['anomalies']),
+                'bytes': len(payload),
+                'capture_ms': round((captured - started) * 1000, 2),
+                'write_ms': round((time.perf_counter() - captured) * 1000, 2)
+            }
+            return self.last
+    
+    def load(self):
+        """Restore the snapshot on disk; returns its journal LSN, or None if there is none"""
+        started = time.perf_counter()
+        try:
+            with open(self.path, 'rb') as f:
+                data = f.read()
+        except FileNotFoundError:
+            return None
+        try:
+            if data[:len(SNAPSHOT_MAGIC)] != SNAPSHOT_MAGIC:
+                raise ValueError("bad header")
+            state = pickle.loads(zlib.decompress(data[len(SNAPSHOT_MAGIC):]))
+        except (ValueError, zlib.error, pickle.UnpicklingError, EOFError) as e:
+            print(f"Snapshot {self.path} unreadable, starting cold: {e}")
+            return None
+        self.restore(state)
+        self.last = {
+            'action': 'loaded',
+            'taken': datetime.fromtimestamp(state['taken']).isoformat(),
+            'lsn': state['lsn'],
+            'devices': len(state['history']),
+            'anomalies': len(state['anomalies']),
+            'bytes': len(data),
+            'load_ms': round((time.perf_counter() - started) * 1000, 2)
+        }
+        return state['lsn']
+    
+    def restore(self, state):
+        global ANOMALY_IDS, INCIDENT_IDS, ALERT_IDS
+        with STATE_LOCK, INCIDENT_LOCK:
+            TELEMETRY_HISTORY.clear()
+            TELEMETRY_HISTORY.update(state['history'])
+            TELEMETRY_INDEX.clear()
+            for dev_id, (ts, thd, temp) in state['index'].items():
+                index = TELEMETRY_INDEX[dev_id] = SeriesIndex()
+                index.extend(ts, thd, temp)
+            ANOMALY_LOG[:] = state['anomalies']
+            ANOMALY_IDS = itertools.count(state['anomaly_next_id'])
+            COALESCER.restore(state.get('open_anomalies', {}), ANOMALY_LOG)
+            ALERT_LOG[:] = state.get('alerts', [])
+            ALERT_IDS = itertools.count(state.get('alert_next_id', 1))
+            ALERTS.restore(state.get('alert_state', {}), ALERT_LOG)
+            
+            INCIDENTS.clear()
+            INCIDENTS.update(state['incidents'])
+            INCIDENT_IDS = itertools.count(state['incident_next_id'])
+            # Jobs died with the old process; release their anomalies for a new job
+            orphaned = {i for i, incident in INCIDENTS.items() if incident['status'] in ('queued', 'running')}
+            for incident_id in orphaned:
+                INCIDENTS[incident_id]['status'] = 'failed'
+            for a in ANOMALY_LOG:
+                if a.get('incident_id') in orphaned:
+                    a['incident_id'] = None
+            
+            with FORECASTS.lock:
+                FORECASTS.state = state['forecasts']
+                FORECASTS.cache.clear()
+                FORECASTS.pending = {dev_id for dev_id in TELEMETRY_INDEX if dev_id not in FORECASTS.state}
+        
+        # The key is not in the snapshot: keep the one from GROQ_API_KEY (or /api/save)
+        AI_STORE['model'] = state['ai'].get('model', AI_STORE['model'])
+        AI_STORE['client'] = make_ai_client(AI_STORE['key']) if AI_STORE['key'] else None
+        LATEST_WAVEFORM_FEATURES.update(state['waveform_features'])
+        GATEWAY.sequences.update(state['gateway_sequences'])
+        for dev_id in TELEMETRY_HISTORY:
+            bump_version(dev_id)
+    
+    def status(self):
+        exists = os.path.exists(self.path)
+        return {
+            'path': self.path,
+            'exists': exists,
+            'bytes': os.path.getsize(self.path) if exists else 0,
+            'interval': SNAPSHOT_INTERVAL,
+            'last': self.last
+        }
+
+SNAPSHOTS = StateSnapshots()
+
+def warm_start():
+    """Restore the last snapshot over the existing database, or seed a fresh
+    one; returns the journal LSN that replay should start after"""
+    lsn = SNAPSHOTS.load() if os.path.exists(DB_PATH) else None
+    if lsn is None:
+        init_db()
+        return 0
+    last = SNAPSHOTS.last
+    print(f"Warm start from snapshot of {last['taken']}: {last['devices']} devices, "
+          f"{last['anomalies']} anomalies in {last['load_ms']} ms")
+    return lsn
+
+def periodic_snapshot(interval=SNAPSHOT_INTERVAL):
+    """Snapshot in-memory state in the background"""
+    def _snapshot_loop():
+        while True:
+            time.sleep(interval)
+            try:
+                SNAPSHOTS.save()
+            except Exception as e:
+                # Keep the loop alive: one bad capture must not end snapshots and checkpoints for good
+                SNAPSHOTS.last = {'action': 'failed', 'at': datetime.now().isoformat(), 'error': repr(e)}
+                print(f"Snapshot failed: {e!r}")
+    
+    thread = threading.Thread(target=_snapshot_loop, daemon=True)
+    thread.start()
+    return thread
+
+def summarize_telemetry(points):
+    """Single-pass THD/temperature summary of a telemetry window"""
+    if not points:
+        return {'count': 0}
+    thd_sum = temp_sum = 0.0
+    thd_min = thd_max = points[0]['thd']
+    temp_max = points[0]['temp']
+    critical = 0
+    for p in points:
+        thd, temp = p['thd'], p['temp']
+        thd_sum += thd
+        temp_sum += temp
+        if thd < thd_min:
+            thd_min = thd
+        if thd > thd_max:
+            thd_max = thd
+        if temp > temp_max:
+            temp_max = temp
+        if thd > CRITICAL_THD:
+            critical += 1
+    return {
+        'count': len(points),
+        'from': points[0]['timestamp'],
+        'to': points[-1]['timestamp'],
+        'latest': points[-1],
+        'thd_min': round(thd_min, 2),
+        'thd_max': round(thd_max, 2),
+        'thd_avg': round(thd_sum / len(points), 2),
+        'temp_max': round(temp_max, 1),
+        'temp_avg': round(temp_sum / len(points), 1),
+        'critical_events': critical
+    }
+
 HTML_TEMPLATE = '''
 <!DOCTYPE html>
 <html lang="en">
@@ -315,9 +3034,9 @@ HTML_TEMPLATE = '''
     <meta charset="UTF-8">
     <meta name="viewport" content="width=device-width, initial-scale=1.0">
     <title>PulseGuard Nexus | Industrial IoT Command Center</title>
-    <script src="https://cdn.jsdelivr.net/npm/chart.js"></script>
-    <script src="https://cdn.jsdelivr.net/npm/apexcharts"></script>
-    <link rel="stylesheet" href="https://cdnjs.cloudflare.com/ajax/libs/font-awesome/6.0.0/css/all.min.css">
+    <script src="{{ assets['chart.js'] }}"></script>
+    <script src="{{ assets['apexcharts'] }}"></script>
+    <link rel="stylesheet" href="{{ assets['font-awesome'] }}">
     <style>
         * {
             margin: 0;
@@ -612,6 +3331,11 @@ HTML_TEMPLATE = '''
             margin-bottom: 24px;
         }
 
+        .table-container.virtual-scroll {
+            max-height: 70vh;
+            overflow-y: auto;
+        }
+
         table {
             width: 100%;
             border-collapse: collapse;
@@ -1292,11 +4016,11 @@ HTML_TEMPLATE = '''
                         </div>
                         <div class="legend-item">
                             <div class="legend-color" style="background: var(--danger);"></div>
-                            <span>Critical Events (>12% THD)</span>
+                            <span>Critical Events (>{{ thresholds.critical_thd }}% THD)</span>
                         </div>
                         <div class="legend-item">
                             <div class="legend-color" style="background: rgba(255, 61, 87, 0.3); width: 20px;"></div>
-                            <span>Failure Threshold (12%)</span>
+                            <span>Failure Threshold ({{ thresholds.critical_thd }}%)</span>
                         </div>
                     </div>
                     
@@ -1841,6 +4565,9 @@ HTML_TEMPLATE = '''
         let healthDistributionChart = null;
         let anomalyChart = null;
         let devices = [];
+        let seismoState = null;
+        const RANGE_POINTS = { '1h': 60, '6h': 360, '24h': 1440, '7d': 10080 };
+        const THRESHOLDS = {{ thresholds|tojson }};
 
         // Initialize ApexCharts
         function initCharts() {
@@ -1857,7 +4584,7 @@ HTML_TEMPLATE = '''
             const healthOptions = {
                 chart: { type: 'donut', height: 300, background: 'transparent' },
                 series: [],
-                labels: ['Healthy (80-100)', 'Warning (60-79)', 'Critical (<60)'],
+                labels: [`Healthy (${THRESHOLDS.health_good}-100)`, `Warning (${THRESHOLDS.health_at_risk}-${THRESHOLDS.health_good - 1})`, `Critical (<${THRESHOLDS.health_at_risk})`],
                 colors: ['#00e676', '#ffab00', '#ff3d57'],
                 theme: { mode: 'dark' }
             };
@@ -1884,6 +4611,152 @@ HTML_TEMPLATE = '''
             if (viewId === 'analytics') refreshAnalytics();
         }
 
+        // Keyed table renderer: rows are matched by key and only cells whose
+        // markup changed are rewritten. Above VIRTUAL_SCROLL_THRESHOLD rows the
+        // table scrolls inside its container and only the visible window is mounted.
+        const VIRTUAL_SCROLL_THRESHOLD = 300;
+        const VIRTUAL_OVERSCAN = 10;
+
+        class KeyedTable {
+            constructor(tbody, columns, keyFn) {
+                this.tbody = tbody;
+                this.columns = columns;
+                this.keyFn = keyFn;
+                this.rows = new Map();
+                this.items = [];
+                this.virtual = false;
+                this.rowHeight = 57;
+                this.container = tbody.closest('.table-container');
+                this.topSpacer = this.createSpacer();
+                this.bottomSpacer = this.createSpacer();
+                this.scheduled = false;
+                this.onScroll = () => {
+                    if (this.scheduled) return;
+                    this.scheduled = true;
+                    requestAnimationFrame(() => { this.scheduled = false; this.render(); });
+                };
+            }
+
+            createSpacer() {
+                const tr = document.createElement('tr');
+                const td = document.createElement('td');
+                td.colSpan = this.columns.length;
+                td.style.padding = '0';
+                td.style.border = 'none';
+                tr.appendChild(td);
+                return tr;
+            }
+
+            update(items) {
+                this.items = items;
+                const virtual = items.length > VIRTUAL_SCROLL_THRESHOLD;
+                if (virtual !== this.virtual) {
+                    this.virtual = virtual;
+                    this.container.classList.toggle('virtual-scroll', virtual);
+                    if (virtual) {
+                        this.tbody.prepend(this.topSpacer);
+                        this.tbody.appendChild(this.bottomSpacer);
+                        this.container.addEventListener('scroll', this.onScroll, { passive: true });
+                    } else {
+                        this.topSpacer.remove();
+                        this.bottomSpacer.remove();
+                        this.container.removeEventListener('scroll', this.onScroll);
+                    }
+                }
+                this.render();
+            }
+
+            visibleRange() {
+                if (!this.virtual) return [0, this.items.length];
+                const bodyTop = this.tbody.getBoundingClientRect().top - this.container.getBoundingClientRect().top + this.container.scrollTop;
+                const first = Math.floor((this.container.scrollTop - bodyTop) / this.rowHeight);
+                const count = Math.ceil(this.container.clientHeight / this.rowHeight);
+                const start = Math.max(0, first - VIRTUAL_OVERSCAN);
+                return [start, Math.min(this.items.length, first + count + VIRTUAL_OVERSCAN)];
+            }
+
+            render() {
+                const [start, end] = this.visibleRange();
+                const seen = new Set();
+                let cursor = this.virtual ? this.topSpacer.nextSibling : this.tbody.firstChild;
+
+                for (let i = start; i < end; i++) {
+                    const item = this.items[i];
+                    const key = this.keyFn(item);
+                    seen.add(key);
+                    const html = this.columns.map(col => col(item));
+                    let row = this.rows.get(key);
+                    if (!row) {
+                        const tr = document.createElement('tr');
+                        html.forEach(cellHtml => { tr.insertCell().innerHTML = cellHtml; });
+                        row = { tr, cells: html };
+                        this.rows.set(key, row);
+                    } else {
+                        for (let c = 0; c < html.length; c++) {
+                            if (row.cells[c] !== html[c]) {
+                                row.tr.cells[c].innerHTML = html[c];
+                                row.cells[c] = html[c];
+                            }
+                        }
+                    }
+                    if (row.tr === cursor) {
+                        cursor = cursor.nextSibling;
+                    } else {
+                        this.tbody.insertBefore(row.tr, cursor);
+                    }
+                }
+
+                for (const [key, row] of this.rows) {
+                    if (!seen.has(key)) {
+                        row.tr.remove();
+                        this.rows.delete(key);
+                    }
+                }
+
+                if (this.virtual) {
+                    const sample = this.rows.values().next().value;
+                    if (sample && sample.tr.offsetHeight) this.rowHeight = sample.tr.offsetHeight;
+                    this.topSpacer.firstChild.style.height = (start * this.rowHeight) + 'px';
+                    this.bottomSpacer.firstChild.style.height = ((this.items.length - end) * this.rowHeight) + 'px';
+                    this.tbody.appendChild(this.bottomSpacer);
+                }
+            }
+        }
+
+        function assetStatus(d) {
+            if (d.health < THRESHOLDS.health_at_risk) return ['status-critical', 'Critical'];
+            if (d.health < THRESHOLDS.health_warning) return ['status-warning', 'Warning'];
+            return ['status-active', 'Active'];
+        }
+
+        const assetCells = {
+            id: d => `#${d.id.toString().padStart(4, '0')}`,
+            name: d => `<strong>${d.name}</strong>`,
+            location: d => `${d.location || 'N/A'}`,
+            health: d => `<div style="display: flex; align-items: center; gap: 10px;"><span>${d.health}%</span><div class="metric-bar"><div class="metric-fill" style="width: ${d.health}%"></div></div></div>`,
+            thd: d => d.last_thd == null ? 'N/A' : `<span style="color: ${d.last_thd > THRESHOLDS.critical_thd ? 'var(--danger)' : d.last_thd > THRESHOLDS.thd_warning ? 'var(--warning)' : 'var(--success)'}">${d.last_thd}%</span>`,
+            temp: d => d.last_temp == null ? 'N/A' : `${d.last_temp}°C`,
+            status: d => { const [cls, text] = assetStatus(d); return `<span class="status-badge ${cls}">${text}</span>`; },
+            maintenance: d => `${d.last_maintenance || 'N/A'}`
+        };
+
+        const inventoryColumns = [
+            assetCells.id, assetCells.name, assetCells.location, assetCells.health,
+            assetCells.thd, assetCells.temp, assetCells.status,
+            d => `<button class="btn btn-secondary" style="padding: 6px 12px;" onclick="showSeismograph(${d.id}, '${d.name}')"><i class="fas fa-chart-line"></i></button>
+                <button class="btn btn-secondary" style="padding: 6px 12px;" onclick="showAssetDetails(${d.id})"><i class="fas fa-info-circle"></i></button>`
+        ];
+
+        const detailedInventoryColumns = [
+            assetCells.id, assetCells.name, assetCells.location, assetCells.health,
+            assetCells.thd, assetCells.temp, assetCells.status, assetCells.maintenance,
+            d => `<button class="btn btn-secondary" style="padding: 6px 12px;" onclick="showSeismograph(${d.id}, '${d.name}')"><i class="fas fa-chart-line"></i></button>
+                <button class="btn btn-secondary" style="padding: 6px 12px;" onclick="scheduleMaintenanceForAsset(${d.id})"><i class="fas fa-tools"></i></button>`
+        ];
+
+        let inventoryTable = null;
+        let detailedInventoryTable = null;
+
         // Refresh Inventory
         async function refreshInventory() {
             try {
@@ -1893,49 +4766,12 @@ HTML_TEMPLATE = '''
                 document.getElementById('totalAssets').textContent = devices.length;
                 const avgHealth = (devices.reduce((sum, d) => sum + d.health, 0) / devices.length).toFixed(1);
                 document.getElementById('avgHealth').textContent = avgHealth + '%';
-                const criticalCount = devices.filter(d => d.health < 60 || d.last_thd > 14).length;
+                const criticalCount = devices.filter(d => d.health < THRESHOLDS.health_at_risk || d.last_thd > THRESHOLDS.thd_alarm).length;
                 document.getElementById('criticalAssets').textContent = criticalCount;
                 document.getElementById('alertBadge').textContent = criticalCount;
 
-                const list = document.getElementById('inventoryList');
-                const detailedList = document.getElementById('inventoryListDetailed');
-                
-                list.innerHTML = '';
-                detailedList.innerHTML = '';
-                
-                devices.forEach(d => {
-                    const statusClass = d.health < 60 ? 'status-critical' : d.health < 75 ? 'status-warning' : 'status-active';
-                    const statusText = d.health < 60 ? 'Critical' : d.health < 75 ? 'Warning' : 'Active';
-                    
-                    list.innerHTML += `<tr>
-                        <td>#${d.id.toString().padStart(4, '0')}</td>
-                        <td><strong>${d.name}</strong></td>
-                        <td>${d.location || 'N/A'}</td>
-                        <td><div style="display: flex; align-items: center; gap: 10px;"><span>${d.health}%</span><div class="metric-bar"><div class="metric-fill" style="width: ${d.health}%"></div></div></div></td>
-                        <td style="color: ${d.last_thd > 12 ? 'var(--danger)' : d.last_thd > 8 ? 'var(--warning)' : 'var(--success)'}">${d.last_thd}%</td>
-                        <td>${d.last_temp}°C</td>
-                        <td><span class="status-badge ${statusClass}">${statusText}</span></td>
-                        <td>
-                            <button class="btn btn-secondary" style="padding: 6px 12px;" onclick="showSeismograph(${d.id}, '${d.name}')"><i class="fas fa-chart-line"></i></button>
-                            <button class="btn btn-secondary" style="padding: 6px 12px;" onclick="showAssetDetails(${d.id})"><i class="fas fa-info-circle"></i></button>
-                        </td>
-                    </tr>`;
-                    
-                    detailedList.innerHTML += `<tr>
-                        <td>#${d.id.toString().padStart(4, '0')}</td>
-                        <td><strong>${d.name}</strong></td>
-                        <td>${d.location || 'N/A'}</td>
-                        <td><div style="display: flex; align-items: center; gap: 10px;"><span>${d.health}%</span><div class="metric-bar"><div class="metric-fill" style="width: ${d.health}%"></div></div></div></td>
-                        <td style="color: ${d.last_thd > 12 ? 'var(--danger)' : d.last_thd > 8 ? 'var(--warning)' : 'var(--success)'}">${d.last_thd}%</td>
-                        <td>${d.last_temp}°C</td>
-                        <td><span class="status-badge ${statusClass}">${statusText}</span></td>
-                        <td>${d.last_maintenance || 'N/A'}</td>
-                        <td>
-                            <button class="btn btn-secondary" style="padding: 6px 12px;" onclick="showSeismograph(${d.id}, '${d.name}')"><i class="fas fa-chart-line"></i></button>
-                            <button class="btn btn-secondary" style="padding: 6px 12px;" onclick="scheduleMaintenanceForAsset(${d.id})"><i class="fas fa-tools"></i></button>
-                        </td>
-                    </tr>`;
-                });
+                inventoryTable.update(devices);
+                detailedInventoryTable.update(devices);
 
                 updateSelects();
                 await refreshAlerts();
@@ -1979,7 +4815,7 @@ HTML_TEMPLATE = '''
                         <div class="notification-content">
                             <div class="notification-title"><strong>${device.name}</strong> - ${a.severity.toUpperCase()} Severity Anomaly</div>
                             <div class="notification-meta">
-                                <span><i class="fas fa-chart-line"></i> THD: ${a.thd_value.toFixed(1)}%</span>
+                                <span><i class="fas fa-chart-line"></i> Peak THD: ${a.thd_value.toFixed(1)}%${a.count > 1 ? ` (${a.count} readings)` : ''}</span>
                                 <span><i class="fas fa-thermometer-half"></i> ${a.temp_value.toFixed(1)}°C</span>
                                 <span><i class="fas fa-clock"></i> ${new Date(a.timestamp).toLocaleTimeString()}</span>
                             </div>
@@ -1995,6 +4831,11 @@ HTML_TEMPLATE = '''
             }
         }
 
+        async function fetchTotal(url) {
+            const res = await fetch(url + (url.includes('?') ? '&' : '?') + 'limit=1');
+            return parseInt(res.headers.get('X-Total-Count') || '0', 10);
+        }
+
         async function refreshMaintenance() {
             try {
                 const res = await fetch('/api/maintenance');
@@ -2012,9 +4853,15 @@ HTML_TEMPLATE = '''
                     </tr>`;
                 }).join('');
                 
-                const scheduled = maintenance.filter(m => m.date > new Date().toISOString().split('T')[0]).length;
-                const inProgress = maintenance.filter(m => m.date === new Date().toISOString().split('T')[0]).length;
-                const completed = maintenance.filter(m => m.date < new Date().toISOString().split('T')[0]).length;
+                // The list is paginated, so the counters come from the total-count header
+                const today = new Date().toISOString().split('T')[0];
+                const tomorrow = new Date(Date.now() + 86400000).toISOString().split('T')[0];
+                const yesterday = new Date(Date.now() - 86400000).toISOString().split('T')[0];
+                const [scheduled, inProgress, completed] = await Promise.all([
+                    fetchTotal(`/api/maintenance?from=${tomorrow}`),
+                    fetchTotal(`/api/maintenance?from=${today}&to=${today}`),
+                    fetchTotal(`/api/maintenance?to=${yesterday}`)
+                ]);
                 
                 document.getElementById('scheduledMaint').textContent = scheduled;
                 document.getElementById('inProgressMaint').textContent = inProgress;
@@ -2043,9 +4890,11 @@ HTML_TEMPLATE = '''
                     </tr>`;
                 }).join('');
                 
-                const pending = claims.filter(c => c.status === 'Pending').length;
-                const approved = claims.filter(c => c.status === 'Approved').length;
-                const rejected = claims.filter(c => c.status === 'Rejected').length;
+                const [pending, approved, rejected] = await Promise.all([
+                    fetchTotal('/api/claims?status=Pending'),
+                    fetchTotal('/api/claims?status=Approved'),
+                    fetchTotal('/api/claims?status=Rejected')
+                ]);
                 
                 document.getElementById('pendingClaims').textContent = pending;
                 document.getElementById('approvedClaims').textContent = approved;
@@ -2083,22 +4932,60 @@ HTML_TEMPLATE = '''
             await loadAndDisplayData(deviceId, currentTimeRange);
         }
 
+        // Full load: rebuilds the chart for a new device or time range
         async function loadAndDisplayData(deviceId, timeRange) {
             const res = await fetch(`/api/historical_data?id=${deviceId}&range=${timeRange}`);
             const data = await res.json();
-            updateSeismographStats(data);
+            seismoState = {
+                deviceId,
+                range: timeRange,
+                lastTimestamp: data.length ? data[data.length - 1].timestamp : null
+            };
             createSeismographChart(data);
+            updateSeismographStats(seismographChart.data.datasets[0].data);
+        }
+
+        // Live refresh: fetch only points newer than the last one shown,
+        // append them to the existing dataset and trim the tail
+        async function appendSeismographData() {
+            if (!seismoState || !seismographChart) return;
+            const { deviceId, range, lastTimestamp } = seismoState;
+            const since = lastTimestamp ? `&since=${encodeURIComponent(lastTimestamp)}` : '';
+            const res = await fetch(`/api/historical_data?id=${deviceId}&range=${range}${since}`);
+            const fresh = await res.json();
+            if (!seismoState || seismoState.deviceId !== deviceId || seismoState.range !== range || !fresh.length) return;
+
+            const labels = seismographChart.data.labels;
+            const values = seismographChart.data.datasets[0].data;
+            for (const point of fresh) {
+                labels.push(new Date(point.timestamp).toLocaleTimeString());
+                values.push(point.thd);
+            }
+            const excess = values.length - (RANGE_POINTS[range] || 60);
+            if (excess > 0) {
+                labels.splice(0, excess);
+                values.splice(0, excess);
+            }
+            seismoState.lastTimestamp = fresh[fresh.length - 1].timestamp;
+            seismographChart.update('none');
+            updateSeismographStats(values);
         }
 
-        function updateSeismographStats(data) {
+        function updateSeismographStats(values) {
             const statsDiv = document.getElementById('seismoStats');
-            const maxThd = Math.max(...data.map(d => d.thd)).toFixed(1);
-            const avgThd = (data.reduce((sum, d) => sum + d.thd, 0) / data.length).toFixed(1);
-            const criticalEvents = data.filter(d => d.thd > 12).length;
+            let max = 0, sum = 0, criticalEvents = 0;
+            for (let i = 0; i < values.length; i++) {
+                const v = values[i];
+                if (v > max) max = v;
+                sum += v;
+                if (v > THRESHOLDS.critical_thd) criticalEvents++;
+            }
+            const maxThd = max.toFixed(1);
+            const avgThd = (values.length ? sum / values.length : 0).toFixed(1);
             
             statsDiv.innerHTML = `
-                <div class="stat-item"><div class="stat-label">MAX THD</div><div class="stat-value ${maxThd > 12 ? 'critical-value' : ''}">${maxThd}%</div></div>
-                <div class="stat-item"><div class="stat-label">AVG THD</div><div class="stat-value ${avgThd > 8 ? 'warning-value' : ''}">${avgThd}%</div></div>
+                <div class="stat-item"><div class="stat-label">MAX THD</div><div class="stat-value ${maxThd > THRESHOLDS.critical_thd ? 'critical-value' : ''}">${maxThd}%</div></div>
+                <div class="stat-item"><div class="stat-label">AVG THD</div><div class="stat-value ${avgThd > THRESHOLDS.thd_warning ? 'warning-value' : ''}">${avgThd}%</div></div>
                 <div class="stat-item"><div class="stat-label">CRITICAL EVENTS</div><div class="stat-value ${criticalEvents > 0 ? 'critical-value' : ''}">${criticalEvents}</div></div>
             `;
         }
@@ -2123,10 +5010,11 @@ HTML_TEMPLATE = '''
                         borderColor: '#00f0ff',
                         backgroundColor: gradient,
                         borderWidth: 2,
-                        pointBackgroundColor: values.map(v => v > 12 ? '#ff3d57' : '#00f0ff'),
-                        pointBorderColor: values.map(v => v > 12 ? '#ff3d57' : '#00f0ff'),
-                        pointRadius: values.map(v => v > 12 ? 6 : 3),
-                        pointHoverRadius: values.map(v => v > 12 ? 8 : 5),
+                        // Scriptable so appended points are styled without rebuilding arrays
+                        pointBackgroundColor: ctx => ctx.raw > THRESHOLDS.critical_thd ? '#ff3d57' : '#00f0ff',
+                        pointBorderColor: ctx => ctx.raw > THRESHOLDS.critical_thd ? '#ff3d57' : '#00f0ff',
+                        pointRadius: ctx => ctx.raw > THRESHOLDS.critical_thd ? 6 : 3,
+                        pointHoverRadius: ctx => ctx.raw > THRESHOLDS.critical_thd ? 8 : 5,
                         tension: 0.2,
                         fill: true
                     }]
@@ -2142,7 +5030,7 @@ HTML_TEMPLATE = '''
                                 label: function(context) {
                                     let label = context.dataset.label || '';
                                     label += ': ' + context.raw.toFixed(2) + '%';
-                                    if (context.raw > 12) label += ' ⚠️ CRITICAL';
+                                    if (context.raw > THRESHOLDS.critical_thd) label += ' ⚠️ CRITICAL';
                                     return label;
                                 }
                             }
@@ -2186,6 +5074,7 @@ HTML_TEMPLATE = '''
 
         function closeSeismograph() {
             activeDeviceId = null;
+            seismoState = null;
             document.getElementById('seismographSection').style.display = 'none';
         }
 
@@ -2326,7 +5215,7 @@ HTML_TEMPLATE = '''
                 document.getElementById('pdfHealth').textContent = device.health + '%';
                 document.getElementById('pdfTHD').textContent = device.last_thd + '%';
                 document.getElementById('pdfTemp').textContent = device.last_temp + '°C';
-                document.getElementById('pdfRisk').textContent = device.health < 60 ? 'HIGH' : device.health < 75 ? 'MEDIUM' : 'LOW';
+                document.getElementById('pdfRisk').textContent = device.health < THRESHOLDS.health_at_risk ? 'HIGH' : device.health < THRESHOLDS.health_warning ? 'MEDIUM' : 'LOW';
                 document.getElementById('pdfAI').innerHTML = data.insight.replace(/\\n/g, '<br>');
                 document.getElementById('pdfDate').textContent = new Date().toLocaleDateString('en-US', { year: 'numeric', month: 'long', day: 'numeric' });
                 document.getElementById('pdfRef').textContent = `REF: PG-${Math.random().toString(36).substr(2, 8).toUpperCase()}`;
@@ -2336,7 +5225,7 @@ HTML_TEMPLATE = '''
                 document.getElementById('pdfHash').textContent = hash;
                 
                 const seal = document.getElementById('pdfSeal');
-                if (device.health < 60 || device.last_thd > 14) {
+                if (device.health < THRESHOLDS.health_at_risk || device.last_thd > THRESHOLDS.thd_alarm) {
                     seal.textContent = '⚡ CLAIM VALIDATED ⚡';
                     seal.style.color = 'red';
                     seal.style.borderColor = 'red';
@@ -2366,10 +5255,26 @@ HTML_TEMPLATE = '''
         }
 
         async function analyzeAnomaly(anomalyId) {
-            const res = await fetch(`/api/analyze_anomaly?id=${anomalyId}`, { method: 'POST' });
-            if (res.ok) {
+            const content = document.getElementById('aiAnalysisContent');
+            document.getElementById('aiAnalysisModal').classList.add('active');
+            content.innerHTML = '<i class="fas fa-spinner fa-spin"></i> Grouping into an incident and running root-cause analysis...';
+            const request = async () => (await fetch(`/api/analyze_anomaly?id=${anomalyId}`, { method: 'POST' })).json();
+            try {
+                let data = await request();
+                while (data.status === 'queued') {
+                    await new Promise(resolve => setTimeout(resolve, 1500));
+                    const job = await (await fetch(`/api/jobs/${data.job_id}`)).json();
+                    if (job.status === 'failed') throw new Error(job.error);
+                    if (job.status === 'done') data = await request();
+                }
+                if (data.error) throw new Error(data.error);
+                const incident = data.incident;
+                content.innerHTML = `<strong>Incident #${incident.id}</strong> &middot; ${incident.count} readings, ` +
+                    `${new Date(incident.start).toLocaleString()} &ndash; ${new Date(incident.end).toLocaleTimeString()}, ` +
+                    `peak THD ${incident.peak_thd.toFixed(1)}%<br><br>` + incident.analysis.replace(/\\n/g, '<br>');
                 refreshAlerts();
-                alert('Anomaly analyzed and logged');
+            } catch (error) {
+                content.innerHTML = 'Error analyzing anomaly';
             }
         }
 
@@ -2414,7 +5319,7 @@ HTML_TEMPLATE = '''
         }
 
         function exportDashboard() {
-            alert('Exporting dashboard data...');
+            window.location.href = '/api/export?dataset=telemetry&format=csv';
         }
 
         function filterAssets() {
@@ -2439,12 +5344,19 @@ HTML_TEMPLATE = '''
             alert('Claim filed with insurance provider');
         }
 
-        function showAssetDetails(assetId) {
-            const asset = devices.find(d => d.id == assetId);
-            alert(`Asset Details:\\n\\nName: ${asset.name}\\nLocation: ${asset.location}\\nHealth: ${asset.health}%\\nStatus: ${asset.status}\\nLast Maintenance: ${asset.last_maintenance}\\nPolicy: ${asset.policy_no}`);
+        async function showAssetDetails(assetId) {
+            const res = await fetch(`/api/assets/${assetId}/overview?limit=3`);
+            if (!res.ok) return;
+            const { device: asset, telemetry, maintenance, claims, anomalies } = await res.json();
+            const lastMaint = maintenance.length ? `${maintenance[0].date} (${maintenance[0].type})` : asset.last_maintenance;
+            const openClaims = claims.filter(c => c.status === 'Pending').length;
+            alert(`Asset Details:\\n\\nName: ${asset.name}\\nLocation: ${asset.location}\\nHealth: ${asset.health}%\\nStatus: ${asset.status}\\nLast Maintenance: ${lastMaint}\\nPolicy: ${asset.policy_no}` +
+                `\\n\\nTHD (1h): avg ${telemetry.thd_avg ?? 'N/A'}% / max ${telemetry.thd_max ?? 'N/A'}%\\nRecent Anomalies: ${anomalies.length}\\nPending Claims: ${openClaims}`);
         }
 
         document.addEventListener('DOMContentLoaded', () => {
+            inventoryTable = new KeyedTable(document.getElementById('inventoryList'), inventoryColumns, d => d.id);
+            detailedInventoryTable = new KeyedTable(document.getElementById('inventoryListDetailed'), detailedInventoryColumns, d => d.id);
             initCharts();
             refreshInventory();
             refreshMaintenance();
@@ -2452,7 +5364,7 @@ HTML_TEMPLATE = '''
             setInterval(refreshInventory, 10000);
             setInterval(refreshAlerts, 5000);
             setInterval(async () => {
-                if (activeDeviceId) await loadAndDisplayData(activeDeviceId, currentTimeRange);
+                if (activeDeviceId) await appendSeismographData();
             }, 3000);
         });
     </script>
@@ -2460,17 +5372,434 @@ HTML_TEMPLATE = '''
 </html>
 '''
 
+# Vendored front-end assets, relative to the static folder, with the CDN URL
+# used as a fallback when the file has not been vendored.
+VENDOR_ASSETS = {
+    'chart.js': ('vendor/chart.js/chart.umd.min.js', 'https://cdn.jsdelivr.net/npm/chart.js'),
+    'apexcharts': ('vendor/apexcharts/apexcharts.min.js', 'https://cdn.jsdelivr.net/npm/apexcharts'),
+    'font-awesome': ('vendor/fontawesome/css/all.min.css', 'https://cdnjs.cloudflare.com/ajax/libs/font-awesome/6.0.0/css/all.min.css')
+}
+COMPRESSIBLE_TYPES = ('text/', 'application/javascript', 'application/json', 'image/svg+xml')
+IMMUTABLE_CACHE = 'public, max-age=31536000, immutable'
+
+# Precompressed static responses, built once at startup
+DASHBOARD_SHELL = {}
+HASHED_ASSETS = {}
+
+def precompress(body, mimetype):
+    """Build identity/gzip/brotli variants of a static body"""
+    variants = {'identity': body}
+    if mimetype.startswith(COMPRESSIBLE_TYPES):
+        gz = gzip.compress(body, compresslevel=9, mtime=0)
+        if len(gz) < len(body):
+            variants['gzip'] = gz
+        if brotli is not None:
+            br = brotli.compress(body, quality=11)
+            if len(br) < len(body):
+                variants['br'] = br
+    return {
+        'variants': variants,
+        'mimetype': mimetype,
+        'etag': hashlib.sha256(body).hexdigest()[:32]
+    }
+
+def choose_encoding(accept_encoding, available):
+    """Pick the best content-coding offered by the client, honouring q-values"""
+    offered = {}
+    for part in accept_encoding.split(','):
+        token, _, params = part.strip().partition(';')
+        token = token.strip().lower()
+        if not token:
+            continue
+        q = 1.0
+        params = params.strip()
+        if params.startswith('q='):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        offered[token] = q
+    for encoding in ('br', 'zstd', 'gzip'):
+        if encoding in available and offered.get(encoding, offered.get('*', 0)) > 0:
+            return encoding
+    return 'identity'
+
+def serve_precompressed(entry, cache_control):
+    """Serve a precompressed entry with a strong ETag and conditional GET support"""
+    encoding = choose_encoding(request.headers.get('Accept-Encoding', ''), entry['variants'])
+    etag = entry['etag'] if encoding == 'identity' else f"{entry['etag']}-{encoding}"
+    if request.if_none_match.contains(etag):
+        resp = Response(status=304)
+    else:
+        resp = Response(entry['variants'][encoding], mimetype=entry['mimetype'])
+        if encoding != 'identity':
+            resp.headers['Content-Encoding'] = encoding
+    resp.set_etag(etag)
+    resp.headers['Vary'] = 'Accept-Encoding'
+    resp.headers['Cache-Control'] = cache_control
+    return resp
+
+def hashed_asset_name(rel_path, body):
+    root, ext = os.path.splitext(rel_path)
+    return f"{root}.{hashlib.sha256(body).hexdigest()[:12]}{ext}"
+
+def build_dashboard_shell():
+    """Render the dashboard template once and precompute its compressed variants"""
+    HASHED_ASSETS.clear()
+    assets = {}
+    for name, (rel_path, cdn_url) in VENDOR_ASSETS.items():
+        path = os.path.join(app.static_folder, rel_path)
+        if not os.path.isfile(path):
+            assets[name] = cdn_url
+            continue
+        with open(path, 'rb') as f:
+            body = f.read()
+        hashed = hashed_asset_name(rel_path, body)
+        mimetype = mimetypes.guess_type(rel_path)[0] or 'application/octet-stream'
+        HASHED_ASSETS[hashed] = precompress(body, mimetype)
+        assets[name] = '/assets/' + hashed
+    
+    html = app.jinja_env.from_string(HTML_TEMPLATE).render(assets=assets, thresholds=THRESHOLDS)
+    DASHBOARD_SHELL.clear()
+    DASHBOARD_SHELL.update(precompress(html.encode('utf-8'), 'text/html; charset=utf-8'))
+    return assets
+
+@app.after_request
+def compress_response(resp):
+    """Negotiate gzip/brotli/zstd for API payloads above COMPRESS_MIN_BYTES"""
+    if resp.direct_passthrough or resp.is_streamed or resp.status_code in (204, 304):
+        return resp
+    # Precompressed static entries negotiate their own encoding and ETag
+    if 'Content-Encoding' in resp.headers or 'ETag' in resp.headers:
+        return resp
+    if not (resp.mimetype or '').startswith(COMPRESSIBLE_TYPES):
+        return resp
+    body = resp.get_data()
+    wire = body
+    if len(body) >= COMPRESS_MIN_BYTES:
+        encoding = choose_encoding(request.headers.get('Accept-Encoding', ''), RESPONSE_ENCODERS)
+        if encoding != 'identity':
+            wire = RESPONSE_ENCODERS[encoding](body)
+            resp.set_data(wire)
+            resp.headers['Content-Encoding'] = encoding
+        resp.vary.add('Accept-Encoding')
+    if request.endpoint:
+        record_response_metrics(request.endpoint, g.get('serialize_ms', 0.0), len(body), len(wire))
+    return resp
+
+# Bulk export
+EXPORT_CHUNK_ROWS = 10000
+EXPORT_COLUMNS = {
+    'telemetry': [('motor_id', 'int64'), ('timestamp', 'timestamp'), ('thd', 'float32'), ('temp', 'float32')],
+    'anomalies': [('id', 'int64'), ('motor_id', 'int64'), ('timestamp', 'string'), ('end', 'string'),
+                  ('count', 'int64'), ('thd_value', 'float64'), ('temp_value', 'float64'), ('severity', 'string'),
+                  ('status', 'string'), ('analyzed', 'bool')],
+    'maintenance': [('id', 'int64'), ('motor_id', 'int64'), ('date', 'string'), ('type', 'string'),
+                    ('description', 'string'), ('cost', 'float64'), ('technician', 'string')],
+    'claims': [('id', 'int64'), ('motor_id', 'int64'), ('date', 'string'), ('amount', 'float64'),
+               ('status', 'string'), ('description', 'string'), ('resolution', 'string')]
+}
+
+class StreamSink(io.RawIOBase):
+    """Write-only file object that hands buffered bytes to a generator.
+
+    tell() keeps counting across drains so Parquet footers record the
+    right row-group offsets.
+    """
+    
+    def __init__(self):
+        self.chunks = []
+        self.position = 0
+    
+    def writable(self):
+        return True
+    
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        self.position += len(data)
+        return len(data)
+    
+    def tell(self):
+        return self.position
+    
+    def drain(self):
+        data = b''.join(self.chunks)
+        self.chunks = []
+        return data
+
+def export_chunks(dataset, motor_id, date_from, date_to):
+    """Yield column dicts of at most EXPORT_CHUNK_ROWS rows"""
+    columns = [name for name, _ in EXPORT_COLUMNS[dataset]]
+    if dataset == 'telemetry':
+        t_from, t_to = to_epoch(date_from), to_epoch(date_to)
+        for dev_id in sorted(TELEMETRY_INDEX):
+            if motor_id is not None and dev_id != motor_id:
+                continue
+            index = TELEMETRY_INDEX[dev_id]
+            live = index.ts[index.offset:index.n]
+            lo = index.offset + (int(np.searchsorted(live, t_from, 'left')) if t_from is not None else 0)
+            hi = index.offset + (int(np.searchsorted(live, t_to, 'right')) if t_to is not None else len(live))
+            for start in range(lo, hi, EXPORT_CHUNK_ROWS):
+                stop = min(hi, start + EXPORT_CHUNK_ROWS)
+                yield {
+                    'motor_id': np.full(stop - start, dev_id, dtype=np.int64),
+                    'timestamp': index.ts[start:stop].copy(),
+                    'thd': index.thd[start:stop].copy(),
+                    'temp': index.temp[start:stop].copy()
+                }
+    elif dataset == 'anomalies':
+        date_to = end_of_day(date_to)
+        COALESCER.sweep()
+        rows = [a for a in list(ANOMALY_LOG)
+                if (motor_id is None or a['motor_id'] == motor_id)
+                and (date_from is None or a['timestamp'] >= date_from)
+                and (date_to is None or a['timestamp'] <= date_to)]
+        for start in range(0, len(rows), EXPORT_CHUNK_ROWS):
+            chunk = rows[start:start + EXPORT_CHUNK_ROWS]
+            yield {name: [a.get(name) for a in chunk] for name in columns}
+    else:
+        where, params = [], []
+        if motor_id is not None:
+            where.append('motor_id = ?')
+            params.append(motor_id)
+        if date_from:
+            where.append('date >= ?')
+            params.append(date_from)
+        if date_to:
+            where.append('date <= ?')
+            params.append(date_to)
+        clause = ' WHERE ' + ' AND '.join(where) if where else ''
+        conn = get_db()
+        try:
+            cursor = conn.execute(f"SELECT {', '.join(columns)} FROM {dataset}{clause} ORDER BY date, id", params)
+            while True:
+                rows = cursor.fetchmany(EXPORT_CHUNK_ROWS)
+                if not rows:
+                    break
+                yield {name: [r[i] for r in rows] for i, name in enumerate(columns)}
+        finally:
+            conn.close()
+
+# Exported sample times are UTC in every format: tz-aware in Parquet/Arrow,
+# ISO-8601 with a +00:00 offset in CSV, whatever the server's local zone
+EXPORT_TIMESTAMP = pa.timestamp('us', tz='UTC') if pa is not None else None
+
+def arrow_schema(dataset):
+    types = {'int64': pa.int64(), 'float32': pa.float32(), 'float64': pa.float64(),
+             'string': pa.string(), 'bool': pa.bool_(), 'timestamp': EXPORT_TIMESTAMP}
+    return pa.schema([(name, types[kind]) for name, kind in EXPORT_COLUMNS[dataset]])
+
+def arrow_batch(dataset, chunk, schema):
+    arrays = []
+    for field in schema:
+        values = chunk[field.name]
+        if field.type == EXPORT_TIMESTAMP:
+            values = (np.asarray(values) * 1e6).astype(np.int64)
+        arrays.append(pa.array(values, type=field.type))
+    return pa.record_batch(arrays, schema=schema)
+
+def stream_export(dataset, fmt, chunks):
+    """Encode export chunks as CSV, Parquet row groups or Arrow IPC batches"""
+    if fmt == 'csv':
+        columns = [name for name, _ in EXPORT_COLUMNS[dataset]]
+        out = io.StringIO()
+        writer = csv.writer(out)
+        writer.writerow(columns)
+        for chunk in chunks:
+            if dataset == 'telemetry':
+                chunk = dict(chunk, timestamp=[datetime.fromtimestamp(t, timezone.utc).isoformat()
+                                               for t in chunk['timestamp'].tolist()],
+                             thd=np.round(chunk['thd'].astype(np.float64), 3).tolist(),
+                             temp=np.round(chunk['temp'].astype(np.float64), 2).tolist())
+            writer.writerows(zip(*(chunk[name] for name in columns)))
+            yield out.getvalue().encode('utf-8')
+            out.seek(0)
+            out.truncate()
+        yield out.getvalue().encode('utf-8')
+        return
+    
+    schema = arrow_schema(dataset)
+    sink = StreamSink()
+    if fmt == 'parquet':
+        writer = pq.ParquetWriter(sink, schema, compression='zstd')
+        for chunk in chunks:
+            writer.write_batch(arrow_batch(dataset, chunk, schema))
+            yield sink.drain()
+    else:
+        writer = pa.ipc.new_stream(sink, schema)
+        for chunk in chunks:
+            writer.write_batch(arrow_batch(dataset, chunk, schema))
+            yield sink.drain()
+    writer.close()
+    yield sink.drain()
+
+# Bulk import
+IMPORT_CHUNK_ROWS = 1000
+IMPORT_MAX_ERRORS = 100
+IMPORT_KEYS = ('policy_no', 'model_no')
+DEVICE_TEXT_FIELDS = ('name', 'policy_no', 'model_no', 'location', 'manufacturer', 'criticality', 'buyer_name', 'seller_name')
+DEVICE_DATE_FIELDS = ('installation_date', 'purchase_date', 'defect_date', 'last_maintenance')
+DEVICE_IMPORT_FIELDS = DEVICE_TEXT_FIELDS + ('premium', 'coverage') + DEVICE_DATE_FIELDS + ('last_thd', 'last_temp')
+
+def import_format():
+    fmt = request.args.get('format')
+    if fmt:
+        return fmt
+    if request.mimetype in ('text/csv', 'application/csv'):
+        return 'csv'
+    if request.mimetype in ('application/x-ndjson', 'application/ndjson', 'application/jsonl'):
+        return 'ndjson'
+    return 'json'
+
+def import_rows(fmt):
+    """Yield row dicts from the request body without buffering it all"""
+    if fmt == 'csv':
+        yield from csv.DictReader(io.TextIOWrapper(request.stream, encoding='utf-8-sig', newline=''))
+    elif fmt == 'ndjson':
+        for line in io.TextIOWrapper(request.stream, encoding='utf-8'):
+            if line.strip():
+                yield json.loads(line)
+    else:
+        rows = request.get_json()
+        if isinstance(rows, dict):
+            rows = rows.get('rows', [])
+        yield from rows
+
+def clean(value):
+    """Blank CSV cells and empty strings count as missing"""
+    if isinstance(value, str):
+        value = value.strip()
+    return None if value == '' else value
+
+def normalize_device(row, key):
+    device = {name: clean(row.get(name)) for name in DEVICE_TEXT_FIELDS}
+    if not device[key]:
+        raise ValueError(f"missing {key}")
+    for name in ('premium', 'coverage'):
+        device[name] = parse_amount(clean(row.get(name)))
+    for name in DEVICE_DATE_FIELDS:
+        device[name] = parse_date(clean(row.get(name)))
+    for name in ('last_thd', 'last_temp'):
+        value = clean(row.get(name))
+        device[name] = None if value is None else float(value)
+    return device
+
+def normalize_record(row, kind):
+    motor_id = clean(row.get('motor_id'))
+    record = {
+        'motor_id': None if motor_id is None else int(motor_id),
+        'policy_no': clean(row.get('policy_no')),
+        'model_no': clean(row.get('model_no')),
+        'date': parse_date(clean(row.get('date'))),
+        'description': clean(row.get('description')) or ''
+    }
+    if record['motor_id'] is None and not record['policy_no'] and not record['model_no']:
+        raise ValueError("missing motor_id, policy_no or model_no")
+    if not record['date']:
+        raise ValueError("missing date")
+    if kind == 'maintenance':
+        record['type'] = clean(row.get('type')) or 'Routine'
+        record['cost'] = parse_amount(clean(row.get('cost')))
+        record['technician'] = clean(row.get('technician')) or ''
+    else:
+        record['amount'] = parse_amount(clean(row.get('amount')))
+        record['status'] = clean(row.get('status')) or 'Pending'
+        record['resolution'] = clean(row.get('resolution')) or ''
+    return record
+
+def resolve_motor_ids(conn, rows):
+    """Map motor_id / policy_no / model_no references to motor ids, one query per column"""
+    wanted = {key: {r[key] for r in rows if r[key]} for key in IMPORT_KEYS}
+    wanted['id'] = {r['motor_id'] for r in rows if r['motor_id'] is not None}
+    found = {}
+    for column, values in wanted.items():
+        if values:
+            placeholders = ','.join('?' * len(values))
+            for r in conn.execute(f'SELECT id, {column} FROM motors WHERE {column} IN ({placeholders})', list(values)):
+                found[(column, r[column])] = r['id']
+    
+    resolved = []
+    for r in rows:
+        if r['motor_id'] is not None:
+            resolved.append(found.get(('id', r['motor_id'])))
+        else:
+            resolved.append(next((found[(k, r[k])] for k in IMPORT_KEYS if (k, r[k]) in found), None))
+    return resolved
+
+def upsert_devices(conn, rows, key):
+    """Insert or update motors keyed on policy_no or model_no; returns (inserted, updated)"""
+    latest = {r[key]: r for r in rows}
+    placeholders = ','.join('?' * len(latest))
+    existing = {r[key]: r['id'] for r in conn.execute(
+        f'SELECT id, {key} FROM motors WHERE {key} IN ({placeholders})', list(latest))}
+    fields = DEVICE_IMPORT_FIELDS
+    
+    # Columns missing from the import keep their current value
+    updates = [[d[f] for f in fields] + [existing[k]] for k, d in latest.items() if k in existing]
+    if updates:
+        assignments = ', '.join(f'{f} = COALESCE(?, {f})' for f in fields)
+        conn.executemany(f'UPDATE motors SET {assignments} WHERE id = ?', updates)
+        for row in updates:
+            bump_version(row[-1])
+    
+    # New motors start healthy; baselines come from the imported readings if any
+    inserts = [[100.0, 'Active', d['last_thd'], d['last_temp']] + [dict(d, premium=d['premium'] or 0.0)[f] for f in fields]
+               for k, d in latest.items() if k not in existing]
+    if inserts:
+        columns = ('health', 'status', 'vibration_baseline', 'temp_baseline') + fields
+        conn.executemany(f"INSERT INTO motors ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})", inserts)
+    return len(inserts), len(updates)
+
+def upsert_records(conn, kind, rows):
+    """Insert or update maintenance/claims rows deduplicated on their natural key"""
+    if kind == 'maintenance':
+        natural, values = ('motor_id', 'date', 'type', 'description'), ('cost', 'technician')
+    else:
+        natural, values = ('motor_id', 'date', 'description'), ('amount', 'status', 'resolution')
+    latest = {tuple(r[c] for c in natural): r for r in rows}
+    
+    motor_ids = {r['motor_id'] for r in latest.values()}
+    dates = [r['date'] for r in latest.values()]
+    placeholders = ','.join('?' * len(motor_ids))
+    existing = {tuple(r[c] for c in natural): r['id'] for r in conn.execute(
+        f"SELECT id, {', '.join(natural)} FROM {kind} WHERE motor_id IN ({placeholders}) AND date BETWEEN ? AND ?",
+        list(motor_ids) + [min(dates), max(dates)])}
+    
+    updates = [[r[c] for c in values] + [existing[k]] for k, r in latest.items() if k in existing]
+    if updates:
+        conn.executemany(f"UPDATE {kind} SET {', '.join(f'{c} = ?' for c in values)} WHERE id = ?", updates)
+    columns = natural + values
+    inserts = [[r[c] for c in columns] for k, r in latest.items() if k not in existing]
+    if inserts:
+        conn.executemany(f"INSERT INTO {kind} ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})", inserts)
+    
+    for motor_id in motor_ids:
+        bump_version(motor_id)
+    if kind == 'maintenance':
+        conn.executemany('''UPDATE motors SET last_maintenance =
+                (SELECT MAX(date) FROM maintenance WHERE motor_id = ?) WHERE id = ?''',
+            [(m, m) for m in motor_ids])
+    return len(inserts), len(updates)
+
 # API Routes
 @app.route('/api/devices', methods=['GET'])
 def get_devices():
     conn = get_db()
     data = conn.execute('SELECT * FROM motors ORDER BY id').fetchall()
     conn.close()
-    return jsonify([dict(r) for r in data])
+    return jsonify(data)
 
 @app.route('/api/devices', methods=['POST'])
 def add_device():
     data = request.json
+    try:
+        coverage = parse_amount(data['coverage'])
+        installation_date = parse_date(data['installation_date'])
+        purchase_date = parse_date(data.get('purchase_date'))
+        defect_date = parse_date(data.get('defect_date'))
+    except ValueError as e:
+        return jsonify({"status": "error", "message": str(e)}), 400
+    
     conn = get_db()
     cursor = conn.cursor()
     
@@ -2483,23 +5812,24 @@ def add_device():
          vibration_baseline, temp_baseline, last_maintenance, location, installation_date,
          manufacturer, model_no, criticality, purchase_date, defect_date, buyer_name, seller_name)
         VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)''',
-        (data['name'], health, '0', data['policy_no'], data['coverage'], 'Active',
+        (data['name'], health, 0.0, data['policy_no'], coverage, 'Active',
          last_thd, last_temp, last_thd, last_temp, datetime.now().strftime('%Y-%m-%d'),
-         data['location'], data['installation_date'], data['manufacturer'],
-         data['model_no'], data['criticality'], data.get('purchase_date', ''),
-         data.get('defect_date', ''), data.get('buyer_name', ''), data.get('seller_name', '')))
+         data['location'], installation_date, data['manufacturer'],
+         data['model_no'], data['criticality'], purchase_date,
+         defect_date, data.get('buyer_name', ''), data.get('seller_name', '')))
     
     device_id = cursor.lastrowid
     conn.commit()
     conn.close()
     
-    TELEMETRY_HISTORY[device_id] = []
+    points = []
     for i in range(60):
-        TELEMETRY_HISTORY[device_id].append({
+        points.append({
             'timestamp': (datetime.now() - timedelta(minutes=60-i)).isoformat(),
             'thd': last_thd + random.uniform(-1, 1),
             'temp': last_temp + random.uniform(-2, 2)
         })
+    set_history(device_id, points)
     
     return jsonify({"id": device_id, "status": "created"})
 
@@ -2509,50 +5839,149 @@ def telemetry():
     thd = round(random.uniform(4, 20), 2)
     temp = round(30 + (thd * 1.4), 1)
     
-    conn = get_db()
-    device = conn.execute('SELECT * FROM motors WHERE id = ?', (dev_id,)).fetchone()
+    ingest_samples([{'id': dev_id, 'thd': thd, 'temp': temp}])
     
-    if device:
-        history = TELEMETRY_HISTORY.get(dev_id, [])
-        new_health = calculate_health_score(dev_id, thd, temp, 
-                                           device['vibration_baseline'], 
-                                           device['temp_baseline'], 
-                                           history)
-        
-        if new_health < 50:
-            status = 'Critical'
-        elif new_health < 75:
-            status = 'Warning'
-        else:
-            status = 'Active'
-        
-        conn.execute('UPDATE motors SET last_thd = ?, last_temp = ?, health = ?, status = ? WHERE id = ?',
-                    (thd, temp, new_health, status, dev_id))
-        conn.commit()
-        
-        if thd > 12:
-            ANOMALY_LOG.append({
-                'id': len(ANOMALY_LOG) + 1,
-                'motor_id': dev_id,
-                'timestamp': datetime.now().isoformat(),
-                'thd_value': thd,
-                'temp_value': temp,
-                'severity': 'high' if thd > 15 else 'medium',
-                'analyzed': False
-            })
+    return jsonify({"thd": thd, "temp": temp})
+
+TELEMETRY_BATCH_MAX = 10000
+
+@app.route('/api/telemetry', methods=['POST'])
+def telemetry_batch():
+    """Ingest a JSON batch of {id, thd, temp, timestamp?} readings.
+
+    The body is a list or {"samples": [...]}; timestamps are epoch
+    seconds or ISO-8601 and default to the time of arrival.
+    """
+    samples = request.get_json(silent=True)
+    if isinstance(samples, dict):
+        samples = samples.get('samples')
+    if not isinstance(samples, list):
+        return jsonify({"error": "Expected a JSON list of samples"}), 400
+    if len(samples) > TELEMETRY_BATCH_MAX:
+        return jsonify({"error": f"At most {TELEMETRY_BATCH_MAX} samples per batch"}), 413
+    
+    valid, rejected = [], []
+    for i, sample in enumerate(samples):
+        try:
+            valid.append({'id': int(sample['id']), 'thd': float(sample['thd']), 'temp': float(sample['temp']),
+                          'timestamp': to_iso(to_epoch(sample.get('timestamp', sample.get('ts'))))})
+        except (KeyError, TypeError, ValueError) as e:
+            rejected.append({'index': i, 'error': str(e)})
+    
+    results = ingest_samples(valid)
+    unknown = sorted({r['id'] for r in results if r['status'] == 'unknown_device'})
+    return jsonify({
+        'accepted': len(results) - sum(r['status'] == 'unknown_device' for r in results),
+        'unknown_devices': unknown,
+        'rejected': rejected
+    })
+
+@app.route('/api/waveform', methods=['POST'])
+def ingest_waveform():
+    """Raw waveform frames (little-endian float32) in; per-frame features out.
+
+    Query args: id, sample_rate (Hz), frame_size (samples per frame),
+    fundamental (Hz, default 50), ts (epoch or ISO of the first frame)
+    and temp (otherwise the device's last temperature, or its baseline, is
+    carried over; a motor with neither needs an explicit temp).
+    Each frame's THD is fed through the normal telemetry pipeline.
+    """
+    dev_id = int(request.args.get('id'))
+    sample_rate = request.args.get('sample_rate', type=float)
+    frame_size = request.args.get('frame_size', 4096, type=int)
+    fundamental = request.args.get('fundamental', 50.0, type=float)
+    if not sample_rate or sample_rate <= 0 or frame_size < 16 or fundamental <= 0:
+        return jsonify({"error": "sample_rate, frame_size (>= 16) and fundamental must be positive"}), 400
+    if fundamental * 2 >= sample_rate / 2:
+        return jsonify({"error": "sample_rate too low to resolve harmonics of the fundamental"}), 400
+    # waveform_features drops out-of-range bins, so the first kept bin must be the fundamental
+    if not 1 <= round(fundamental * frame_size / sample_rate) <= frame_size // 2 - 1:
+        return jsonify({"error": "frame_size too short to resolve the fundamental at this sample_rate"}), 400
+    if (request.content_length or 0) > WAVEFORM_MAX_BYTES:
+        return jsonify({"error": "Payload too large"}), 413
     
+    body = request.get_data(cache=False)
+    if not body or len(body) % (4 * frame_size):
+        return jsonify({"error": "Body must be a whole number of float32 frames"}), 400
+    
+    conn = get_db()
+    device = conn.execute('SELECT last_temp, temp_baseline FROM motors WHERE id = ?', (dev_id,)).fetchone()
     conn.close()
+    if not device:
+        return jsonify({"error": "Device not found"}), 404
+    temp = request.args.get('temp', type=float)
+    if temp is None:
+        temp = device['last_temp'] if device['last_temp'] is not None else device['temp_baseline']
+    if temp is None:
+        return jsonify({"error": "temp is required for a motor with no readings yet"}), 400
     
-    if dev_id in TELEMETRY_HISTORY:
-        TELEMETRY_HISTORY[dev_id].append({
-            'timestamp': datetime.now().isoformat(),
-            'thd': thd,
-            'temp': temp
-        })
-        if len(TELEMETRY_HISTORY[dev_id]) > 1000:
-            TELEMETRY_HISTORY[dev_id] = TELEMETRY_HISTORY[dev_id][-1000:]
+    frames = np.frombuffer(body, dtype='<f4').reshape(-1, frame_size)
+    features = compute_waveform_features(frames, sample_rate, fundamental)
     
-    return jsonify({"thd": thd, "temp": temp})
+    try:
+        start = to_epoch(request.args.get('ts')) or time.time()
+    except ValueError:
+        return jsonify({"error": "ts must be epoch seconds or ISO-8601"}), 400
+    frame_seconds = frame_size / sample_rate
+    WAVEFORM_ARCHIVE.append(dev_id, start + np.arange(len(frames)) * frame_seconds, frames, sample_rate)
+    results = ingest_samples([
+        {'id': dev_id, 'thd': round(float(thd), 3), 'temp': temp, 'timestamp': start + i * frame_seconds}
+        for i, thd in enumerate(features['thd'])
+    ])
+    
+    LATEST_WAVEFORM_FEATURES[dev_id] = {
+        'timestamp': to_iso(start + (len(frames) - 1) * frame_seconds),
+        **{key: round(float(values[-1]), 4) for key, values in features.items()}
+    }
+    return jsonify({
+        'id': dev_id,
+        'frames': len(frames),
+        'health': results[-1]['health'],
+        'status': results[-1]['status'],
+        **{key: np.round(values, 4) for key, values in features.items()}
+    })
+
+OVERVIEW_FIELDS = ('device', 'telemetry', 'maintenance', 'claims', 'anomalies')
+
+@app.route('/api/assets/<int:asset_id>/overview')
+def asset_overview(asset_id):
+    """Everything the asset detail view needs in one round trip.
+
+    ?fields= picks a comma-separated subset of OVERVIEW_FIELDS, plus
+    'series' for the raw telemetry window; ?range= and ?limit= size the
+    telemetry window and the record lists.
+    """
+    fields = request.args.get('fields')
+    fields = set(fields.split(',')) if fields else set(OVERVIEW_FIELDS)
+    limit = max(1, min(request.args.get('limit', 10, type=int), PAGE_MAX_LIMIT))
+    points_map = {'1h': 60, '6h': 360, '24h': 1440, '7d': 10080}
+    max_points = points_map.get(request.args.get('range', '1h'), 60)
+    
+    conn = get_db()
+    device = conn.execute('SELECT * FROM motors WHERE id = ?', (asset_id,)).fetchone()
+    if not device:
+        conn.close()
+        return jsonify({"error": "Asset not found"}), 404
+    
+    overview = {'id': asset_id}
+    if 'device' in fields:
+        overview['device'] = device
+    if 'maintenance' in fields:
+        overview['maintenance'] = get_maintenance_history(asset_id, limit, conn)
+    if 'claims' in fields:
+        overview['claims'] = get_claim_history(asset_id, limit, conn)
+    conn.close()
+    
+    if 'telemetry' in fields or 'series' in fields:
+        window = TELEMETRY_HISTORY.get(asset_id, [])[-max_points:]
+        if 'telemetry' in fields:
+            overview['telemetry'] = summarize_telemetry(window)
+        if 'series' in fields:
+            overview['series'] = window
+    if 'anomalies' in fields:
+        COALESCER.sweep()
+        overview['anomalies'] = [a for a in ANOMALY_LOG if a['motor_id'] == asset_id][-limit:][::-1]
+    return jsonify(overview)
 
 @app.route('/api/historical_data')
 def historical_data():
@@ -2562,33 +5991,130 @@ def historical_data():
     points_map = {'1h': 60, '6h': 360, '24h': 1440, '7d': 10080}
     max_points = points_map.get(time_range, 60)
     
+    since = request.args.get('since')
+    
     history = TELEMETRY_HISTORY.get(dev_id, [])
     
-    if len(history) < max_points:
+    if len(history) < max_points and not since:
         conn = get_db()
         device = conn.execute('SELECT * FROM motors WHERE id = ?', (dev_id,)).fetchone()
         conn.close()
         
-        if device:
+        # Imported motors without a baseline get no fabricated history
+        if device and device['vibration_baseline'] is not None:
+            # Synthetic fill for the chart only: it never enters the history,
+            # the window index or the forecasts. Seeded per device so reloads
+            # of the same range draw the same curve.
+            rng = random.Random(dev_id)
             base_thd = device['vibration_baseline']
-            for i in range(max_points - len(history)):
-                if random.random() < 0.05 and device['criticality'] == 'Critical':
-                    thd = base_thd + random.uniform(8, 15)
+            oldest = datetime.fromisoformat(history[0]['timestamp']) if history else datetime.now()
+            missing = max_points - len(history)
+            backfill = []
+            for i in range(missing):
+                if rng.random() < 0.05 and device['criticality'] == 'Critical':
+                    thd = base_thd + rng.uniform(8, 15)
                 else:
-                    thd = base_thd + random.uniform(-2, 2)
+                    thd = base_thd + rng.uniform(-2, 2)
                 
-                history.append({
-                    'timestamp': (datetime.now() - timedelta(minutes=max_points-i)).isoformat(),
+                backfill.append({
+                    'timestamp': (oldest - timedelta(minutes=missing-i)).isoformat(),
                     'thd': max(0, thd),
                     'temp': 30 + thd * 1.4
                 })
-            TELEMETRY_HISTORY[dev_id] = history
+            # Older points go in front so the series stays in time order
+            history = backfill + history
     
     if len(history) > max_points:
         history = history[-max_points:]
     
+    if since:
+        # Incremental fetch: only points newer than the client's last timestamp
+        start = len(history)
+        while start > 0 and history[start - 1]['timestamp'] > since:
+            start -= 1
+        history = history[start:]
+    
     return jsonify(history)
 
+@app.route('/api/window_stats')
+def window_stats():
+    """min/max/mean/critical-count over any time window of a device's series"""
+    dev_id = int(request.args.get('id'))
+    index = TELEMETRY_INDEX.get(dev_id)
+    if index is None:
+        return jsonify({"error": "No telemetry for device"}), 404
+    try:
+        t_from = to_epoch(request.args.get('from'))
+        t_to = to_epoch(request.args.get('to'))
+    except ValueError:
+        return jsonify({"error": "from/to must be epoch seconds or ISO-8601"}), 400
+    stats = index.window(t_from, t_to)
+    stats['id'] = dev_id
+    return jsonify(stats)
+
+@app.route('/api/forecast')
+def forecast():
+    """Forecast bands and time-to-threshold; without ?id= returns the fleet ETA list"""
+    horizon = max(1, min(request.args.get('horizon', 60, type=int), 1440))
+    if request.args.get('id'):
+        dev_id = int(request.args.get('id'))
+        result = FORECASTS.forecast(dev_id, horizon)
+        if result is None:
+            return jsonify({"error": "Not enough telemetry to forecast"}), 404
+        return jsonify(dict(result, id=dev_id))
+    
+    FORECASTS.fit()
+    fleet = []
+    for dev_id in list(FORECASTS.state):
+        result = FORECASTS.forecast(dev_id, horizon)
+        fleet.append({'id': dev_id, 'thd_level': result['thd']['level'],
+                      'thd_trend': result['thd']['trend_per_sample'], **result['time_to_threshold']})
+    fleet.sort(key=lambda f: f['seconds'] if f['seconds'] is not None else math.inf)
+    return jsonify(fleet)
+
+@app.route('/api/waveform_archive')
+def waveform_archive():
+    """Archived raw frames for a motor and time window.
+
+    format=summary (default) returns frame timestamps and waveform
+    features; format=raw streams the float32 frames straight from the
+    memory map, with frame geometry in the X-Frame-* headers.
+    """
+    dev_id = int(request.args.get('id'))
+    try:
+        t_from = to_epoch(request.args.get('from'))
+        t_to = to_epoch(request.args.get('to'))
+    except ValueError:
+        return jsonify({"error": "from/to must be epoch seconds or ISO-8601"}), 400
+    views = WAVEFORM_ARCHIVE.read(dev_id, t_from, t_to)
+    
+    if request.args.get('format') == 'raw':
+        if len({(v['frame_size'], v['sample_rate']) for v in views}) > 1:
+            return jsonify({"error": "Window spans different frame geometries; narrow from/to"}), 409
+        
+        def generate():
+            for view in views:
+                for start in range(0, len(view['frames']), 256):
+                    yield memoryview(view['frames'][start:start + 256]).cast('B')
+        
+        resp = Response(generate(), mimetype='application/octet-stream')
+        resp.headers['X-Frame-Count'] = str(sum(len(v['timestamps']) for v in views))
+        if views:
+            resp.headers['X-Frame-Size'] = str(views[0]['frame_size'])
+            resp.headers['X-Sample-Rate'] = str(views[0]['sample_rate'])
+            resp.headers['X-First-Timestamp'] = str(float(views[0]['timestamps'][0]))
+        return resp
+    
+    return jsonify({
+        'id': dev_id,
+        'segments': [{
+            'frame_size': v['frame_size'],
+            'sample_rate': v['sample_rate'],
+            'timestamps': np.asarray(v['timestamps'])
+        } for v in views],
+        'summary': WAVEFORM_ARCHIVE.summary(dev_id, t_from, t_to)
+    })
+
 @app.route('/api/simulate_failure')
 def simulate_failure():
     dev_id = int(request.args.get('id'))
@@ -2598,91 +6124,420 @@ def simulate_failure():
     
     for i in range(5):
         if dev_id in TELEMETRY_HISTORY:
-            TELEMETRY_HISTORY[dev_id].append({
-                'timestamp': (datetime.now() + timedelta(seconds=i*10)).isoformat(),
+            point = {
+                'timestamp': (datetime.now() - timedelta(seconds=4-i)).isoformat(),
                 'thd': spike_thd + random.uniform(-2, 2),
                 'temp': spike_temp + random.uniform(-3, 3)
-            })
+            }
+            record_telemetry(dev_id, point)
+            COALESCER.observe(dev_id, point['timestamp'], point['thd'], point['temp'])
     
     conn = get_db()
     conn.execute('UPDATE motors SET last_thd = ?, last_temp = ?, health = health - 25, status = ? WHERE id = ?',
                 (spike_thd, spike_temp, 'Critical Failure', dev_id))
     conn.commit()
     conn.close()
+    bump_version(dev_id)
     
-    ANOMALY_LOG.append({
-        'id': len(ANOMALY_LOG) + 1,
-        'motor_id': dev_id,
-        'timestamp': datetime.now().isoformat(),
-        'thd_value': spike_thd,
-        'temp_value': spike_temp,
-        'severity': 'critical',
-        'analyzed': False
-    })
+    COALESCER.observe(dev_id, datetime.now().isoformat(), spike_thd, spike_temp, severity='critical')
     
     return jsonify({"status": "failure_simulated", "thd": spike_thd})
 
 @app.route('/api/anomalies')
 def get_anomalies():
-    return jsonify(ANOMALY_LOG[-20:])
+    try:
+        limit, after = parse_page_args(default_limit=20)
+    except ValueError:
+        return jsonify({"error": "Invalid limit or cursor"}), 400
+    
+    COALESCER.sweep()
+    motor_id = request.args.get('motor_id', type=int)
+    severity = request.args.get('type')
+    status = request.args.get('status')
+    date_from = request.args.get('from')
+    date_to = end_of_day(request.args.get('to'))
+    
+    matches = [a for a in ANOMALY_LOG
+               if (motor_id is None or a['motor_id'] == motor_id)
+               and (severity is None or a['severity'] == severity)
+               and (status is None or a['analyzed'] == (status == 'analyzed'))
+               and (date_from is None or a['timestamp'] >= date_from)
+               and (date_to is None or a['timestamp'] <= date_to)]
+    total = len(matches)
+    if after:
+        after = tuple(after)
+        # Anomaly timestamps are never NULL, so nothing follows a NULL-date cursor
+        matches = [a for a in matches if after[0] is not None and (a['timestamp'], a['id']) < after]
+    
+    page = heapq.nlargest(limit + 1, matches, key=lambda a: (a['timestamp'], a['id']))
+    next_cursor = None
+    if len(page) > limit:
+        page = page[:limit]
+        next_cursor = encode_cursor(page[-1]['timestamp'], page[-1]['id'])
+    return paged_response(page, next_cursor, total)
 
 @app.route('/api/analyze_anomaly', methods=['POST'])
 def analyze_anomaly():
+    """Analyze an anomaly through its incident; queues a job if none has run yet"""
     anomaly_id = int(request.args.get('id'))
-    for anomaly in ANOMALY_LOG:
-        if anomaly['id'] == anomaly_id:
-            anomaly['analyzed'] = True
-            break
-    return jsonify({"status": "analyzed"})
+    anomaly = next((a for a in ANOMALY_LOG if a['id'] == anomaly_id), None)
+    if not anomaly:
+        return jsonify({"error": "Anomaly not found"}), 404
+    
+    incident = INCIDENTS.get(anomaly.get('incident_id'))
+    if anomaly['analyzed'] and incident:
+        return jsonify({"status": "analyzed", "incident": public_incident(incident)})
+    if incident and incident['status'] in ('queued', 'running'):
+        return jsonify({"status": "queued", "job_id": incident['job_id'], "incident_id": incident['id']}), 202
+    job = start_incident_job(anomaly['motor_id'])
+    return jsonify({"status": "queued", "job_id": job['id'], "incident_id": anomaly.get('incident_id')}), 202
+
+@app.route('/api/incidents')
+def list_incidents():
+    motor_id = request.args.get('motor_id', type=int)
+    status = request.args.get('status')
+    incidents = [public_incident(i) for i in sorted(INCIDENTS.values(), key=lambda i: i['id'], reverse=True)
+                 if (motor_id is None or i['motor_id'] == motor_id) and (status is None or i['status'] == status)]
+    return jsonify(incidents)
+
+@app.route('/api/incidents/analyze', methods=['POST'])
+def analyze_incidents():
+    """Queue root-cause analysis of all unanalyzed anomalies (optionally one motor's)"""
+    job = start_incident_job(request.args.get('motor_id', type=int))
+    return jsonify(job), 202 if job['status'] == 'queued' else 200
+
+@app.route('/api/jobs/<job_id>')
+def job_status(job_id):
+    job = JOBS.get(job_id)
+    if not job:
+        return jsonify({"error": "Job not found"}), 404
+    return jsonify(dict(job, incidents=[public_incident(INCIDENTS[i]) for i in job['incidents']]))
 
 @app.route('/api/acknowledge_anomaly', methods=['POST'])
 def acknowledge_anomaly():
     anomaly_id = int(request.args.get('id'))
+    for anomaly in ANOMALY_LOG:
+        if anomaly['id'] == anomaly_id:
+            bump_version(anomaly['motor_id'])
+    # A fault that persists opens a fresh anomaly on its next breach
+    COALESCER.forget(anomaly_id)
     ANOMALY_LOG[:] = [a for a in ANOMALY_LOG if a['id'] != anomaly_id]
     return jsonify({"status": "acknowledged"})
 
 @app.route('/api/maintenance', methods=['GET'])
 def get_maintenance():
+    try:
+        limit, after = parse_page_args()
+    except ValueError:
+        return jsonify({"error": "Invalid limit or cursor"}), 400
+    
+    filters = []
+    if request.args.get('motor_id'):
+        filters.append(('motor_id = ?', request.args.get('motor_id', type=int)))
+    if request.args.get('type'):
+        filters.append(('type = ?', request.args['type']))
+    if request.args.get('from'):
+        filters.append(('date >= ?', request.args['from']))
+    if request.args.get('to'):
+        filters.append(('date <= ?', request.args['to']))
+    
     conn = get_db()
-    data = conn.execute('SELECT * FROM maintenance ORDER BY date DESC').fetchall()
+    data, next_cursor, total = keyset_query(conn, 'maintenance', 'date', filters, limit, after)
     conn.close()
-    return jsonify([dict(r) for r in data])
+    return paged_response(data, next_cursor, total)
 
 @app.route('/api/maintenance', methods=['POST'])
 def add_maintenance():
     data = request.json
+    try:
+        # The dashboard sends the id as a string; version keys are ints
+        motor_id = int(data['motor_id'])
+        date = parse_date(data.get('date'))
+        cost = parse_amount(data['cost'])
+        if date is None:
+            raise ValueError("date is required")
+    except ValueError as e:
+        return jsonify({"status": "error", "message": str(e)}), 400
     conn = get_db()
     cursor = conn.cursor()
     cursor.execute('''INSERT INTO maintenance 
         (motor_id, date, type, description, cost, technician)
         VALUES (?, ?, ?, ?, ?, ?)''',
-        (data['motor_id'], data['date'], data['type'], 
-         data['description'], data['cost'], data['technician']))
+        (motor_id, date, data['type'], 
+         data['description'], cost, data['technician']))
     conn.commit()
     conn.close()
+    bump_version(motor_id)
     return jsonify({"status": "created"})
 
 @app.route('/api/claims', methods=['GET'])
 def get_claims():
+    try:
+        limit, after = parse_page_args()
+    except ValueError:
+        return jsonify({"error": "Invalid limit or cursor"}), 400
+    
+    filters = []
+    if request.args.get('motor_id'):
+        filters.append(('motor_id = ?', request.args.get('motor_id', type=int)))
+    if request.args.get('status'):
+        filters.append(('status = ?', request.args['status']))
+    if request.args.get('from'):
+        filters.append(('date >= ?', request.args['from']))
+    if request.args.get('to'):
+        filters.append(('date <= ?', request.args['to']))
+    
+    conn = get_db()
+    data, next_cursor, total = keyset_query(conn, 'claims', 'date', filters, limit, after)
+    conn.close()
+    return paged_response(data, next_cursor, total)
+
+@app.route('/api/claims/<int:claim_id>/waveforms')
+def claim_waveforms(claim_id):
+    """Raw-signal evidence for a claim: archived frames around the claim date"""
+    hours = request.args.get('hours', 24, type=float)
     conn = get_db()
-    data = conn.execute('SELECT * FROM claims ORDER BY date DESC').fetchall()
+    claim = conn.execute('SELECT * FROM claims WHERE id = ?', (claim_id,)).fetchone()
     conn.close()
-    return jsonify([dict(r) for r in data])
+    if not claim:
+        return jsonify({"error": "Claim not found"}), 404
+    try:
+        day_end = datetime.fromisoformat(claim['date']) + timedelta(days=1)
+    except (TypeError, ValueError):
+        return jsonify({"error": "Claim has no valid date to anchor the evidence window"}), 400
+    t_to = day_end.timestamp()
+    t_from = (day_end - timedelta(hours=hours + 24)).timestamp()
+    return jsonify({
+        'claim': claim,
+        'from': to_iso(t_from),
+        'to': to_iso(t_to),
+        'summary': WAVEFORM_ARCHIVE.summary(claim['motor_id'], t_from, t_to),
+        'raw_url': f"/api/waveform_archive?id={claim['motor_id']}&from={t_from}&to={t_to}&format=raw"
+    })
 
 @app.route('/api/claims', methods=['POST'])
 def add_claim():
     data = request.json
+    try:
+        motor_id = int(data['motor_id'])
+        amount = parse_amount(data['amount'])
+    except ValueError as e:
+        return jsonify({"status": "error", "message": str(e)}), 400
     conn = get_db()
     cursor = conn.cursor()
     cursor.execute('''INSERT INTO claims 
         (motor_id, date, amount, status, description, resolution)
         VALUES (?, ?, ?, ?, ?, ?)''',
-        (data['motor_id'], datetime.now().strftime('%Y-%m-%d'), 
-         data['amount'], 'Pending', data['description'], ''))
+        (motor_id, datetime.now().strftime('%Y-%m-%d'), 
+         amount, 'Pending', data['description'], ''))
     conn.commit()
     conn.close()
+    bump_version(motor_id)
     return jsonify({"status": "created"})
 
+@app.route('/api/exposure')
+def get_exposure():
+    """Insured value, premiums, claims and maintenance spend aggregated in SQL"""
+    conn = get_db()
+    by_criticality = conn.execute('''SELECT criticality, COUNT(*) AS motors,
+            SUM(coverage) AS coverage, SUM(premium) AS premium,
+            SUM(CASE WHEN health < ? THEN coverage ELSE 0 END) AS coverage_at_risk
+        FROM motors GROUP BY criticality ORDER BY coverage DESC''', (HEALTH_AT_RISK,)).fetchall()
+    claims = conn.execute('''SELECT status, COUNT(*) AS count, SUM(amount) AS amount
+        FROM claims GROUP BY status''').fetchall()
+    maintenance = conn.execute('''SELECT COUNT(*) AS records, SUM(cost) AS cost
+        FROM maintenance WHERE date >= date('now', '-365 days')''').fetchone()
+    conn.close()
+    
+    return jsonify({
+        'byCriticality': by_criticality,
+        'totalCoverage': sum(r['coverage'] or 0 for r in by_criticality),
+        'coverageAtRisk': sum(r['coverage_at_risk'] or 0 for r in by_criticality),
+        'claims': claims,
+        'maintenanceLastYear': maintenance
+    })
+
+@app.route('/api/import/<kind>', methods=['POST'])
+def bulk_import(kind):
+    """Bulk upsert devices, maintenance or claims from CSV, NDJSON or a JSON array.
+
+    Rows are validated and written in IMPORT_CHUNK_ROWS transactions.
+    Devices are keyed on ?key=policy_no (default) or model_no; maintenance
+    and claims reference motors by motor_id, policy_no or model_no and
+    are deduplicated on their natural key, so re-running an import is safe.
+    """
+    if kind not in ('devices', 'maintenance', 'claims'):
+        return jsonify({"error": "kind must be devices, maintenance or claims"}), 404
+    key = request.args.get('key', 'policy_no')
+    if key not in IMPORT_KEYS:
+        return jsonify({"error": f"key must be one of {IMPORT_KEYS}"}), 400
+    fmt = import_format()
+    if fmt not in ('csv', 'ndjson', 'json'):
+        return jsonify({"error": "format must be csv, ndjson or json"}), 400
+    
+    report = {'kind': kind, 'received': 0, 'inserted': 0, 'updated': 0, 'rejected': 0, 'errors': []}
+    
+    def reject(row_no, message):
+        report['rejected'] += 1
+        if len(report['errors']) < IMPORT_MAX_ERRORS:
+            report['errors'].append({'row': row_no, 'error': message})
+    
+    def flush(chunk):
+        rows = [r for _, r in chunk]
+        if kind != 'devices':
+            rows = []
+            for (row_no, r), motor_id in zip(chunk, resolve_motor_ids(conn, [r for _, r in chunk])):
+                if motor_id is None:
+                    reject(row_no, "unknown motor")
+                else:
+                    r['motor_id'] = motor_id
+                    rows.append(r)
+        if not rows:
+            return
+        with conn:
+            if kind == 'devices':
+                inserted, updated = upsert_devices(conn, rows, key)
+            else:
+                inserted, updated = upsert_records(conn, kind, rows)
+        report['inserted'] += inserted
+        report['updated'] += updated
+    
+    conn = get_db()
+    chunk = []
+    try:
+        for row_no, row in enumerate(import_rows(fmt), start=1):
+            report['received'] += 1
+            try:
+                if not isinstance(row, dict):
+                    raise ValueError("row is not an object")
+                chunk.append((row_no, normalize_device(row, key) if kind == 'devices' else normalize_record(row, kind)))
+            except (ValueError, TypeError) as e:
+                reject(row_no, str(e))
+            if len(chunk) >= IMPORT_CHUNK_ROWS:
+                flush(chunk)
+                chunk = []
+        flush(chunk)
+    except (ValueError, UnicodeDecodeError) as e:
+        report['error'] = f"Could not parse {fmt} body: {e}"
+        return jsonify(report), 400
+    finally:
+        conn.close()
+    return jsonify(report)
+
+@app.route('/api/recorder', methods=['GET', 'POST'])
+def recorder():
+    """Start/stop recording ingest traffic for replay.py; GET returns status"""
+    if request.method == 'GET':
+        return jsonify(RECORDER.status())
+    data = request.get_json(silent=True) or {}
+    if data.get('action') == 'start':
+        try:
+            return jsonify(RECORDER.start(data.get('file')))
+        except RuntimeError as e:
+            return jsonify({"error": str(e)}), 409
+    if data.get('action') == 'stop':
+        return jsonify(RECORDER.stop())
+    return jsonify({"error": "action must be start or stop"}), 400
+
+@app.route('/api/recorder/<path:name>')
+def download_recording(name):
+    return send_from_directory(RECORDINGS_DIR, name, as_attachment=True)
+
+@app.route('/api/snapshot', methods=['GET', 'POST'])
+def snapshot():
+    """POST takes a snapshot now (e.g. before a planned restart); GET returns status"""
+    if request.method == 'POST':
+        try:
+            SNAPSHOTS.save()
+        except OSError as e:
+            return jsonify({"error": f"Snapshot failed: {e}"}), 500
+    return jsonify(SNAPSHOTS.status())
+
+@app.route('/api/journal')
+def journal_status():
+    return jsonify(JOURNAL.status())
+
+@app.route('/api/gateway/stats')
+def gateway_stats():
+    """Binary listener counters; ?id= returns one device's sequence accounting"""
+    dev_id = request.args.get('id', type=int)
+    if dev_id is None:
+        return jsonify(GATEWAY.status())
+    state = GATEWAY.status(dev_id)
+    if state is None:
+        return jsonify({"error": "No gateway traffic for this device"}), 404
+    return jsonify({'id': dev_id, **state})
+
+@app.route('/api/alert_rules', methods=['GET', 'PUT'])
+def alert_rules():
+    """PUT replaces the rule file (validated first); edits to the file itself are picked up too"""
+    if request.method == 'PUT':
+        specs = request.get_json(silent=True)
+        try:
+            compile_alert_rules(specs)
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        tmp = ALERTS.path + '.tmp'
+        with open(tmp, 'w') as f:
+            json.dump(specs, f, indent=2)
+            f.write('\n')
+        os.replace(tmp, ALERTS.path)
+        ALERTS.reload(force=True)
+    else:
+        ALERTS.reload()
+    return jsonify(ALERTS.status())
+
+@app.route('/api/alerts')
+def get_alerts():
+    motor_id = request.args.get('motor_id', type=int)
+    status = request.args.get('status')
+    return jsonify([a for a in reversed(ALERT_LOG)
+                    if (motor_id is None or a['motor_id'] == motor_id)
+                    and (status is None or a['status'] == status)])
+
+EXPORT_FORMATS = {
+    'csv': ('text/csv', 'csv'),
+    'parquet': ('application/vnd.apache.parquet', 'parquet'),
+    'arrow': ('application/vnd.apache.arrow.stream', 'arrows')
+}
+
+def parse_export_args(args):
+    """Validate export query args; returns (params, None) or (None, (error, status))"""
+    dataset = args.get('dataset', 'telemetry')
+    fmt = args.get('format', 'csv')
+    if dataset not in EXPORT_COLUMNS or fmt not in EXPORT_FORMATS:
+        return None, ({"error": f"dataset must be one of {sorted(EXPORT_COLUMNS)} and format one of {sorted(EXPORT_FORMATS)}"}, 400)
+    if fmt != 'csv' and pa is None:
+        return None, ({"error": "Parquet/Arrow export requires pyarrow"}, 501)
+    
+    try:
+        motor_id = int(args['motor_id']) if args.get('motor_id') else None
+        if dataset == 'telemetry':
+            to_epoch(args.get('from'))
+            to_epoch(args.get('to'))
+    except ValueError:
+        return None, ({"error": "motor_id must be an integer and from/to epoch seconds or ISO-8601"}, 400)
+    return {'dataset': dataset, 'fmt': fmt, 'motor_id': motor_id,
+            'date_from': args.get('from'), 'date_to': args.get('to')}, None
+
+def export_stream(params):
+    """(body iterator, mimetype, Content-Disposition) for validated export params"""
+    mimetype, extension = EXPORT_FORMATS[params['fmt']]
+    chunks = export_chunks(params['dataset'], params['motor_id'], params['date_from'], params['date_to'])
+    disposition = f'attachment; filename="{params["dataset"]}-{datetime.now():%Y%m%d-%H%M%S}.{extension}"'
+    return stream_export(params['dataset'], params['fmt'], chunks), mimetype, disposition
+
+@app.route('/api/export')
+def export_data():
+    """Stream telemetry, anomalies, maintenance or claims as CSV, Parquet or Arrow IPC"""
+    params, error = parse_export_args(request.args)
+    if error:
+        return jsonify(error[0]), error[1]
+    body, mimetype, disposition = export_stream(params)
+    resp = Response(stream_with_context(body), mimetype=mimetype)
+    resp.headers['Content-Disposition'] = disposition
+    return resp
+
 @app.route('/api/analytics')
 def get_analytics():
     vibration_data = []
@@ -2692,13 +6547,15 @@ def get_analytics():
             'value': random.uniform(3, 15)
         })
     
+    FORECASTS.fit()
+    
     conn = get_db()
     devices_data = conn.execute('SELECT health FROM motors').fetchall()
     conn.close()
     
-    healthy = len([d for d in devices_data if d['health'] >= 80])
-    warning = len([d for d in devices_data if 60 <= d['health'] < 80])
-    critical = len([d for d in devices_data if d['health'] < 60])
+    healthy = len([d for d in devices_data if d['health'] >= HEALTH_GOOD])
+    warning = len([d for d in devices_data if HEALTH_AT_RISK <= d['health'] < HEALTH_GOOD])
+    critical = len([d for d in devices_data if d['health'] < HEALTH_AT_RISK])
     
     anomaly_data = []
     for i in range(7):
@@ -2712,7 +6569,7 @@ def get_analytics():
         'vibrationData': vibration_data,
         'healthDistribution': [healthy, warning, critical],
         'anomalyData': anomaly_data,
-        'predictionAccuracy': 85 + random.randint(-5, 5),
+        'predictionAccuracy': FORECASTS.accuracy() or 0,
         'mtbf': 156 + random.randint(-20, 20),
         'savedCost': 45.2 + random.uniform(-5, 5)
     })
@@ -2723,38 +6580,41 @@ def analyze_ai():
     
     conn = get_db()
     device = conn.execute('SELECT * FROM motors WHERE id = ?', (dev_id,)).fetchone()
+    context = device_context(dev_id, conn=conn) if device else None
     conn.close()
     
     if not device:
         return jsonify({"analysis": "Device not found"})
     
-    history = TELEMETRY_HISTORY.get(dev_id, [])
-    recent_anomalies = [a for a in ANOMALY_LOG if a['motor_id'] == dev_id][-5:]
+    prompt = analysis_prompt(device, context)
     
-    prompt = f"""Analyze industrial asset {device['name']}:
-
-ASSET INFO:
-- Location: {device['location']}
-- Manufacturer: {device['manufacturer']}
-- Model: {device['model_no']}
-- Criticality: {device['criticality']}
-- Installation: {device['installation_date']}
-
-CURRENT METRICS:
-- Health: {device['health']}%
-- THD: {device['last_thd']}% (Baseline: {device['vibration_baseline']}%)
-- Temperature: {device['last_temp']}°C (Baseline: {device['temp_baseline']}°C)
-- Status: {device['status']}
-
-RECENT ANOMALIES: {len(recent_anomalies)}
+    analysis, _ = ask_ai(prompt, fallback=lambda reason: rule_based_analysis(dev_id, reason))
+    return jsonify({"analysis": analysis})
 
-Provide a brief technical analysis with:
-1. Risk assessment
-2. Recommended actions
-3. Failure probability"""
+@app.route('/api/triage')
+def fleet_triage():
+    """Rank the whole fleet by local risk score; AI summaries for the top-K only.
+
+    Query args: k (assets sent to the AI), budget (estimated tokens),
+    limit (rows returned), ai=0 to skip the AI step and refresh=1 to
+    bypass the TRIAGE_CACHE_TTL cache.
+    """
+    top_k = max(0, min(request.args.get('k', TRIAGE_TOP_K, type=int), 50))
+    token_budget = max(0, request.args.get('budget', TRIAGE_TOKEN_BUDGET, type=int))
+    limit = max(1, min(request.args.get('limit', 100, type=int), PAGE_MAX_LIMIT))
+    use_ai = request.args.get('ai', '1') != '0'
+    key = (top_k, token_budget, limit, use_ai)
     
-    analysis, _ = ask_ai(prompt)
-    return jsonify({"analysis": analysis})
+    now = time.time()
+    with TRIAGE_LOCK:
+        cached = TRIAGE_CACHE.get(key)
+    if cached and cached[0] > now and request.args.get('refresh') != '1':
+        return jsonify(dict(cached[1], cached=True))
+    
+    result = build_triage(top_k, token_budget, use_ai, limit)
+    with TRIAGE_LOCK:
+        TRIAGE_CACHE[key] = (now + TRIAGE_CACHE_TTL, result)
+    return jsonify(dict(result, cached=False))
 
 @app.route('/api/generate_report')
 def generate_report():
@@ -2763,28 +6623,15 @@ def generate_report():
     
     conn = get_db()
     d = conn.execute('SELECT * FROM motors WHERE id = ?', (dev_id,)).fetchone()
+    context = device_context(d['id'], conn=conn) if d else None
     conn.close()
     
-    history = TELEMETRY_HISTORY.get(int(dev_id), [])
-    recent_thds = [h['thd'] for h in history[-10:]] if history else []
-    anomalies = [a for a in ANOMALY_LOG if a['motor_id'] == int(dev_id)][-5:]
+    if not d:
+        return jsonify({"insight": "Device not found"})
     
-    prompt = f"""Generate a {report_type} report for {d['name']}:
-
-METRICS:
-- THD: {d['last_thd']}% (Baseline: {d['vibration_baseline']}%)
-- Temperature: {d['last_temp']}°C (Baseline: {d['temp_baseline']}°C)
-- Health: {d['health']}%
-- Status: {d['status']}
-- Location: {d['location']}
-- Last Maintenance: {d['last_maintenance']}
-
-RECENT READINGS: {recent_thds}
-ANOMALIES: {len(anomalies)}
-
-Provide a detailed forensic analysis with specific recommendations."""
+    prompt = report_prompt(d, context, report_type)
     
-    insight, tokens = ask_ai(prompt)
+    insight, tokens = ask_ai(prompt, fallback=lambda reason: rule_based_analysis(d['id'], reason))
     return jsonify({"insight": insight})
 
 @app.route('/api/save', methods=['POST'])
@@ -2793,18 +6640,49 @@ def save():
     AI_STORE["key"] = data['key']
     if 'model' in data:
         AI_STORE["model"] = data['model']
+    with TRIAGE_LOCK:
+        TRIAGE_CACHE.clear()
     try:
-        AI_STORE["client"] = Groq(api_key=AI_STORE["key"])
+        AI_STORE["client"] = make_ai_client(AI_STORE["key"])
         return jsonify({"status": "ok", "message": "AI Engine configured successfully"})
     except Exception as e:
         return jsonify({"status": "error", "message": str(e)}), 400
 
+@app.route('/assets/<path:filename>')
+def vendored_asset(filename):
+    entry = HASHED_ASSETS.get(filename)
+    if entry:
+        return serve_precompressed(entry, IMMUTABLE_CACHE)
+    # Files referenced relatively from vendored CSS (e.g. web fonts)
+    return send_from_directory(app.static_folder, filename, max_age=86400)
+
+@app.cli.command('migrate-db')
+def migrate_db_command():
+    """Upgrade pulseguard.db to the typed schema without reseeding it."""
+    result = migrate_db()
+    if not result['migrated']:
+        print(f"Schema already at version {result['version']}")
+        return
+    print(f"Migrated to schema version {result['version']}")
+    for table, row_id, column, value in result['unparsed']:
+        print(f"   {table}#{row_id}.{column}: could not parse {value!r}, stored NULL")
+
 @app.route('/')
 def index():
-    return render_template_string(HTML_TEMPLATE)
+    if not DASHBOARD_SHELL:
+        build_dashboard_shell()
+    # The shell is revalidated on every load (cheap 304) so deploys show up
+    # immediately; the hashed assets it references are cached forever.
+    return serve_precompressed(DASHBOARD_SHELL, 'no-cache')
 
 if __name__ == '__main__':
-    init_db()
+    # The debug reloader runs this block in a watcher process too; only the
+    # serving child loads state, owns the journal and binds the gateway ports
+    serving = os.environ.get('WERKZEUG_RUN_MAIN') == 'true'
+    if serving:
+        JOURNAL.open(after_lsn=warm_start())
+    FORECASTS.fit()
+    build_dashboard_shell()
     print("""
     ╔══════════════════════════════════════════════════════════╗
     ║     PulseGuard Nexus Industrial IoT Command Center      ║
@@ -2828,5 +6706,9 @@ if __name__ == '__main__':
     # Start periodic metrics display (every 5 minutes)
     print("⏱️  Metrics will be displayed every 5 minutes...\n")
     periodic_metrics_display(interval=300)
+    periodic_forecast_refit(interval=600)
+    if serving:
+        periodic_snapshot()
+        GATEWAY.start()
     
     app.run(port=8080, debug=True)
\ No newline at end of file
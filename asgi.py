@@ -0,0 +1,227 @@
+"""ASGI serving mode for Pulse Guard Nexus.
+
+The I/O-bound endpoints run as coroutines: AI calls go through AsyncGroq
+and SQLite work is pushed onto a bounded thread pool. Live telemetry
+(SSE) streams from a coroutine instead of pinning a thread per client;
+exports run on one pool thread each. Every other route is served
+unchanged by the Flask app, which is mounted underneath through a WSGI
+adapter.
+
+All state lives in-process, so run a single worker:
+
+    uvicorn asgi:app --host 0.0.0.0 --port 8080 --workers 1
+"""
+import asyncio
+import contextlib
+import json
+import time
+
+import anyio
+from groq import AsyncGroq
+from starlette.applications import Starlette
+from starlette.responses import JSONResponse, StreamingResponse
+from starlette.routing import Mount, Route
+
+import app as core
+
+# Threads available for SQLite and other blocking work
+DB_THREADS = 16
+# Threads serving the mounted Flask routes
+WSGI_THREADS = 32
+SSE_POLL_INTERVAL = 1.0
+# Export chunks produced ahead of the client
+EXPORT_BUFFER_CHUNKS = 4
+SSE_KEEPALIVE = 15.0
+# Flask-CORS covers the mounted routes; coroutine routes set it themselves
+CORS_HEADERS = {'Access-Control-Allow-Origin': '*'}
+
+try:
+    from a2wsgi import WSGIMiddleware
+    flask_app = WSGIMiddleware(core.app, workers=WSGI_THREADS)
+except ImportError:
+    from starlette.middleware.wsgi import WSGIMiddleware
+    flask_app = WSGIMiddleware(core.app)
+
+DB_LIMITER = anyio.CapacityLimiter(DB_THREADS)
+ASYNC_AI = {'key': None, 'client': None}
+
+async def run_db(func, *args):
+    """Run blocking (DB-touching) work on the bounded thread pool"""
+    return await anyio.to_thread.run_sync(func, *args, limiter=DB_LIMITER)
+
+def produce_chunks(iterator, send):
+    """Run a blocking iterator to the end on the calling worker thread, handing chunks to the loop"""
+    with send:
+        try:
+            for chunk in iterator:
+                anyio.from_thread.run(send.send, chunk)
+        except anyio.BrokenResourceError:
+            # The client went away; closing the iterator releases its DB connection
+            pass
+        finally:
+            getattr(iterator, 'close', lambda: None)()
+
+async def iterate_on_db_pool(iterator):
+    """Drive a blocking iterator (e.g. an export) from the bounded thread pool.
+
+    SQLite connections only work on the thread that opened them, so the
+    whole iterator runs on one pool thread rather than one next() per
+    thread; a small buffer keeps it from running ahead of the client.
+    """
+    send, receive = anyio.create_memory_object_stream(EXPORT_BUFFER_CHUNKS)
+    producer = asyncio.ensure_future(run_db(produce_chunks, iterator, send))
+    with receive:
+        async for chunk in receive:
+            yield chunk
+    # Surface an error raised by the iterator once its chunks are drained
+    await producer
+
+async def acquire(bucket, n, timeout):
+    """Non-blocking TokenBucket.acquire: polls without holding a thread"""
+    deadline = time.monotonic() + timeout
+    while not bucket.acquire(n):
+        if time.monotonic() >= deadline:
+            return False
+        await asyncio.sleep(min(0.1, max(0.0, deadline - time.monotonic())))
+    return True
+
+def async_client():
+    if ASYNC_AI['key'] != core.AI_STORE['key']:
+        ASYNC_AI['key'] = core.AI_STORE['key']
+        ASYNC_AI['client'] = AsyncGroq(api_key=ASYNC_AI['key'], timeout=core.AI_TIMEOUT,
+                                       max_retries=core.AI_MAX_RETRIES)
+    return ASYNC_AI['client']
+
+async def ask_ai_async(prompt, max_tokens=500, dev_id=None):
+    """Coroutine twin of core.ask_ai sharing its breaker, rate limits and rule-based fallback"""
+    async def unavailable(reason):
+        with core.METRICS_LOCK:
+            core.METRICS['ai_fallbacks'] += 1
+        if dev_id is not None:
+            return await run_db(core.rule_based_analysis, dev_id, reason), "0"
+        return f"AI analysis temporarily unavailable: {reason}", "0"
+
+    if not core.AI_STORE['key']:
+        return await unavailable("engine not configured")
+    if not core.AI_BREAKER.allow():
+        return await unavailable("circuit open after repeated failures")
+    if not (await acquire(core.AI_REQUEST_BUCKET, 1, core.AI_RATE_WAIT)
+            and await acquire(core.AI_TOKEN_BUCKET, core.estimate_tokens(prompt) + max_tokens, core.AI_RATE_WAIT)):
+        core.AI_BREAKER.release()
+        return await unavailable("rate limit reached")
+
+    started = time.monotonic()
+    try:
+        completion = await async_client().chat.completions.create(
+            model=core.AI_STORE['model'],
+            messages=[
+                {"role": "system", "content": core.AI_SYSTEM_PROMPT},
+                {"role": "user", "content": prompt}
+            ],
+            temperature=0.3,
+            max_tokens=max_tokens
+        )
+    except Exception as e:
+        core.AI_BREAKER.record(False, time.monotonic() - started)
+        return await unavailable(str(e))
+    core.AI_BREAKER.record(True, time.monotonic() - started)
+    return completion.choices[0].message.content, completion.usage.total_tokens
+
+def load_device(dev_id):
+    """Device row and its prompt context, on one connection"""
+    conn = core.get_db()
+    try:
+        device = conn.execute('SELECT * FROM motors WHERE id = ?', (dev_id,)).fetchone()
+        return device, core.device_context(dev_id, conn=conn) if device else None
+    finally:
+        conn.close()
+
+async def analyze_ai(request):
+    dev_id = int(request.query_params['id'])
+    device, context = await run_db(load_device, dev_id)
+    if not device:
+        return JSONResponse({"analysis": "Device not found"}, headers=CORS_HEADERS)
+    analysis, _ = await ask_ai_async(core.analysis_prompt(device, context), dev_id=dev_id)
+    return JSONResponse({"analysis": analysis}, headers=CORS_HEADERS)
+
+async def generate_report(request):
+    dev_id = int(request.query_params['id'])
+    device, context = await run_db(load_device, dev_id)
+    if not device:
+        return JSONResponse({"insight": "Device not found"}, headers=CORS_HEADERS)
+    prompt = core.report_prompt(device, context, request.query_params.get('type', 'full'))
+    insight, _ = await ask_ai_async(prompt, dev_id=dev_id)
+    return JSONResponse({"insight": insight}, headers=CORS_HEADERS)
+
+async def telemetry_stream(request):
+    """Server-sent events with each new batch of a device's telemetry points.
+
+    Resumes after ?since=<ISO timestamp>; otherwise starts from the latest
+    point. A comment line is sent every SSE_KEEPALIVE seconds when idle.
+    """
+    dev_id = int(request.query_params['id'])
+    since = request.query_params.get('since')
+
+    async def events():
+        last_ts = since
+        version = None
+        idle_since = time.monotonic()
+        while not await request.is_disconnected():
+            current = core.DEVICE_VERSIONS.get(dev_id, 0)
+            if current != version:
+                version = current
+                history = core.TELEMETRY_HISTORY.get(dev_id, [])
+                if last_ts is None:
+                    points = history[-1:]
+                else:
+                    start = len(history)
+                    while start and history[start - 1]['timestamp'] > last_ts:
+                        start -= 1
+                    points = history[start:]
+                if points:
+                    last_ts = points[-1]['timestamp']
+                    idle_since = time.monotonic()
+                    yield f"id: {last_ts}\ndata: {json.dumps(points)}\n\n"
+            if time.monotonic() - idle_since >= SSE_KEEPALIVE:
+                idle_since = time.monotonic()
+                yield ": keepalive\n\n"
+            await asyncio.sleep(SSE_POLL_INTERVAL)
+
+    return StreamingResponse(events(), media_type='text/event-stream',
+                             headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no', **CORS_HEADERS})
+
+async def export_data(request):
+    """Same contract as the Flask /api/export; each export runs on one DB pool thread"""
+    params, error = core.parse_export_args(request.query_params)
+    if error:
+        return JSONResponse(error[0], status_code=error[1], headers=CORS_HEADERS)
+    body, mimetype, disposition = core.export_stream(params)
+    return StreamingResponse(iterate_on_db_pool(body), media_type=mimetype,
+                             headers={'Content-Disposition': disposition, **CORS_HEADERS})
+
+@contextlib.asynccontextmanager
+async def lifespan(app):
+    lsn = await run_db(core.warm_start)
+    await run_db(lambda: core.JOURNAL.open(after_lsn=lsn))
+    await run_db(core.FORECASTS.fit)
+    core.build_dashboard_shell()
+    core.periodic_metrics_display(interval=300)
+    core.periodic_forecast_refit(interval=600)
+    core.periodic_snapshot()
+    # Gateway UDP/TCP listener shares this event loop; ingest still runs on its own thread
+    gateway = asyncio.ensure_future(core.GATEWAY.serve())
+    yield
+    gateway.cancel()
+    # Clean shutdown: the next start loads this instead of replaying the journal
+    await run_db(core.SNAPSHOTS.save)
+
+app = Starlette(
+    routes=[
+        Route('/api/analyze_ai', analyze_ai),
+        Route('/api/generate_report', generate_report),
+        Route('/api/stream/telemetry', telemetry_stream),
+        Route('/api/export', export_data),
+        Mount('/', app=flask_app)
+    ],
+    lifespan=lifespan
+)
@@ -0,0 +1,183 @@
+"""Replay a recorded ingest file against a Pulse Guard Nexus server.
+
+Recordings are captured with POST /api/recorder {"action": "start"} and
+hold one record per ingested sample. Replay keeps the original
+inter-arrival timing scaled by --speed (optionally capping idle gaps with
+--max-gap), re-stamps samples relative to the time they are sent, and
+then matches the server's anomaly log against the samples that should
+have triggered it to report detection latency and ingest throughput.
+The server coalesces consecutive breaches into one anomaly, so latency is
+measured for the sample that opened each anomaly and later breaches
+inside its [timestamp, end] span count as coalesced rather than missed.
+
+    python replay.py recordings/ingest-20261019-101500.ztr --speed 10
+    python replay.py plant-incident.ztr --speed 100 --max-gap 5 --json
+    python replay.py plant-incident.ztr --speed 0    # as fast as possible
+"""
+import argparse
+import json
+import sys
+import time
+from datetime import datetime
+
+import numpy as np
+import requests
+
+RECORD_MAGIC = b'ZTR1'
+RECORD_DTYPE = np.dtype([('arrival', '<f8'), ('ts', '<f8'), ('id', '<u4'), ('thd', '<f4'), ('temp', '<f4')])
+
+def load_recording(path):
+    with open(path, 'rb') as f:
+        if f.read(len(RECORD_MAGIC)) != RECORD_MAGIC:
+            raise SystemExit(f"{path} is not a telemetry recording")
+    records = np.fromfile(path, dtype=RECORD_DTYPE, offset=len(RECORD_MAGIC))
+    return records[np.argsort(records['arrival'], kind='stable')]
+
+def schedule(arrival, speed, max_gap=None):
+    """Send offsets (seconds from replay start) for each record"""
+    gaps = np.diff(arrival, prepend=arrival[:1])
+    if max_gap is not None:
+        gaps = np.minimum(gaps, max_gap)
+    if not speed:
+        return np.zeros(len(arrival))
+    return np.cumsum(gaps) / speed
+
+def fetch_anomalies(session, base, since):
+    """All anomalies with a sample timestamp at or after `since`, following cursors"""
+    anomalies, cursor = [], None
+    while True:
+        params = {'from': datetime.fromtimestamp(since).isoformat(), 'limit': 1000}
+        if cursor:
+            params['cursor'] = cursor
+        resp = session.get(base + '/api/anomalies', params=params, timeout=60)
+        resp.raise_for_status()
+        anomalies.extend(resp.json())
+        cursor = resp.headers.get('X-Next-Cursor')
+        if not cursor:
+            return anomalies
+
+def ms(values, q):
+    return round(float(np.percentile(values, q)) * 1000, 1) if len(values) else None
+
+def replay(records, args):
+    base = args.url.rstrip('/')
+    session = requests.Session()
+    offsets = schedule(records['arrival'], args.speed, args.max_gap)
+    skew = records['ts'] - records['arrival']
+    sent_at = np.zeros(len(records))
+    sent_ts = np.zeros(len(records))
+    post_latency, unknown, failed = [], set(), 0
+
+    started = time.monotonic()
+    i = 0
+    while i < len(records):
+        wait = offsets[i] - (time.monotonic() - started)
+        if wait > 0:
+            time.sleep(wait)
+        elapsed = time.monotonic() - started
+        j = min(int(np.searchsorted(offsets, elapsed, 'right')), i + args.batch)
+        j = max(j, i + 1)
+
+        now = time.time()
+        sent_at[i:j] = now
+        sent_ts[i:j] = np.round(now + skew[i:j], 6)
+        batch = [{'id': int(r['id']), 'thd': float(r['thd']), 'temp': float(r['temp']), 'timestamp': float(t)}
+                 for r, t in zip(records[i:j], sent_ts[i:j])]
+        t0 = time.monotonic()
+        try:
+            resp = session.post(base + '/api/telemetry', json=batch, timeout=60)
+            resp.raise_for_status()
+            unknown.update(resp.json().get('unknown_devices', []))
+        except (requests.RequestException, ValueError):
+            failed += 1
+        post_latency.append(time.monotonic() - t0)
+        i = j
+    replay_seconds = time.monotonic() - started
+
+    time.sleep(args.settle)
+    # Anomalies already open on the server when replay started can absorb replayed breaches
+    replay_start = float(sent_ts.min())
+    anomalies = fetch_anomalies(session, base, replay_start - args.lookback)
+
+    # Samples the detector should flag, keyed the way the server stores them
+    key = lambda motor_id, epoch: (int(motor_id), round(epoch, 3))
+    expected = {key(r['id'], t): n for n, (r, t) in enumerate(zip(records, sent_ts)) if float(r['thd']) > args.threshold}
+    breaches = len(expected)
+    latencies, spans, unexpected = [], {}, 0
+    for a in anomalies:
+        if a.get('detected_at') is None:
+            continue
+        start = datetime.fromisoformat(a['timestamp']).timestamp()
+        n = expected.pop(key(a['motor_id'], start), None)
+        if n is not None:
+            latencies.append(a['detected_at'] - sent_at[n])
+        elif start >= replay_start:
+            unexpected += 1
+            continue
+        end = datetime.fromisoformat(a.get('end') or a['timestamp']).timestamp()
+        spans.setdefault(int(a['motor_id']), []).append((round(start, 3), round(end, 3)))
+    coalesced = [k for k in expected if any(lo <= k[1] <= hi for lo, hi in spans.get(k[0], ()))]
+    for k in coalesced:
+        del expected[k]
+
+    span = float(records['arrival'][-1] - records['arrival'][0])
+    return {
+        'samples': int(len(records)),
+        'recorded_seconds': round(span, 3),
+        'replay_seconds': round(replay_seconds, 3),
+        'effective_speed': round(span / replay_seconds, 2) if replay_seconds else None,
+        'throughput_per_s': round(len(records) / replay_seconds, 1) if replay_seconds else None,
+        'posts': len(post_latency),
+        'failed_posts': failed,
+        'post_latency_ms': {'p50': ms(post_latency, 50), 'p99': ms(post_latency, 99)},
+        'unknown_devices': sorted(unknown),
+        'events': {
+            'breaching_samples': breaches,
+            'detected': len(latencies),
+            'coalesced': len(coalesced),
+            'missed': len(expected),
+            'unexpected': unexpected
+        },
+        'detection_latency_ms': {'p50': ms(latencies, 50), 'p95': ms(latencies, 95),
+                                 'max': round(max(latencies) * 1000, 1) if latencies else None}
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('recording')
+    parser.add_argument('--url', default='http://localhost:8080')
+    parser.add_argument('--speed', type=float, default=1.0, help='1, 10, 100... (0 = as fast as possible)')
+    parser.add_argument('--max-gap', type=float, help='cap recorded gaps at this many seconds before scaling')
+    parser.add_argument('--batch', type=int, default=1000, help='max samples per POST')
+    parser.add_argument('--threshold', type=float, default=12.0, help='THD above which a sample is a known anomaly event')
+    parser.add_argument('--lookback', type=float, default=1800,
+                        help='also match anomalies opened this many seconds before the replay (still open on the server)')
+    parser.add_argument('--settle', type=float, default=1.0, help='seconds to wait before collecting anomalies')
+    parser.add_argument('--json', action='store_true', help='print the report as JSON')
+    parser.add_argument('--fail-on-miss', action='store_true', help='exit non-zero if any breaching sample was missed')
+    args = parser.parse_args()
+
+    records = load_recording(args.recording)
+    if not len(records):
+        raise SystemExit("Recording is empty")
+    report = replay(records, args)
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        events, latency = report['events'], report['detection_latency_ms']
+        print(f"Replayed {report['samples']} samples ({report['recorded_seconds']}s recorded) in "
+              f"{report['replay_seconds']}s: {report['effective_speed']}x, {report['throughput_per_s']} samples/s")
+        print(f"POST p50 {report['post_latency_ms']['p50']} ms, p99 {report['post_latency_ms']['p99']} ms, "
+              f"{report['failed_posts']} failed of {report['posts']}")
+        print(f"Events: {events['breaching_samples']} breaching samples -> {events['detected']} anomalies "
+              f"(+{events['coalesced']} coalesced), {events['missed']} missed, "
+              f"{events['unexpected']} unexpected; detection latency p50 {latency['p50']} ms, "
+              f"p95 {latency['p95']} ms, max {latency['max']} ms")
+        if report['unknown_devices']:
+            print(f"Unknown devices on target: {report['unknown_devices']}")
+    if args.fail_on_miss and report['events']['missed']:
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,283 @@
+"""Fleet telemetry simulator for Pulse Guard Nexus.
+
+Models N motors with wear-driven degradation, daily/annual load and
+ambient cycles and random failure episodes, and pushes their readings
+into POST /api/telemetry from several worker processes at a target rate.
+With --transport udp/tcp the same samples go to the binary gateway
+listener instead, as sequence-numbered 24-byte records.
+
+Every motor has its own RNG seeded from (seed, motor index), so a run is
+reproducible no matter how motors are split across workers. With
+--clock simulated, sample timestamps come from a virtual clock that
+advances one --interval per round instead of wall time, which makes the
+generated stream itself deterministic.
+
+    python simulator.py --create --motors 500 --rate 2000 --duration 60
+    python simulator.py --clock simulated --steps 1440 --interval 60 --rate 0
+    python simulator.py --transport udp --gateway localhost --rate 5000
+"""
+import argparse
+import math
+import multiprocessing
+import socket
+import struct
+import time
+
+import numpy as np
+import requests
+
+GATEWAY_RECORD = struct.Struct('<IdffI')
+# Records per UDP datagram, keeping it under a 1500-byte MTU
+GATEWAY_DATAGRAM_RECORDS = 60
+
+DAY = 86400
+YEAR = 365 * DAY
+
+# Relative likelihood and duration (hours) of each failure episode
+FAILURE_MODES = {
+    'bearing': (0.5, (6, 48)),      # accelerating THD and heat as the bearing wears out
+    'insulation': (0.3, (2, 12)),   # winding temperature runaway
+    'harmonic': (0.2, (0.5, 6))     # drive/VFD fault: sudden THD step
+}
+
+class WallClock:
+    """Timestamps are the real time of generation"""
+
+    def now(self):
+        return time.time()
+
+    def tick(self):
+        pass
+
+class SimulatedClock:
+    """Virtual time that advances a fixed step per round"""
+
+    def __init__(self, start, step):
+        self.t = start
+        self.step = step
+
+    def now(self):
+        return self.t
+
+    def tick(self):
+        self.t += self.step
+
+class Motor:
+    """One motor's operating state; step(t) returns its (thd, temp) at time t"""
+
+    def __init__(self, index, motor_id, seed, acceleration=1.0, failure_rate=1.0):
+        self.motor_id = motor_id
+        self.rng = np.random.default_rng([seed, index])
+        self.acceleration = acceleration
+        self.failure_rate = failure_rate
+        self.base_thd = self.rng.uniform(3, 6)
+        self.ambient = self.rng.uniform(22, 32)
+        self.life = self.rng.uniform(2, 8) * YEAR
+        self.shape = self.rng.uniform(1.5, 3.0)
+        self.age = self.rng.uniform(0, 0.6) * self.life
+        self.phase = self.rng.uniform(0, 2 * math.pi)
+        self.failure = None
+        self.last_t = None
+
+    def wear(self):
+        """0 when new, 1 at characteristic life (Weibull-shaped)"""
+        return (self.age / self.life) ** self.shape
+
+    def hazard(self):
+        """Weibull failure rate per second at the current age"""
+        return self.failure_rate * self.shape / self.life * (self.age / self.life) ** (self.shape - 1)
+
+    def _maybe_fail(self, t, dt):
+        if self.failure is not None or dt <= 0:
+            return
+        if self.rng.random() < -math.expm1(-self.hazard() * dt * self.acceleration):
+            names = list(FAILURE_MODES)
+            weights = np.array([FAILURE_MODES[n][0] for n in names])
+            mode = names[self.rng.choice(len(names), p=weights / weights.sum())]
+            low, high = FAILURE_MODES[mode][1]
+            self.failure = (mode, t, t + self.rng.uniform(low, high) * 3600 / self.acceleration)
+
+    def step(self, t):
+        dt = 0.0 if self.last_t is None else t - self.last_t
+        self.last_t = t
+        self.age += dt * self.acceleration
+        self._maybe_fail(t, dt)
+
+        load = 0.75 + 0.15 * math.sin(2 * math.pi * t / DAY + self.phase) + 0.1 * math.sin(2 * math.pi * t / YEAR)
+        ambient = self.ambient + 6 * math.sin(2 * math.pi * t / YEAR - math.pi / 2) + 3 * math.sin(2 * math.pi * t / DAY - math.pi / 2)
+        thd = self.base_thd * (0.8 + 0.4 * load) + 8 * self.wear() + self.rng.normal(0, 0.3)
+        temp_rise = 0.0
+
+        if self.failure is not None:
+            mode, start, end = self.failure
+            progress = min(1.0, (t - start) / (end - start))
+            if mode == 'bearing':
+                thd += 12 * progress ** 2
+                temp_rise += 10 * progress ** 2
+            elif mode == 'insulation':
+                thd += 3 * progress
+                temp_rise += 35 * progress
+            else:
+                thd += 9 + self.rng.normal(0, 1)
+            if t >= end:
+                # Repaired: the failure clears and maintenance restores most of the wear
+                self.failure = None
+                self.age *= 0.3
+
+        thd = max(0.5, thd)
+        temp = ambient + 1.4 * thd * load + temp_rise + self.rng.normal(0, 0.5)
+        return round(thd, 2), round(temp, 1)
+
+def worker(worker_no, motors, args, results):
+    """Generate and POST samples for a slice of the fleet, paced to this worker's share of --rate"""
+    fleet = [Motor(index, motor_id, args.seed, args.acceleration, args.failure_rate) for index, motor_id in motors]
+    clock = SimulatedClock(args.start, args.interval) if args.clock == 'simulated' else WallClock()
+    rate = args.rate * len(motors) / args.motors if args.rate else 0
+    session = requests.Session()
+    url = args.url.rstrip('/') + '/api/telemetry'
+    # Gateway records carry a per-motor sequence number starting at 1
+    sequences = {}
+    if args.transport == 'udp':
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    elif args.transport == 'tcp' and not args.dry_run:
+        sock = socket.create_connection((args.gateway, args.tcp_port))
+
+    def post():
+        resp = session.post(url, json=batch, timeout=30)
+        resp.raise_for_status()
+        stats['unknown'] += len(resp.json().get('unknown_devices', []))
+
+    def transmit():
+        records = []
+        for sample in batch:
+            seq = sequences[sample['id']] = sequences.get(sample['id'], 0) + 1
+            records.append(GATEWAY_RECORD.pack(sample['id'], sample['timestamp'], sample['thd'], sample['temp'], seq))
+        if args.transport == 'tcp':
+            sock.sendall(b''.join(records))
+            return
+        for i in range(0, len(records), GATEWAY_DATAGRAM_RECORDS):
+            sock.sendto(b''.join(records[i:i + GATEWAY_DATAGRAM_RECORDS]), (args.gateway, args.udp_port))
+
+    stats = {'worker': worker_no, 'samples': 0, 'batches': 0, 'failed_batches': 0, 'unknown': 0, 'latencies': []}
+    started = time.monotonic()
+    deadline = started
+    batch = []
+
+    def send():
+        nonlocal deadline
+        size = len(batch)
+        if not args.dry_run:
+            sent_at = time.monotonic()
+            try:
+                if args.transport == 'http':
+                    post()
+                else:
+                    transmit()
+            except (requests.RequestException, ValueError, OSError):
+                stats['failed_batches'] += 1
+            stats['latencies'].append(time.monotonic() - sent_at)
+        stats['samples'] += size
+        stats['batches'] += 1
+        batch.clear()
+        if rate:
+            deadline += size / rate
+            time.sleep(max(0.0, deadline - time.monotonic()))
+
+    rounds = 0
+    while (args.steps is None or rounds < args.steps) and time.monotonic() - started < args.duration:
+        t = clock.now()
+        for motor in fleet:
+            thd, temp = motor.step(t)
+            batch.append({'id': motor.motor_id, 'thd': thd, 'temp': temp, 'timestamp': round(t, 3)})
+            if len(batch) >= args.batch:
+                send()
+        clock.tick()
+        rounds += 1
+    if batch:
+        send()
+
+    stats['elapsed'] = time.monotonic() - started
+    results.put(stats)
+
+def create_devices(args):
+    """Upsert SIM-<seed>-<n> motors through the bulk import API and return their ids"""
+    base = args.url.rstrip('/')
+    rng = np.random.default_rng(args.seed)
+    rows = [{
+        'name': f'Sim Motor {i:05d}',
+        'policy_no': f'SIM-{args.seed}-{i:05d}',
+        'model_no': f'SIMMOD-{args.seed}-{i:05d}',
+        'location': f'Sim Plant {i // 100 + 1}',
+        'manufacturer': 'Simulated',
+        'criticality': ['Low', 'Medium', 'High'][int(rng.integers(3))],
+        'coverage': int(rng.integers(2, 20)) * 100000,
+        'installation_date': '2020-01-01'
+    } for i in range(args.motors)]
+    report = requests.post(base + '/api/import/devices', json=rows, timeout=120).json()
+    print(f"Devices: {report['inserted']} created, {report['updated']} updated, {report['rejected']} rejected")
+    by_policy = {d['policy_no']: d['id'] for d in requests.get(base + '/api/devices', timeout=60).json()}
+    return [by_policy[r['policy_no']] for r in rows]
+
+def existing_devices(args):
+    ids = [d['id'] for d in requests.get(args.url.rstrip('/') + '/api/devices', timeout=60).json()]
+    if len(ids) < args.motors:
+        raise SystemExit(f"Only {len(ids)} devices exist; pass --create or lower --motors")
+    return ids[:args.motors]
+
+def percentile(values, q):
+    return float(np.percentile(values, q)) * 1000 if values else 0.0
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--url', default='http://localhost:8080')
+    parser.add_argument('--transport', choices=('http', 'udp', 'tcp'), default='http')
+    parser.add_argument('--gateway', default='localhost', help='gateway listener host for udp/tcp')
+    parser.add_argument('--udp-port', type=int, default=9750)
+    parser.add_argument('--tcp-port', type=int, default=9751)
+    parser.add_argument('--motors', type=int, default=50)
+    parser.add_argument('--workers', type=int, default=max(1, multiprocessing.cpu_count() // 2))
+    parser.add_argument('--rate', type=float, default=500, help='target samples/s across all workers (0 = unthrottled)')
+    parser.add_argument('--batch', type=int, default=200, help='samples per POST (or per send for udp/tcp)')
+    parser.add_argument('--duration', type=float, default=60, help='wall-clock seconds to run')
+    parser.add_argument('--steps', type=int, help='stop after this many rounds (one sample per motor each)')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--clock', choices=('wall', 'simulated'), default='wall')
+    parser.add_argument('--start', type=float, default=None, help='simulated clock start, epoch seconds (default: now)')
+    parser.add_argument('--interval', type=float, default=1.0, help='simulated seconds between rounds')
+    parser.add_argument('--acceleration', type=float, default=1.0, help='aging speed-up relative to sample time')
+    parser.add_argument('--failure-rate', type=float, default=1.0, help='multiplier on the Weibull hazard')
+    parser.add_argument('--create', action='store_true', help='create/update SIM-* devices via the import API')
+    parser.add_argument('--dry-run', action='store_true', help='generate without posting, to measure generator throughput')
+    args = parser.parse_args()
+    if args.start is None:
+        args.start = time.time()
+
+    if args.dry_run:
+        motor_ids = list(range(1, args.motors + 1))
+    else:
+        motor_ids = create_devices(args) if args.create else existing_devices(args)
+
+    workers = min(args.workers, args.motors)
+    results = multiprocessing.Queue()
+    processes = []
+    for w in range(workers):
+        motors = [(i, motor_ids[i]) for i in range(w, args.motors, workers)]
+        p = multiprocessing.Process(target=worker, args=(w, motors, args, results))
+        p.start()
+        processes.append(p)
+    stats = [results.get() for _ in processes]
+    for p in processes:
+        p.join()
+
+    samples = sum(s['samples'] for s in stats)
+    elapsed = max(s['elapsed'] for s in stats)
+    latencies = [x for s in stats for x in s['latencies']]
+    print(f"{samples} samples from {args.motors} motors in {elapsed:.1f}s "
+          f"({samples / elapsed:.0f}/s, target {args.rate or 'unthrottled'}) over {workers} workers")
+    if latencies:
+        print(f"POST latency p50 {percentile(latencies, 50):.1f} ms, p99 {percentile(latencies, 99):.1f} ms; "
+              f"{sum(s['failed_batches'] for s in stats)} of {sum(s['batches'] for s in stats)} batches failed; "
+              f"{sum(s['unknown'] for s in stats)} unknown-device rejections")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,16 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app as core
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    """Test client on a freshly seeded database in a scratch directory"""
+    monkeypatch.chdir(tmp_path)
+    core.init_db()
+    return core.app.test_client()
@@ -0,0 +1,70 @@
+import threading
+import time
+
+import anyio
+import pytest
+
+import app as core
+
+asgi = pytest.importorskip('asgi')
+
+
+def tracked(threads, closed, count=20):
+    """A blocking iterator that notes which thread runs each step"""
+    try:
+        for i in range(count):
+            threads.add(threading.get_ident())
+            time.sleep(0.001)
+            yield i
+    finally:
+        closed.append(threading.get_ident() in threads)
+
+
+def test_iterator_runs_on_one_thread():
+    runs = [(set(), []) for _ in range(4)]
+
+    async def consume(threads, closed, out):
+        async for chunk in asgi.iterate_on_db_pool(tracked(threads, closed)):
+            out.append(chunk)
+            await anyio.sleep(0)
+
+    async def main():
+        results = [[] for _ in runs]
+        async with anyio.create_task_group() as tg:
+            for (threads, closed), out in zip(runs, results):
+                tg.start_soon(consume, threads, closed, out)
+        return results
+
+    for out in anyio.run(main):
+        assert out == list(range(20))
+    for threads, closed in runs:
+        assert len(threads) == 1
+        assert closed == [True]
+
+
+def test_abandoned_export_closes_iterator():
+    threads, closed = set(), []
+
+    async def main():
+        chunks = asgi.iterate_on_db_pool(tracked(threads, closed, count=1000))
+        async for chunk in chunks:
+            if chunk == 2:
+                break
+        await chunks.aclose()
+        with anyio.fail_after(5):
+            while not closed:
+                await anyio.sleep(0.01)
+
+    anyio.run(main)
+    assert closed == [True]
+
+
+def test_export_streams_maintenance_in_small_chunks(client, monkeypatch):
+    from starlette.testclient import TestClient
+
+    monkeypatch.setattr(core, 'EXPORT_CHUNK_ROWS', 1)
+    flask_rows = client.get('/api/export?dataset=maintenance&format=csv').data.decode().splitlines()
+    response = TestClient(asgi.app).get('/api/export?dataset=maintenance&format=csv')
+    assert response.status_code == 200
+    assert response.text.splitlines() == flask_rows
+    assert len(flask_rows) > 2
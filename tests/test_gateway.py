@@ -0,0 +1,60 @@
+import asyncio
+import threading
+
+import numpy as np
+
+import app as core
+
+
+def records(count, start_seq=1):
+    data = np.zeros(count, core.GATEWAY_RECORD)
+    data['id'] = 1
+    data['thd'] = 5.0
+    data['temp'] = 40.0
+    data['seq'] = np.arange(start_seq, start_seq + count)
+    return data.tobytes()
+
+
+def test_tcp_waits_for_backlog_instead_of_dropping(monkeypatch):
+    """A TCP stream larger than the backlog is ingested in full; only UDP may drop"""
+    ingested = []
+    release = threading.Event()
+
+    def slow_ingest(batch):
+        release.wait(5)
+        ingested.extend(batch)
+        return []
+
+    monkeypatch.setattr(core, 'ingest_samples', slow_ingest)
+    monkeypatch.setattr(core, 'GATEWAY_MAX_BACKLOG', 100)
+    listener = core.GatewayListener('127.0.0.1', 0, 0)
+
+    async def scenario():
+        listener.loop = asyncio.get_running_loop()
+        # Fill the backlog so the first TCP chunk has to wait
+        listener.receive(records(100))
+        listener.flush()
+        assert listener.backlog == 100
+        listener.receive(records(10, 101))
+        assert listener.flush() is None
+        assert listener.stats['dropped'] == 10
+
+        reader = asyncio.StreamReader()
+        for start in range(1, 301, 60):
+            reader.feed_data(records(60, start))
+        reader.feed_eof()
+
+        class Writer:
+            def close(self):
+                pass
+
+        handler = asyncio.ensure_future(listener._handle_tcp(reader, Writer()))
+        await asyncio.sleep(0.05)
+        assert not handler.done()
+        release.set()
+        await asyncio.wait_for(handler, 5)
+
+    asyncio.run(scenario())
+    assert len(ingested) == 100 + 300
+    assert listener.stats['dropped'] == 10
+    assert listener.backlog == 0
@@ -0,0 +1,42 @@
+import time
+
+import pytest
+
+import app as core
+
+
+@pytest.fixture
+def journal(client, tmp_path, monkeypatch):
+    journal = core.IngestJournal(str(tmp_path / 'journal'))
+    journal.open(replay=False)
+    monkeypatch.setattr(core, 'JOURNAL', journal)
+    return journal
+
+
+def motor(client, dev_id):
+    return next(d for d in client.get('/api/devices').get_json() if d['id'] == dev_id)
+
+
+def test_acknowledged_batch_is_synced_and_applied(client, journal):
+    dev_id = client.get('/api/devices').get_json()[0]['id']
+    core.ingest_samples([{'id': dev_id, 'thd': 7.5, 'temp': 55.0}])
+    assert journal.synced_lsn >= 1
+    assert journal.applied_lsn == 1
+    assert motor(client, dev_id)['last_thd'] == 7.5
+
+
+def test_failed_fsync_leaves_batch_unapplied(client, journal, monkeypatch):
+    dev_id = client.get('/api/devices').get_json()[0]['id']
+    before = motor(client, dev_id)['last_thd']
+    history = len(core.TELEMETRY_HISTORY.get(dev_id, []))
+
+    def failing_fsync(fd):
+        raise OSError(5, 'Input/output error')
+
+    monkeypatch.setattr(core.os, 'fsync', failing_fsync)
+    with pytest.raises(OSError):
+        core.ingest_samples([{'id': dev_id, 'thd': before + 3, 'temp': 55.0, 'timestamp': time.time()}])
+    assert journal.error
+    assert journal.applied_lsn == 0
+    assert motor(client, dev_id)['last_thd'] == before
+    assert len(core.TELEMETRY_HISTORY.get(dev_id, [])) == history
@@ -0,0 +1,20 @@
+import app as core
+
+
+def test_add_maintenance_requires_a_date(client):
+    record = {'motor_id': '1', 'cost': '100', 'type': 'Inspection', 'description': 'd', 'technician': 't'}
+    assert client.post('/api/maintenance', json=dict(record, date='')).status_code == 400
+    assert client.post('/api/maintenance', json=record).status_code == 400
+    assert client.post('/api/maintenance', json=dict(record, date='2026-01-05')).status_code == 200
+
+
+def test_health_ignores_maintenance_rows_without_a_date(client):
+    conn = core.get_db()
+    conn.execute('DELETE FROM maintenance WHERE motor_id = 1')
+    conn.execute("INSERT INTO maintenance (motor_id, date, type, description, cost, technician) "
+                 "VALUES (1, NULL, 'Inspection', 'migrated', 0, 't')")
+    conn.commit()
+    conn.close()
+    resp = client.post('/api/telemetry', json=[{'id': 1, 'thd': 5.0, 'temp': 30.0}])
+    assert resp.status_code == 200
+    assert resp.get_json()['accepted'] == 1
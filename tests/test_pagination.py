@@ -0,0 +1,33 @@
+import app as core
+
+
+def page_all(client, url):
+    ids, cursor = [], None
+    while True:
+        resp = client.get(url + (f'&cursor={cursor}' if cursor else ''))
+        assert resp.status_code == 200
+        ids.extend(row['id'] for row in resp.get_json())
+        cursor = resp.headers.get('X-Next-Cursor')
+        if not cursor:
+            return ids
+
+
+def test_maintenance_pages_across_null_dates(client):
+    conn = core.get_db()
+    conn.execute('DELETE FROM maintenance WHERE motor_id = 1')
+    conn.executemany('INSERT INTO maintenance (motor_id, date, type, description, cost, technician) VALUES (1, ?, ?, ?, 0, ?)',
+                     [('2026-01-02', 'a', 'a', 't'), (None, 'b', 'b', 't'), ('2026-01-01', 'c', 'c', 't'),
+                      (None, 'd', 'd', 't'), ('2026-01-03', 'e', 'e', 't')])
+    conn.commit()
+    expected = [r['id'] for r in conn.execute(
+        'SELECT id FROM maintenance WHERE motor_id = 1 ORDER BY date DESC, id DESC')]
+    conn.close()
+
+    # One row per page, so pages end on (and continue after) NULL-date rows
+    assert page_all(client, '/api/maintenance?motor_id=1&limit=1') == expected
+    assert page_all(client, '/api/maintenance?motor_id=1&limit=2') == expected
+
+
+def test_cursor_with_wrong_types_is_rejected(client):
+    assert client.get('/api/anomalies?cursor=' + core.encode_cursor(123, 'x')).status_code == 400
+    assert client.get('/api/anomalies?cursor=' + core.encode_cursor(None, 5)).status_code == 200
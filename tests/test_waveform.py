@@ -0,0 +1,36 @@
+import numpy as np
+
+import app as core
+
+SAMPLE_RATE = 10000
+FRAME_SIZE = 4096
+
+
+def frame(thd_ratio=0.1):
+    t = np.arange(FRAME_SIZE) / SAMPLE_RATE
+    return (np.sin(2 * np.pi * 50 * t) + thd_ratio * np.sin(2 * np.pi * 150 * t)).astype('<f4').tobytes()
+
+
+def imported_motor(client):
+    """A motor created by bulk import, with no readings and no baselines"""
+    row = {'name': 'Imported', 'policy_no': 'IMP-1', 'model_no': 'IMP-M1', 'location': 'L', 'manufacturer': 'M',
+           'criticality': 'Low', 'coverage': 100000, 'installation_date': '2020-01-01'}
+    assert client.post('/api/import/devices', json=[row]).get_json()['inserted'] == 1
+    return next(d['id'] for d in client.get('/api/devices').get_json() if d['policy_no'] == 'IMP-1')
+
+
+def test_waveform_for_motor_without_readings_needs_temp(client):
+    dev_id = imported_motor(client)
+    url = f'/api/waveform?id={dev_id}&sample_rate={SAMPLE_RATE}&frame_size={FRAME_SIZE}'
+    resp = client.post(url, data=frame())
+    assert resp.status_code == 400
+    assert 'temp' in resp.get_json()['error']
+
+    resp = client.post(url + '&temp=35', data=frame())
+    assert resp.status_code == 200
+    assert abs(resp.get_json()['thd'][0] - 10) < 1
+
+
+def test_waveform_fundamental_outside_spectrum_is_rejected(client):
+    resp = client.post(f'/api/waveform?id=1&sample_rate={SAMPLE_RATE}&frame_size=16', data=bytes(64))
+    assert resp.status_code == 400